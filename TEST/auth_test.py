@@ -0,0 +1,44 @@
+"""
+注册测试
+
+使用 SQLite 内存库，检查：
+1. 超过 users 表列宽的用户名 / 邮箱在写入前被拒绝，返回 400（MySQL 上否则会抛出 DataError 变成 500）
+2. 重复的用户名返回 400，正常注册后可以用邮箱登录
+
+    cd backend
+    python ../TEST/auth_test.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from app import db
+from conftest import make_app
+
+
+def test_register_validates_lengths(app):
+    from app.auth import bp
+    from app.models import User
+    app.register_blueprint(bp)
+    client = app.test_client()
+
+    def register(**data):
+        return client.post('/api/register', json=dict({'username': 'alice', 'password': 'secret'}, **data))
+
+    response = register(email='a' * 110 + '@example.com')
+    assert response.status_code == 400 and 'Email' in response.get_json()['error'], response.get_json()
+    assert register(username='a' * 21).status_code == 400
+    with app.app_context():
+        assert db.session.execute(db.select(db.func.count(User.id))).scalar() == 0
+
+    assert register(email='alice@example.com').status_code == 201
+    assert register(email='other@example.com').status_code == 400
+    response = client.post('/api/login', json={'username': 'alice@example.com', 'password': 'secret'})
+    assert response.status_code == 200 and response.get_json()['user'] == {'email': 'alice@example.com'}
+
+
+if __name__ == '__main__':
+    test_register_validates_lengths(make_app())
+    print("auth_test 通过")
@@ -0,0 +1,160 @@
+"""
+周期预算测试
+
+使用 SQLite 内存库，检查：
+1. 周 / 月 / 自定义预算的周期边界
+2. 每月预算跨月后自动进入新周期，各周期的已用金额由交易写入按增量维护
+3. 读取预算（current_periods / get_budgets）不扫描交易表，新周期第一次读取时生成一条已用金额为 0 的记录
+4. 迁移 4 为旧数据库补上 budget.period 列，并把原来的 current_amount 写入对应月份的周期
+5. 本地时区与 UTC 不在同一天时，当前周期仍按交易使用的 UTC 日期确定
+
+    cd backend
+    python ../TEST/budget_period_test.py
+"""
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from app import db
+from app.metrics import capture_queries
+from conftest import make_app
+
+USERNAME = 7
+
+
+def expense(day, amount, category='餐饮'):
+    return {'amount': -amount, 'type': 'expense', 'category': category, 'description': None,
+            'date': datetime.combine(day, datetime.min.time()).replace(hour=12), 'username': USERNAME}
+
+
+def test_period_bounds():
+    from app.core.budgets import period_bounds
+    assert period_bounds('month', date(2026, 1, 1), date(2026, 1, 31), date(2026, 2, 14)) == \
+        (date(2026, 2, 1), date(2026, 2, 28))
+    # 2026-10-18 是星期日
+    assert period_bounds('week', date(2026, 10, 12), date(2026, 10, 18), date(2026, 10, 18)) == \
+        (date(2026, 10, 12), date(2026, 10, 18))
+    assert period_bounds('week', date(2026, 10, 12), date(2026, 10, 18), date(2026, 10, 19)) == \
+        (date(2026, 10, 19), date(2026, 10, 25))
+    # 自定义 10 天一个周期
+    assert period_bounds('custom', date(2026, 3, 5), date(2026, 3, 14), date(2026, 3, 26)) == \
+        (date(2026, 3, 25), date(2026, 4, 3))
+    assert period_bounds('month', date(2026, 3, 1), date(2026, 3, 31), date(2026, 2, 28)) is None
+
+
+def test_recurring_budget_rolls_over(app):
+    import app.core.functions as F
+    from app.core.budgets import current_periods, period_bounds
+    from app.models import BudgetPeriod
+    with app.app_context():
+        today = datetime.utcnow().date()
+        this_month = today.replace(day=1)
+        next_month = date(this_month.year + this_month.month // 12, this_month.month % 12 + 1, 1)
+
+        # 创建前已有的支出计入第一个周期
+        F.import_transactions(USERNAME, [expense(this_month, 20)])
+        created = F.create_budget(USERNAME, {'name': '餐饮', 'target_amount': 500, 'category': '餐饮'})
+        assert created['success'], created
+        assert created['data']['current_amount'] == 20
+        assert created['data']['start_date'] == this_month.isoformat()
+        weekly = F.create_budget(USERNAME, {'name': '每周餐饮', 'target_amount': 100, 'category': '餐饮',
+                                            'period': 'week'})
+        assert weekly['success'], weekly
+        custom = F.create_budget(USERNAME, {'name': '旅行', 'target_amount': 100, 'category': '餐饮',
+                                            'period': 'custom', 'start_date': '2020-01-01'})
+        assert not custom['success']
+
+        # 本月和下个月的交易分别计入两个周期，逐条写入和批量导入都按增量更新
+        result = F.create_transaction(USERNAME, {'amount': 30, 'type': 'expense', 'category': '餐饮'})
+        assert result['success'], result
+        imported = F.import_transactions(USERNAME, [expense(next_month, 50), expense(next_month.replace(day=3), 5)])
+        assert imported['success'], imported
+
+        with capture_queries() as queries:
+            periods = {budget[1]: (start, end, spent) for budget, start, end, spent
+                       in current_periods(USERNAME, today=next_month.replace(day=10))}
+            db.session.commit()
+        assert not [sql for sql, _ in queries.queries if 'FROM "transaction"' in sql], queries.report()
+        assert periods['餐饮'][0] == next_month and periods['餐饮'][2] == 55, periods
+        week = period_bounds('week', today, today, next_month.replace(day=10))
+        assert periods['每周餐饮'][:2] == week, periods
+        assert periods['每周餐饮'][2] == sum(amount for day, amount in ((next_month, 50), (next_month.replace(day=3), 5))
+                                            if week[0] <= day <= week[1]), periods
+
+        spent = {start: spent for start, spent in db.session.execute(
+            db.select(BudgetPeriod.start_date, BudgetPeriod.spent)
+            .where(BudgetPeriod.budget_id == created['data']['id'])
+        )}
+        assert spent == {this_month: 50, next_month: 55}, spent
+
+        # 没有交易的周期第一次读取时生成，之后直接读取
+        later = date(next_month.year + 1, next_month.month, 1)
+        with capture_queries() as first:
+            assert {b[1]: s for b, _, _, s in current_periods(USERNAME, today=later)}['餐饮'] == 0
+        with capture_queries() as second:
+            current_periods(USERNAME, today=later)
+        db.session.commit()
+        assert any(sql.startswith('INSERT') for sql, _ in first.queries), first.report()
+        assert second.count == 1, second.report()
+
+        listed = F.get_budgets(USERNAME)
+        assert listed['success'] and {b['period'] for b in listed['data']} == {'month', 'week'}, listed
+
+
+def test_current_period_uses_transaction_clock(app):
+    import app.core.functions as F
+    utc_today = datetime.utcnow().date()
+    # UTC 10 点以后 UTC+14 已经是第二天，12 点以前 UTC-12 还是前一天
+    saved = os.environ.get('TZ')
+    os.environ['TZ'] = 'Etc/GMT-14' if datetime.utcnow().hour >= 10 else 'Etc/GMT+12'
+    time.tzset()
+    try:
+        assert date.today() != utc_today
+        with app.app_context():
+            # 一天一个周期，从 UTC 的昨天开始
+            yesterday = (utc_today - timedelta(days=1)).isoformat()
+            created = F.create_budget(USERNAME, {'name': '每日交通', 'target_amount': 50, 'category': '交通',
+                                                 'period': 'custom', 'start_date': yesterday, 'end_date': yesterday})
+            assert created['success'], created
+            assert F.create_transaction(USERNAME, {'amount': 12, 'type': 'expense', 'category': '交通'})['success']
+            budget = next(b for b in F.get_budgets(USERNAME)['data'] if b['id'] == created['data']['id'])
+            assert (budget['start_date'], budget['current_amount']) == (utc_today.isoformat(), 12), budget
+    finally:
+        if saved is None:
+            os.environ.pop('TZ')
+        else:
+            os.environ['TZ'] = saved
+        time.tzset()
+
+
+def test_migration_backfills_periods():
+    from app.migrations import upgrade
+    from app.models import Budget, BudgetPeriod
+    app = make_app(bootstrap=False)
+    with app.app_context():
+        upgrade(target=3)
+        # 迁移 4 之前的 budget 表没有 period 列
+        assert 'period' not in {column['name'] for column in db.inspect(db.engine).get_columns('budget')}
+        with db.engine.begin() as conn:
+            conn.execute(db.text(
+                "INSERT INTO budget (name, target_amount, current_amount, category, start_date, end_date, username) "
+                "VALUES ('餐饮预算', 1000, 123.5, '餐饮', '2025-06-01', '2025-06-28', 1)"))
+        assert upgrade(target=4) == [4]
+        # 迁移 7 之前还没有 category_id 列，只读取迁移 4 涉及的列
+        budget = db.session.execute(db.select(Budget.id, Budget.period, Budget.start_date, Budget.end_date)).one()
+        assert (budget.period, budget.start_date, budget.end_date) == ('month', date(2025, 6, 1), date(2025, 6, 30))
+        period = db.session.execute(db.select(BudgetPeriod)).scalar_one()
+        assert (period.budget_id, period.start_date, period.end_date, period.spent) == \
+            (budget.id, date(2025, 6, 1), date(2025, 6, 30), 123.5)
+
+
+if __name__ == '__main__':
+    test_period_bounds()
+    test_recurring_budget_rolls_over(make_app())
+    test_current_period_uses_transaction_clock(make_app())
+    test_migration_backfills_periods()
+    print("budget_period_test 通过")
@@ -0,0 +1,147 @@
+"""
+分类 id 与分类字典测试
+
+使用 SQLite 内存库，检查：
+1. 交易和预算写入时按名称补上 category_id，创建预算校验分类不查询 category 表
+2. 分类改名只更新分类表，交易、预算、报表和分页筛选按 category_id 显示新名称，旧名称查不到改名前的记录
+3. 删除分类后引用置空，记录写回删除时的名称，之后的交易不再计入预算
+4. 其它进程刚添加的分类（本进程的字典没有失效）按名称查不到时重新加载
+5. 迁移出现之前建立的数据库执行全部迁移后补上 category_id 列并按名称回填，分类索引改为 category_id，
+   budget_period 加上级联删除的外键，结构与新数据库执行全部迁移的结果以及模型一致
+
+    cd backend
+    python ../TEST/category_id_test.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from app import db
+from app.metrics import capture_queries
+from conftest import make_app
+
+USERNAME = 9
+
+
+def test_category_ids_follow_renames(app):
+    import app.core.functions as F
+    from app.core import categories
+    from app.models import Transaction, Budget, Category
+    with app.app_context():
+        dining = categories.category_id('餐饮')
+        assert dining == db.session.execute(db.select(Category.id).where(Category.name == '餐饮')).scalar()
+        assert categories.category_name(dining) == '餐饮'
+
+        with capture_queries() as queries:
+            budget = F.create_budget(USERNAME, {'name': '吃饭', 'target_amount': 500, 'category': '餐饮'})
+        assert budget['success'], budget
+        assert not [sql for sql, _ in queries.queries if 'FROM category' in sql], queries.report()
+        assert not F.create_budget(USERNAME, {'name': '无', 'target_amount': 1, 'category': '不存在'})['success']
+
+        first = F.create_transaction(USERNAME, {'amount': 30, 'type': 'expense', 'category': '餐饮'})['data']
+        unknown = F.create_transaction(USERNAME, {'amount': 5, 'type': 'expense', 'category': '零食'})['data']
+        ids = dict(db.session.execute(db.select(Transaction.id, Transaction.category_id)).all())
+        assert ids == {first['id']: dining, unknown['id']: None}, ids
+
+        # 改名：只更新分类表一行，旧记录按 category_id 显示新名称，预算仍然匹配
+        with capture_queries() as queries:
+            assert F.update_category(dining, '吃饭')['success']
+        assert not [sql for sql, _ in queries.queries if sql.startswith('UPDATE') and 'category SET' not in sql], \
+            queries.report()
+        assert categories.category_name(dining) == '吃饭' and categories.category_id('餐饮') is None
+        assert db.session.get(Transaction, first['id']).category == '餐饮'
+        assert [t['category'] for t in F.get_transactions(USERNAME)['data']] == ['零食', '吃饭']
+        F.create_transaction(USERNAME, {'amount': 20, 'type': 'expense', 'category': '吃饭'})
+        budgets = F.get_budgets(USERNAME)['data']
+        assert [(b['category'], b['current_amount']) for b in budgets] == [('吃饭', 50)], budgets
+        report = {c['name']: c['amount'] for c in F.get_reports(USERNAME)['data']['categories']}
+        assert report == {'吃饭': -50, '零食': -5}, report
+        listed = F.list_transactions(USERNAME, category='吃饭')['data']
+        assert [t['category'] for t in listed] == ['吃饭', '吃饭'], listed
+        assert F.list_transactions(USERNAME, category='餐饮')['data'] == []
+
+        # 删除：引用置空，写回删除时的名称，之后的交易不再计入预算
+        assert F.delete_category(dining)['success']
+        assert db.session.get(Budget, budget['data']['id']).category_id is None
+        assert db.session.get(Transaction, first['id']).category == '吃饭'
+        assert len(F.list_transactions(USERNAME, category='吃饭')['data']) == 2
+        F.create_transaction(USERNAME, {'amount': 7, 'type': 'expense', 'category': '吃饭'})
+        assert F.get_budgets(USERNAME)['data'][0]['current_amount'] == 50
+
+        # 其它进程添加的分类：字典没有失效，查不到时重新加载
+        db.session.add(Category(name='宠物'))
+        db.session.commit()
+        categories._cache['loaded_at'] -= categories.MISS_RELOAD_SECONDS
+        assert categories.category_id('宠物') is not None
+
+
+# 迁移出现之前 db.create_all() 建立的表（首个版本的模型），没有索引和 schema_version
+BASELINE_SCHEMA = [
+    'CREATE TABLE "transaction" (id INTEGER NOT NULL, amount FLOAT NOT NULL, type VARCHAR(10) NOT NULL, '
+    'category VARCHAR(20) NOT NULL, description VARCHAR(100), date DATETIME, username INTEGER NOT NULL, '
+    'PRIMARY KEY (id))',
+    'CREATE TABLE budget (id INTEGER NOT NULL, name VARCHAR(50) NOT NULL, target_amount FLOAT NOT NULL, '
+    'current_amount FLOAT, category VARCHAR(20) NOT NULL, start_date DATE, end_date DATE, '
+    'username INTEGER NOT NULL, PRIMARY KEY (id))',
+    'CREATE TABLE category (id INTEGER NOT NULL, name VARCHAR(20) NOT NULL, PRIMARY KEY (id), UNIQUE (name))',
+    'CREATE TABLE chat (id INTEGER NOT NULL, content TEXT NOT NULL, type INTEGER NOT NULL, date DATETIME, '
+    'username INTEGER NOT NULL, PRIMARY KEY (id))',
+]
+
+
+def schema(inspector):
+    """{表名: (列名集合, 索引名集合)}"""
+    return {table: ({column['name'] for column in inspector.get_columns(table)},
+                    {index['name'] for index in inspector.get_indexes(table)})
+            for table in inspector.get_table_names() if table != 'schema_version'}
+
+
+def test_migrations_upgrade_baseline_database():
+    from app.migrations import upgrade, MIGRATIONS
+    from app.models import Transaction, Budget
+    app = make_app(bootstrap=False)
+    with app.app_context():
+        with db.engine.begin() as conn:
+            for statement in BASELINE_SCHEMA:
+                conn.execute(db.text(statement))
+            conn.execute(db.text("INSERT INTO category (id, name) VALUES (3, '餐饮'), (5, '交通')"))
+            conn.execute(db.text(
+                "INSERT INTO \"transaction\" (amount, type, category, date, username) VALUES "
+                "(-10, 'expense', '餐饮', '2025-06-01 12:00:00', 1), (-3, 'expense', '已删除', '2025-06-02 12:00:00', 1)"))
+            conn.execute(db.text(
+                "INSERT INTO budget (name, target_amount, current_amount, category, start_date, end_date, username) "
+                "VALUES ('交通预算', 300, 0, '交通', '2025-06-01', '2025-06-30', 1)"))
+
+        assert upgrade() == [number for number, _, _ in MIGRATIONS]
+        budget_fks = db.inspect(db.engine).get_foreign_keys('budget_period')
+        assert [(fk['constrained_columns'], fk['referred_table'], fk['options'].get('ondelete'))
+                for fk in budget_fks] == [(['budget_id'], 'budget', 'CASCADE')], budget_fks
+        assert db.session.execute(db.text("SELECT COUNT(*) FROM budget_period")).scalar() == 1
+        categories = db.session.execute(db.select(Transaction.category, Transaction.category_id)
+                                        .order_by(Transaction.id)).all()
+        assert categories == [('餐饮', 3), ('已删除', None)], categories
+        assert db.session.execute(db.select(Budget.category_id, Budget.period)).one() == (5, 'month')
+        inspector = db.inspect(db.engine)
+        for table in ('transaction', 'budget'):
+            assert [(fk['constrained_columns'], fk['referred_table']) for fk in inspector.get_foreign_keys(table)] \
+                == [(['category_id'], 'category')], table
+        upgraded = schema(inspector)
+        assert not {'ix_transaction_username_category_date', 'ix_budget_username_category_dates'} \
+            & (upgraded['transaction'][1] | upgraded['budget'][1]), upgraded
+
+    # 新数据库执行全部迁移后得到同样的结构，且与模型一致
+    fresh = make_app()
+    with fresh.app_context():
+        upgrade()
+        assert schema(db.inspect(db.engine)) == upgraded
+        models = {table.name: ({column.name for column in table.columns}, {index.name for index in table.indexes})
+                  for table in db.metadata.sorted_tables}
+        assert upgraded == models, (upgraded, models)
+
+
+if __name__ == '__main__':
+    test_category_ids_follow_renames(make_app())
+    test_migrations_upgrade_baseline_database()
+    print("category_id_test 通过")
@@ -0,0 +1,110 @@
+"""
+聊天任务队列测试
+
+启动本地桩服务代替真实 LLM，使用临时 SQLite 文件库（任务在其它线程中写库），检查：
+1. POST /api/chat/jobs 不等待 LLM，立即返回 202 和任务 id
+2. 用一个手动执行的 broker 替身检查状态变化 queued -> done，聊天记录由任务写入，重复执行不会重复写入
+3. 默认的 LocalBroker 在后台线程中执行，GET ?wait= 长轮询等到结果
+4. 其他用户查询不到该任务
+
+    cd backend
+    python ../TEST/chat_jobs_test.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from app import db
+from conftest import make_app, login
+from llm_stub_server import start_stub_server, REPLY
+
+
+class ManualBroker:
+    """测试用的 broker：只记录提交的任务，调用 run_all() 时才在应用上下文中执行"""
+
+    def __init__(self, app):
+        self.app = app
+        self.submitted = []
+
+    def submit(self, job_id):
+        self.submitted.append(job_id)
+
+    def wait(self, job_id, timeout):
+        pass
+
+    def stats(self):
+        return {'submitted': len(self.submitted)}
+
+    def run_all(self):
+        from app.core.jobs import run_job
+        with self.app.app_context():
+            for job_id in self.submitted:
+                run_job(job_id)
+
+
+def count_chats(app):
+    from app.models import Chat
+    with app.app_context():
+        return db.session.execute(db.select(db.func.count(Chat.id))).scalar()
+
+
+def test_job_lifecycle_with_stand_in_broker():
+    from app.core.jobs import EXTENSION_KEY
+    server, base_url = start_stub_server()
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app('sqlite:///' + os.path.join(tmp, 'jobs.db'), base_url=base_url)
+        broker = app.extensions[EXTENSION_KEY] = ManualBroker(app)
+        client = login(app.test_client())
+
+        response = client.post('/api/chat/jobs', json={'message': '本月花了多少钱'})
+        assert response.status_code == 202, response.get_json()
+        job = response.get_json()['data']
+        assert job['status'] == 'queued' and broker.submitted == [job['id']]
+        assert server.RequestHandlerClass.requests == 0, "提交任务时不应调用 LLM"
+        assert client.get(f"/api/chat/jobs/{job['id']}").get_json()['data']['status'] == 'queued'
+
+        broker.run_all()
+        broker.run_all()  # 已经执行过的任务不会再次执行
+        data = client.get(f"/api/chat/jobs/{job['id']}").get_json()['data']
+        assert data['status'] == 'done' and data['reply'] == REPLY and data['finished_at'], data
+        assert count_chats(app) == 2
+        assert client.post('/api/chat/jobs', json={}).status_code == 400
+        with app.app_context():
+            db.engine.dispose()
+    server.shutdown()
+
+
+def test_local_broker_long_poll():
+    from app.core.jobs import get_broker
+    server, base_url = start_stub_server(latency=0.3)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app('sqlite:///' + os.path.join(tmp, 'jobs.db'), base_url=base_url)
+        client = login(app.test_client())
+
+        start = time.perf_counter()
+        response = client.post('/api/chat/jobs', json={'message': '这个月的收支情况'})
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 202, response.get_json()
+        assert elapsed < 0.3, f"提交任务耗时 {elapsed:.3f} s，不应等待 LLM"
+        job_id = response.get_json()['data']['id']
+
+        assert login(app.test_client(), '2').get(f'/api/chat/jobs/{job_id}').status_code == 404
+        data = client.get(f'/api/chat/jobs/{job_id}?wait=10').get_json()['data']
+        assert data['status'] == 'done' and data['reply'] == REPLY, data
+        assert count_chats(app) == 2
+        broker = get_broker(app)
+        assert broker.stats() == {'submitted': 1, 'completed': 1, 'pending': 0}, broker.stats()
+        broker.shutdown()
+        with app.app_context():
+            db.engine.dispose()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    test_job_lifecycle_with_stand_in_broker()
+    test_local_broker_long_poll()
+    print("chat_jobs_test 通过")
@@ -0,0 +1,56 @@
+"""
+/api/chat/stream 流式接口测试
+
+启动本地桩服务代替真实 LLM，使用 SQLite 内存库，检查：
+1. 先收到 tool 事件，再收到若干 token 事件，最后是 done 事件
+2. token 拼接起来等于 done 中的完整回复
+3. 流结束后用户消息和机器人回复都已写入 Chat 表
+
+    cd backend
+    python ../TEST/chat_stream_test.py
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from conftest import make_app, login
+from llm_stub_server import start_stub_server, REPLY
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_chat_stream():
+    server, base_url = start_stub_server(token_delay=0.01)
+    app = make_app(base_url=base_url)
+    client = login(app.test_client())
+
+    response = client.post('/api/chat/stream', json={'message': '本月花了多少钱'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+
+    events = parse_events(response.get_data(as_text=True))
+    names = [name for name, _ in events]
+    print("收到事件:", names)
+    assert names[0] == 'tool' and events[0][1]['tool_name'] == 'get_summary'
+    assert names[-1] == 'done' and names.count('token') > 1
+    assert ''.join(data for name, data in events if name == 'token') == events[-1][1]['data'] == REPLY
+
+    with app.app_context():
+        from app.models import Chat
+        saved = Chat.query.order_by(Chat.id).all()
+        assert [(c.type, c.content) for c in saved] == [(1, '本月花了多少钱'), (0, REPLY)]
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    test_chat_stream()
+    print("chat_stream_test 通过")
@@ -0,0 +1,111 @@
+"""
+LLM 熔断测试
+
+用假时钟检查熔断器的状态变化，再用一个无法连接的地址充当 qwen、本地桩服务充当 ecnu，检查：
+1. 连续失败 FAILURE_THRESHOLD 次或错误率过高时熔断，熔断期间不放行请求
+2. 熔断 OPEN_SECONDS 秒后只放行一个探测请求，成功则恢复，失败则继续熔断
+3. qwen 熔断后请求直接发给 ecnu，不再先连接 qwen；get_available_llms、set_default_llm、
+   /api/debug/llm-health 和 /api/metrics 能看到熔断状态
+4. qwen 恢复后探测请求成功，重新作为首选
+
+    cd backend
+    python ../TEST/circuit_breaker_test.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from conftest import make_app
+from llm_stub_server import start_stub_server
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+
+def test_breaker_states():
+    from app.core import breaker as B
+    now = [0.0]
+    breaker = B.CircuitBreaker('test', clock=lambda: now[0])
+
+    for _ in range(B.FAILURE_THRESHOLD - 1):
+        breaker.record(False, 1.0)
+    assert breaker.state == 'closed' and breaker.allow()
+    breaker.record(False, 1.0)
+    assert breaker.state == 'open' and not breaker.allow()
+    assert breaker.snapshot()['retry_in'] == B.OPEN_SECONDS
+
+    # 半开：只放行一个探测请求，探测失败重新熔断
+    now[0] += B.OPEN_SECONDS
+    assert breaker.state == 'half_open'
+    assert breaker.allow() and not breaker.allow()
+    breaker.record(False, 1.0)
+    assert breaker.state == 'open' and breaker.snapshot()['opens'] == 2
+
+    # 探测请求被取消时释放名额，探测成功后恢复
+    now[0] += B.OPEN_SECONDS
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+    breaker.record(True, 0.5)
+    health = breaker.snapshot()
+    assert health['state'] == 'closed' and health['error_rate'] == 0.0 and health['consecutive_failures'] == 0
+    assert health['requests'] == 7 and health['failures'] == 6
+
+    # 错误率：失败不连续，但最近的请求中一半失败
+    breaker = B.CircuitBreaker('test', clock=lambda: now[0])
+    for _ in range(B.MIN_REQUESTS // 2):
+        breaker.record(True, 0.1)
+        breaker.record(False, 0.1)
+    assert breaker.state == 'open', breaker.snapshot()
+
+
+def test_routes_around_open_provider():
+    import app.core.llm as llm
+    from app.core import breaker as B
+    server, base_url = start_stub_server()
+    app = make_app(base_url=base_url)
+    saved_default, saved_open_seconds = llm.DEFAULT_LLM, B.OPEN_SECONDS
+    for config in llm.LLM_CONFIGS.values():
+        config.setdefault("pool", {})["max_retries"] = 0
+    llm.LLM_CONFIGS['qwen']['base_url'] = 'http://127.0.0.1:9/v1'
+    B.reset_breakers()
+    try:
+        for _ in range(B.FAILURE_THRESHOLD):
+            assert llm.complete_chat(MESSAGES, 'qwen')[1] == 'ecnu'
+        health = {item['name']: item for item in llm.get_available_llms()}
+        assert health['qwen']['state'] == 'open' and health['qwen']['failures'] == B.FAILURE_THRESHOLD
+        assert health['ecnu']['state'] == 'closed' and health['ecnu']['avg_latency'] is not None
+
+        # 熔断后不再作为候选；不使用备用时仍然尝试
+        assert [name for name, _, _ in llm.get_llm_candidates('qwen')] == ['ecnu']
+        assert [name for name, _, _ in llm.get_llm_candidates('qwen', use_fallback=False)] == ['qwen']
+        assert llm.complete_chat(MESSAGES, 'qwen')[1] == 'ecnu'
+        assert B.get_breaker('qwen').snapshot()['requests'] == B.FAILURE_THRESHOLD
+        assert llm.set_default_llm('qwen')['state'] == 'open'
+
+        client = app.test_client()
+        data = client.get('/api/debug/llm-health').get_json()['data']
+        assert {item['name']: item['state'] for item in data} == {'ecnu': 'closed', 'qwen': 'open'}
+        assert {item['name'] for item in data if item['default']} == {'qwen'}
+        text = client.get('/api/metrics').get_data(as_text=True)
+        assert 'app_llm_circuit_state{llm="qwen"} 2' in text, text
+        assert f'app_llm_requests_total{{llm="qwen",result="failure"}} {B.FAILURE_THRESHOLD}' in text
+
+        # qwen 恢复：熔断到期后探测成功，重新作为首选
+        llm.LLM_CONFIGS['qwen']['base_url'] = base_url
+        B.OPEN_SECONDS = 0
+        assert llm.complete_chat(MESSAGES, 'qwen')[1] == 'qwen'
+        assert B.get_breaker('qwen').state == 'closed'
+        assert [name for name, _, _ in llm.get_llm_candidates('qwen')] == ['qwen', 'ecnu']
+    finally:
+        B.OPEN_SECONDS = saved_open_seconds
+        llm.DEFAULT_LLM = saved_default
+        B.reset_breakers()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    test_breaker_states()
+    test_routes_around_open_provider()
+    print("circuit_breaker_test 通过")
@@ -0,0 +1,72 @@
+"""
+测试公用的 app、客户端和登录用户
+
+pytest 运行时通过 app / client / user 三个 fixture 使用；测试文件直接运行时（python ../TEST/xxx_test.py）
+从这里 import make_app / login 自己构造同样的参数：
+
+    from conftest import make_app, login
+    test_xxx(make_app())
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import pytest
+from flask import Flask
+from app import db
+
+USERNAME = '1'
+
+
+def make_app(uri='sqlite://', base_url=None, bootstrap=True):
+    """
+    测试用 app：注册 /api 蓝图，默认使用 SQLite 内存库
+    :param uri: 数据库地址，文件库或 MySQL 会先清空已有的表
+    :param base_url: 本地桩 LLM 服务的地址（见 llm_stub_server），所有 LLM 配置都指向它
+    :param bootstrap: 为 True 时执行 bootstrap（迁移、预设分类、默认用户的示例预算），
+                      为 False 时数据库保持为空，由测试自己建表
+    """
+    if base_url is not None:
+        import app.core.llm as llm
+        for config in llm.LLM_CONFIGS.values():
+            config['base_url'] = base_url
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SECRET_KEY'] = 'test'
+    db.init_app(app)
+    from app.api import bp
+    app.register_blueprint(bp, url_prefix='/api')
+    if bootstrap:
+        with app.app_context():
+            from app.migrations import schema_version
+            from app.bootstrap import bootstrap as run_bootstrap
+            db.drop_all()
+            schema_version.drop(db.engine, checkfirst=True)
+            run_bootstrap()
+    return app
+
+
+def login(client, username=USERNAME):
+    """把用户写入测试客户端的 session，相当于已经登录"""
+    with client.session_transaction() as sess:
+        sess['username'] = username
+    return client
+
+
+@pytest.fixture
+def app():
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(client):
+    """默认用户（bootstrap 为其写入了示例预算），client 已经以该用户登录"""
+    login(client)
+    return USERNAME
@@ -0,0 +1,70 @@
+"""
+快速记账解析器的语料基准
+
+用 fastpath_corpus.jsonl 中标注好的消息评估 parse_bookkeeping：
+- 命中率：应当快速记账的消息中被解析出来的比例
+- 准确率：解析出来的结果中金额、类型、分类全部正确的比例
+- 误判：不应快速记账（expected 为 null）却被解析出来的消息
+- 平均解析耗时
+
+    cd backend
+    python ../TEST/fastpath_bench.py
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from app.core.fastpath import parse_bookkeeping
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fastpath_corpus.jsonl')
+CATEGORIES = {'餐饮', '交通', '购物', '娱乐', '医疗', '教育', '住房', '通讯', '旅游', '其他', '储蓄'}
+
+
+def matches(parsed, expected):
+    return (parsed['type'] == expected['type']
+            and abs(parsed['amount'] - expected['amount']) < 1e-9
+            and parsed['category'] == expected['category'])
+
+
+def main():
+    with open(CORPUS, encoding='utf-8') as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    positives = [item for item in corpus if item['expected']]
+    hits, correct, false_positives, wrong = 0, 0, [], []
+
+    start = time.perf_counter()
+    results = [(item, parse_bookkeeping(item['message'], CATEGORIES)) for item in corpus]
+    elapsed = time.perf_counter() - start
+
+    for item, parsed in results:
+        if parsed is None:
+            continue
+        if item['expected'] is None:
+            false_positives.append((item['message'], parsed))
+            continue
+        hits += 1
+        if matches(parsed, item['expected']):
+            correct += 1
+        else:
+            wrong.append((item['message'], parsed, item['expected']))
+
+    print(f"语料: {len(corpus)} 条（应快速记账 {len(positives)} 条）")
+    print(f"命中率: {hits}/{len(positives)} = {hits / len(positives):.1%}")
+    print(f"准确率: {correct}/{hits} = {correct / hits:.1%}" if hits else "准确率: -")
+    print(f"误判: {len(false_positives)}")
+    print(f"平均解析耗时: {elapsed / len(corpus) * 1e6:.1f} µs")
+    for message, parsed, expected in wrong:
+        print(f"  解析错误: {message!r} -> {parsed}，期望 {expected}")
+    for message, parsed in false_positives:
+        print(f"  误判: {message!r} -> {parsed}")
+    missed = [item['message'] for item, parsed in results if item['expected'] and parsed is None]
+    for message in missed:
+        print(f"  未命中: {message!r}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+快速记账解析测试
+
+检查 parse_bookkeeping：
+1. 常见的记账短语解析出正确的金额、类型和分类，"收到"后面不是收入名目时不当作收入
+2. 数字后面跟数量级（万 / 千 / k）、单位（分钟）或外币（美元）时不当作金额
+3. 否定、取消和将来的消息不记账，交给 LLM
+
+    cd backend
+    python ../TEST/fastpath_test.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from app.core.fastpath import parse_bookkeeping
+
+CATEGORIES = {'餐饮', '交通', '购物', '娱乐', '医疗', '教育', '住房', '通讯', '旅游', '其他', '储蓄'}
+
+
+def test_parses_simple_bookkeeping():
+    assert parse_bookkeeping('午饭25元', CATEGORIES) == {
+        'amount': 25.0, 'type': 'expense', 'category': '餐饮', 'description': '午饭'}
+    assert parse_bookkeeping('打车 30', CATEGORIES)['category'] == '交通'
+    income = parse_bookkeeping('工资到账 8000', CATEGORIES)
+    assert (income['amount'], income['type']) == (8000.0, 'income')
+    assert parse_bookkeeping('ktv 200', CATEGORIES)['category'] == '娱乐'
+    assert parse_bookkeeping('收到转账 200', CATEGORIES)['type'] == 'income'
+    assert parse_bookkeeping('收到快递付了运费 12', CATEGORIES) is None
+
+
+def test_rejects_magnitudes_units_and_currencies():
+    for message in ('工资到账 1万', '工资 8k', '房租 3千', '打车30分钟', '午饭25美元', '加油 40升', '房租 3 万'):
+        assert parse_bookkeeping(message, CATEGORIES) is None, message
+
+
+def test_rejects_negation_cancellation_and_future():
+    for message in ('取消午饭25', '不要记打车30', '明天打车 30', '别记午饭25', '下周房租 3000', '打算买衣服 200'):
+        assert parse_bookkeeping(message, CATEGORIES) is None, message
+
+
+if __name__ == '__main__':
+    test_parses_simple_bookkeeping()
+    test_rejects_magnitudes_units_and_currencies()
+    test_rejects_negation_cancellation_and_future()
+    print("fastpath_test 通过")
@@ -0,0 +1,69 @@
+"""
+批量导入校验测试
+
+使用 SQLite 内存库，检查：
+1. NaN / Infinity 等非有限金额被拒绝，不会写入交易表
+2. 行数上限同时作用于上传文件和 JSON 数组两种提交方式
+
+    cd backend
+    python ../TEST/import_test.py
+"""
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from app import db
+from conftest import make_app, login, USERNAME
+
+CATEGORIES = {'餐饮', '交通', '其他'}
+
+
+def row(amount):
+    return {'amount': amount, 'type': 'expense', 'category': '餐饮', 'description': '午饭', 'date': '2024-05-01'}
+
+
+def test_rejects_non_finite_amounts(app, client, user):
+    from app.core.importers import parse_import, validate_rows
+    rows = parse_import('\n'.join(json.dumps(row(value)) for value in (float('nan'), float('inf'), 25)), 'jsonl')
+    valid, errors = validate_rows(rows + [row('-Infinity')], user, CATEGORIES)
+    assert [item['amount'] for item in valid] == [-25]
+    assert [error['row'] for error in errors] == [1, 2, 4], errors
+
+    response = client.post('/api/transactions/import', data='[{"amount": NaN, "type": "expense", '
+                           '"category": "餐饮", "date": "2024-05-01"}]', content_type='application/json')
+    assert response.status_code == 400, response.get_json()
+    from app.models import Transaction
+    with app.app_context():
+        assert db.session.execute(db.select(db.func.count(Transaction.id))).scalar() == 0
+
+
+def test_row_limit_applies_to_files_and_json(client, user):
+    import app.core.importers as importers
+    limit = importers.MAX_IMPORT_ROWS
+    importers.MAX_IMPORT_ROWS = 3
+    try:
+        rows = [row(10 + i) for i in range(4)]
+        response = client.post('/api/transactions/import', json=rows)
+        assert response.status_code == 400 and '最多导入 3 条' in response.get_json()['error']
+        response = client.post('/api/transactions/import', json={'rows': rows})
+        assert response.status_code == 400
+        content = '\n'.join(json.dumps(item) for item in rows).encode()
+        response = client.post('/api/transactions/import', data={'file': (io.BytesIO(content), 'rows.jsonl')},
+                               content_type='multipart/form-data')
+        assert response.status_code == 400 and '最多导入 3 条' in response.get_json()['error']
+
+        response = client.post('/api/transactions/import', json=rows[:3])
+        assert response.status_code == 201, response.get_json()
+    finally:
+        importers.MAX_IMPORT_ROWS = limit
+
+
+if __name__ == '__main__':
+    app = make_app()
+    test_rejects_non_finite_amounts(app, login(app.test_client()), USERNAME)
+    test_row_limit_applies_to_files_and_json(login(make_app().test_client()), USERNAME)
+    print("import_test 通过")
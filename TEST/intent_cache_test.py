@@ -0,0 +1,99 @@
+"""
+只读意图缓存测试
+
+先用假时钟检查 IntentCache 本身，再启动本地桩服务代替真实 LLM、使用 SQLite 内存库检查 call_llm：
+1. 归一化后相同的消息命中缓存，过期、超出容量或被清空后重新解析；上一轮对话不同或参数带游标时不命中
+2. 重复的只读问题第二次不再请求第一阶段 LLM，工具结果仍然重新计算
+3. 写入工具从不缓存，每次都请求 LLM；写入后清空该用户的缓存，其他用户不受影响
+
+    cd backend
+    python ../TEST/intent_cache_test.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from conftest import make_app
+from llm_stub_server import start_stub_server, TOOL_CALL
+
+USERNAME = '41'
+OTHER = '42'
+
+
+def test_intent_cache_entries():
+    from app.core.intent_cache import IntentCache
+    now = [0.0]
+    cache = IntentCache(max_entries=2, ttl=10, clock=lambda: now[0])
+    cache.put(USERNAME, '本月花了多少钱？', 'get_summary', {'username': USERNAME})
+    assert cache.get(USERNAME, '本月 花了多少钱')['tool_name'] == 'get_summary'
+    assert cache.get(OTHER, '本月花了多少钱') is None, "缓存按用户隔离"
+
+    cache.put(USERNAME, '记一笔午饭25', 'create_transaction', {'username': USERNAME, 'data': {}})
+    assert cache.get(USERNAME, '记一笔午饭25') is None, "写入工具不缓存"
+    cache.put(USERNAME, '下一页', 'list_transactions', {'username': USERNAME, 'cursor': 'abc'})
+    assert cache.get(USERNAME, '下一页') is None, "带翻页游标的调用不缓存"
+    cache.put(USERNAME, '那上个月呢', 'get_summary', {'username': USERNAME}, context='a')
+    assert cache.get(USERNAME, '那上个月呢', context='b') is None, "上一轮对话不同时不命中"
+    assert cache.get(USERNAME, '那上个月呢', context='a') is not None
+
+    now[0] = 10.5
+    assert cache.get(USERNAME, '本月花了多少钱') is None, "过期后重新解析"
+    assert cache.get(USERNAME, '那上个月呢', context='a') is None
+    assert cache.stats()['entries'] == 0
+
+    for message in ('预算', '报表', '最近交易'):
+        cache.put(USERNAME, message, 'get_budgets', {'username': USERNAME})
+    assert cache.get(USERNAME, '预算') is None and cache.get(USERNAME, '最近交易') is not None
+    cache.invalidate(USERNAME)
+    assert cache.get(USERNAME, '最近交易') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['invalidations']) == (3, 1), stats
+
+
+def test_call_llm_uses_cache_for_reads_only():
+    from app.core.intent_cache import intent_cache
+    from app.core.llm import call_llm, available_functions
+    server, base_url = start_stub_server()
+    app = make_app(base_url=base_url)
+    handler = server.RequestHandlerClass
+    intent_cache.clear()
+    try:
+        with app.app_context():
+            def ask(message, username=USERNAME):
+                before = handler.requests
+                result = call_llm(message, username, functions=available_functions)
+                assert result['status'], result
+                return result, handler.requests - before
+
+            handler.tool_call = dict(TOOL_CALL, args_list={"get_summary": {"username": USERNAME}})
+            first, calls = ask('本月花了多少钱')
+            assert calls == 1 and first['result']['data']['expense'] == 0
+            ask('本月花了多少钱', OTHER)
+            second, calls = ask('本月花了多少钱？')
+            assert calls == 0 and second['tool_name'] == 'get_summary'
+
+            write = {"thought": "记账", "status": "true", "tool_names": "create_transaction",
+                     "args_list": {"create_transaction": {"username": USERNAME, "data": {
+                         "amount": 25, "type": "expense", "category": "餐饮", "description": "午饭"}}}}
+            handler.tool_call = write
+            for _ in range(2):
+                result, calls = ask('帮我把那笔记上')
+                assert calls == 1 and result['result']['success'], result
+
+            # 写入清空了该用户的缓存，工具结果反映新的交易；其他用户的缓存仍然有效
+            handler.tool_call = dict(TOOL_CALL, args_list={"get_summary": {"username": USERNAME}})
+            third, calls = ask('本月花了多少钱')
+            assert calls == 1 and third['result']['data']['expense'] == -50, third
+            _, calls = ask('本月花了多少钱', OTHER)
+            assert calls == 0
+    finally:
+        intent_cache.clear()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    test_intent_cache_entries()
+    test_call_llm_uses_cache_for_reads_only()
+    print("intent_cache_test 通过")
@@ -0,0 +1,82 @@
+"""
+LLM 客户端复用基准测试
+
+对本地桩服务发起相同的 chat.completions 请求，对比：
+- 每次调用新建 OpenAI 客户端（旧的 get_llm_client 行为）
+- 使用 get_llm_client 共享的带连接池客户端
+分别测试单线程串行和多线程并发两种情况，打印平均延迟、p95 和吞吐。
+
+    cd backend
+    python ../TEST/llm_client_bench.py --requests 300 --threads 8
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from openai import OpenAI
+from llm_stub_server import start_stub_server
+import app.core.llm as llm
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+
+def fresh_client_call(llm_name):
+    config = llm.LLM_CONFIGS[llm_name]
+    client = OpenAI(api_key=config["api_key"], base_url=config["base_url"])
+    client.chat.completions.create(model=config["model"], messages=MESSAGES)
+
+
+def pooled_client_call(llm_name):
+    client, config = llm.get_llm_client(llm_name)
+    client.chat.completions.create(model=config["model"], messages=MESSAGES)
+
+
+def timed(call, llm_name):
+    start = time.perf_counter()
+    call(llm_name)
+    return time.perf_counter() - start
+
+
+def run(label, call, requests, threads, llm_name):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(lambda _: timed(call, llm_name), range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:28s} 平均 {statistics.mean(latencies) * 1000:7.2f} ms  "
+          f"p95 {p95 * 1000:7.2f} ms  吞吐 {requests / elapsed:7.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 客户端复用基准测试")
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.0, help="桩服务的响应延迟（秒）")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency)
+    llm_name = llm.DEFAULT_LLM
+    llm.LLM_CONFIGS[llm_name]["base_url"] = base_url
+
+    # 预热，排除首次导入和建连的开销
+    fresh_client_call(llm_name)
+    pooled_client_call(llm_name)
+
+    for threads in (1, args.threads):
+        print(f"\n===== {threads} 线程, {args.requests} 次请求 =====")
+        run("每次新建客户端", fresh_client_call, args.requests, threads, llm_name)
+        run("共享连接池客户端", pooled_client_call, args.requests, threads, llm_name)
+
+    llm.close_llm_clients()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
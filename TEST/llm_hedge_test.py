@@ -0,0 +1,101 @@
+"""
+对冲请求测试
+
+用两个不同延迟的本地桩服务分别充当 qwen 和 ecnu，检查：
+1. 首选LLM够快时直接使用首选，不触发对冲
+2. 首选LLM超过 hedge_delay 未返回时，向备用LLM发出请求并采用先返回的结果
+3. 首选LLM无法连接时立即切换到备用LLM，不等待 hedge_delay
+4. 'auto' 对冲延迟按首选LLM最近成功请求耗时的 p95 计算，不低于 LLM_HEDGE_MIN_DELAY
+
+    cd backend
+    python ../TEST/llm_hedge_test.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import app.core.llm as llm
+from app.core.llm_async import HEDGE_STATS
+from llm_stub_server import start_stub_server
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+
+def timed_complete():
+    start = time.perf_counter()
+    response, answered_by = llm.complete_chat(MESSAGES, 'qwen')
+    return answered_by, time.perf_counter() - start
+
+
+def test_hedging():
+    fast_server, fast_url = start_stub_server(latency=0.05)
+    slow_server, slow_url = start_stub_server(latency=2.0)
+    llm.LLM_HEDGE_DELAY = 0.3
+    for config in llm.LLM_CONFIGS.values():
+        config.setdefault("pool", {})["max_retries"] = 0
+
+    # 1. 首选够快
+    llm.LLM_CONFIGS['qwen']['base_url'] = fast_url
+    llm.LLM_CONFIGS['ecnu']['base_url'] = slow_url
+    hedged_before = HEDGE_STATS['hedged']
+    answered_by, elapsed = timed_complete()
+    print(f"首选够快: {answered_by}, {elapsed:.2f}s")
+    assert answered_by == 'qwen' and HEDGE_STATS['hedged'] == hedged_before
+
+    # 2. 首选慢，备用快
+    llm.LLM_CONFIGS['qwen']['base_url'] = slow_url
+    llm.LLM_CONFIGS['ecnu']['base_url'] = fast_url
+    answered_by, elapsed = timed_complete()
+    print(f"首选慢: {answered_by}, {elapsed:.2f}s")
+    assert answered_by == 'ecnu' and elapsed < 1.0
+    assert HEDGE_STATS['hedged'] == hedged_before + 1
+
+    # 3. 首选不可用
+    llm.LLM_CONFIGS['qwen']['base_url'] = 'http://127.0.0.1:9/v1'
+    answered_by, elapsed = timed_complete()
+    print(f"首选不可用: {answered_by}, {elapsed:.2f}s")
+    assert answered_by == 'ecnu' and elapsed < llm.LLM_HEDGE_DELAY + 0.2
+
+    fast_server.shutdown()
+    slow_server.shutdown()
+
+
+def test_auto_hedge_delay():
+    from app.core.breaker import get_breaker, reset_breakers
+    saved = llm.LLM_HEDGE_DELAY
+    llm.LLM_HEDGE_DELAY = 'auto'
+    reset_breakers()
+    try:
+        breaker = get_breaker('qwen')
+        for _ in range(llm.LLM_HEDGE_MIN_SAMPLES - 1):
+            breaker.record(True, 30.0)
+        assert llm.get_hedge_delay('qwen') == llm.LLM_HEDGE_MIN_DELAY, "样本不足时使用最小延迟"
+        reset_breakers()
+        breaker = get_breaker('qwen')
+        # 失败请求的耗时不计入
+        breaker.record(False, 99.0)
+        for latency in range(1, 21):
+            breaker.record(True, float(latency))
+        assert llm.get_hedge_delay('qwen') == 19.0
+        assert breaker.snapshot()['p95_latency'] == 19.0
+        for _ in range(get_breaker('ecnu').latencies.maxlen):
+            get_breaker('ecnu').record(True, 2.0)
+        assert llm.get_hedge_delay('ecnu') == llm.LLM_HEDGE_MIN_DELAY, "快的LLM也不低于最小延迟"
+
+        llm.LLM_CONFIGS['qwen']['hedge_delay'] = 1.5
+        assert llm.get_hedge_delay('qwen') == 1.5
+        llm.LLM_HEDGE_DELAY = None
+        assert llm.get_hedge_delay('ecnu') is None
+    finally:
+        llm.LLM_CONFIGS['qwen'].pop('hedge_delay', None)
+        llm.LLM_HEDGE_DELAY = saved
+        reset_breakers()
+
+
+if __name__ == '__main__':
+    test_hedging()
+    test_auto_hedge_delay()
+    print("llm_hedge_test 通过")
@@ -0,0 +1,128 @@
+"""
+本地的 OpenAI 兼容桩服务，用于在不访问 dashscope / chat.ecnu.edu.cn 的情况下测试 LLM 相关代码
+
+- 第一阶段（system prompt 中包含工具列表）返回一次 get_summary 工具调用，可以用 tool_call 参数替换
+- 其它请求返回一段固定的中文回复，支持 stream=True 逐字推送
+
+    python llm_stub_server.py --port 8765 --latency 0.2
+    # 然后把 LLM_CONFIGS[...]["base_url"] 指向 http://127.0.0.1:8765/v1
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOOL_CALL = {
+    "thought": "用户想了解本月的收支情况，调用 get_summary",
+    "status": "true",
+    "tool_names": "get_summary",
+    "args_list": {"get_summary": {"username": "1"}},
+}
+REPLY = "本月您总共支出了32.00元，收入100.00元，结余68.00元。"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.0        # 返回第一个字节前的等待时间（秒）
+    token_delay = 0.0    # 流式输出时每段之间的间隔（秒）
+    requests = 0
+    received = []        # 收到的请求体，测试中用来检查发给 LLM 的消息
+    tool_call = TOOL_CALL  # 第一阶段返回的 JSON
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        type(self).requests += 1
+        self.received.append(body)
+
+        if not self.path.endswith('/chat/completions'):
+            self.send_error(404)
+            return
+
+        time.sleep(self.latency)
+        messages = body.get('messages', [])
+        system = messages[0]['content'] if messages else ''
+        content = json.dumps(self.tool_call, ensure_ascii=False) if '### Tool List ###' in system else REPLY
+
+        if body.get('stream'):
+            self.stream(body.get('model', 'stub'), content)
+        else:
+            self.reply(body.get('model', 'stub'), content)
+
+    def reply(self, model, content):
+        payload = json.dumps({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 100, "completion_tokens": len(content), "total_tokens": 100 + len(content)},
+        }, ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def stream(self, model, content):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+        pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+        for index, piece in enumerate(pieces):
+            chunk = {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": piece},
+                    "finish_reason": "stop" if index == len(pieces) - 1 else None,
+                }],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(self.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def start_stub_server(port=0, latency=0.0, token_delay=0.0, tool_call=None):
+    """
+    在后台线程中启动桩服务，返回 (server, base_url)；收到的请求体在 server.RequestHandlerClass.received 中
+    tool_call 替换第一阶段返回的工具调用，默认为 TOOL_CALL
+    """
+    handler = type('ConfiguredStubHandler', (StubHandler,),
+                   {'latency': latency, 'token_delay': token_delay, 'received': [],
+                    'tool_call': tool_call or TOOL_CALL})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="OpenAI 兼容桩服务")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="首字节延迟（秒）")
+    parser.add_argument('--token-delay', type=float, default=0.05, help="流式输出的分段间隔（秒）")
+    args = parser.parse_args()
+    server, base_url = start_stub_server(args.port, args.latency, args.token_delay)
+    print(f"桩服务已启动: {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,70 @@
+"""
+日志测试
+
+模拟 gunicorn：master 进程先初始化日志（on_starting 中的 create_app），再 fork 出 worker，
+检查 worker 中再次调用 setup_logging 会启动自己的后台线程，日志能写出来而不是堆在队列里。
+另外检查经过队列的异常日志在 JSON 中仍有单独的 exc_info 字段，message 中不含堆栈。
+
+    cd backend
+    python ../TEST/log_test.py
+"""
+import io
+import json
+import logging
+import os
+import queue
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+CONFIG = {'LOG_LEVEL': 'INFO', 'LOG_FORMAT': 'json'}
+
+
+def test_worker_restarts_listener_after_fork():
+    from app import log
+    log.setup_logging(CONFIG)
+    master_listener = log._listener
+
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            sys.stderr = io.StringIO()
+            log.setup_logging(CONFIG)
+            logging.getLogger('app.worker').info("worker 日志")
+            log._listener.stop()
+            if log._listener is not master_listener and 'worker 日志' in sys.stderr.getvalue():
+                code = 0
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0, "worker 的日志没有写出"
+    # master 中仍然只初始化一次
+    log.setup_logging(CONFIG)
+    assert log._listener is master_listener
+
+
+def test_exc_info_survives_queue():
+    from app import log
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger('app.log_test')
+    logger.addHandler(log.StructuredQueueHandler(log_queue))
+    logger.propagate = False
+    try:
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logger.exception("计算失败 %s", 'x', extra={"job_id": 7})
+    finally:
+        logger.handlers.clear()
+        logger.propagate = True
+
+    entry = json.loads(log.JsonFormatter().format(log_queue.get_nowait()))
+    assert entry['message'] == '计算失败 x' and entry['job_id'] == 7, entry
+    assert entry['exc_info'].startswith('Traceback') and 'ZeroDivisionError' in entry['exc_info'], entry
+
+
+if __name__ == '__main__':
+    test_worker_restarts_listener_after_fork()
+    test_exc_info_survives_queue()
+    print("log_test 通过")
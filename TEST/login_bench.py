@@ -0,0 +1,147 @@
+"""
+登录吞吐压测
+
+在本进程中启动一个多线程 HTTP 服务，分别压测
+- /api/login：users 表 + SQLAlchemy 连接池，一次查询按用户名或邮箱查找
+- /legacy/login：旧实现，每个请求新建 sqlite3 连接，先按用户名、再按邮箱查询
+打印不同并发数下的每秒登录次数和 p95 延迟。一半请求使用邮箱登录。
+
+    cd backend
+    python ../TEST/login_bench.py
+    python ../TEST/login_bench.py --workers 1 4 16 --requests 4000
+    python ../TEST/login_bench.py --url http://127.0.0.1:5123 --skip-legacy   # 压测已启动的服务（用户需已存在）
+
+服务端和压测线程共用一个进程（以及 GIL），结果适合对比两种实现，绝对吞吐以 --url 压测真实部署为准。
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from flask import request, session, jsonify
+from werkzeug.serving import make_server
+from app import db
+from conftest import make_app
+
+LEGACY_DB = 'login_bench_legacy.db'
+
+
+def make_login_app(uri, users):
+    app = make_app(uri)
+    from app.auth import bp
+    app.register_blueprint(bp)
+
+    @app.route('/legacy/login', methods=['POST'])
+    def legacy_login():
+        data = request.get_json()
+        username, password = data.get('username'), data.get('password')
+        conn = sqlite3.connect(LEGACY_DB)
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT * FROM users WHERE username=? and password=?", (username, password))
+            if cursor.fetchone():
+                session['username'] = username
+                return jsonify({'message': 'Login successful', 'user': {'username': username}}), 200
+            cursor.execute("SELECT * FROM users WHERE email=? and password=?", (username, password))
+            if cursor.fetchone():
+                session['username'] = username
+                return jsonify({'message': 'Login successful', 'user': {'email': username}}), 200
+            return jsonify({"error": "Invalid username or password"}), 401
+        finally:
+            conn.close()
+
+    with app.app_context():
+        from app.models import User
+        db.session.execute(db.insert(User), users)
+        db.session.commit()
+
+    if os.path.exists(LEGACY_DB):
+        os.remove(LEGACY_DB)
+    conn = sqlite3.connect(LEGACY_DB)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL, "
+                 "password TEXT NOT NULL, email TEXT UNIQUE)")
+    conn.executemany("INSERT INTO users (username, password, email) VALUES (:username, :password, :email)", users)
+    conn.commit()
+    conn.close()
+    return app
+
+
+def login_once(host, port, path, body):
+    conn = HTTPConnection(host, port, timeout=30)
+    try:
+        start = time.perf_counter()
+        conn.request('POST', path, body=body, headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        response.read()
+        assert response.status == 200, response.status
+        return time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def run(host, port, path, bodies, workers):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = sorted(pool.map(lambda body: login_once(host, port, path, body), bodies))
+    elapsed = time.perf_counter() - start
+    return len(bodies) / elapsed, latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="登录吞吐压测")
+    parser.add_argument('--uri', default='sqlite:///login_bench.db')
+    parser.add_argument('--url', default=None, help="压测已启动的服务，不启动本地服务")
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=2000, help="每个并发数下的请求数")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--skip-legacy', action='store_true')
+    args = parser.parse_args()
+
+    users = [{'username': f'user{i}', 'password': f'pw{i}', 'email': f'user{i}@example.com'}
+             for i in range(args.users)]
+    random.seed(3)
+    sample = random.choices(users, k=args.requests)
+    bodies = [json.dumps({'username': user['email'] if i % 2 else user['username'], 'password': user['password']})
+              for i, user in enumerate(sample)]
+
+    server = None
+    if args.url:
+        target = urlparse(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        app = make_login_app(args.uri, users)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = '127.0.0.1', server.server_port
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    paths = ['/api/login'] if args.skip_legacy or args.url else ['/api/login', '/legacy/login']
+    results = []
+    # 登录接口会打印调试信息，压测时丢弃
+    with contextlib.redirect_stdout(io.StringIO()):
+        for path in paths:
+            for workers in args.workers:
+                results.append((path, workers) + run(host, port, path, bodies, workers))
+    if server is not None:
+        server.shutdown()
+
+    print(f"{'接口':<16}{'并发':>6}{'登录/秒':>12}{'p95 (ms)':>12}")
+    for path, workers, throughput, p95 in results:
+        print(f"{path:<16}{workers:>6}{throughput:>12,.0f}{p95 * 1000:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
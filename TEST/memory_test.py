@@ -0,0 +1,118 @@
+"""
+对话记忆测试
+
+1. 窗口按估算的 token 数限制大小，挤出的轮次压缩成摘要，摘要也有上限
+2. 第一次使用时用一条查询读取最近的聊天记录，之后不再访问数据库
+3. 通过 /api/chat 连续对话时，第二轮发给 LLM 的两个阶段都带上了上一轮的消息、工具结果和回复，
+   且本轮消息不会因为已加入 session 而重复出现
+4. 同一句追问（"那上个月呢"）在不同的上一轮之后重新请求第一阶段 LLM，不会使用意图缓存中上次解析的工具和参数
+
+    cd backend
+    python ../TEST/memory_test.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from app import db
+from app.metrics import capture_queries
+from conftest import make_app, login
+from llm_stub_server import start_stub_server, REPLY, TOOL_CALL
+
+
+def test_window_is_token_bounded():
+    from app.core import memory
+    conversation = memory.Conversation()
+    for i in range(200):
+        conversation.append('user', f'第 {i} 条消息：' + '午饭花了二十五元' * 10)
+    assert conversation.tokens <= memory.WINDOW_TOKEN_BUDGET
+    assert conversation.summary_tokens <= memory.SUMMARY_TOKEN_BUDGET
+    assert conversation.tokens == sum(tokens for _, _, tokens in conversation.turns)
+    messages = conversation.messages()
+    assert messages[0]['role'] == 'system' and '第 1 条' not in messages[0]['content']
+    assert messages[-1]['content'].startswith('第 199 条消息')
+    total = sum(memory.estimate_tokens(m['content']) for m in messages)
+    assert total <= memory.WINDOW_TOKEN_BUDGET + memory.SUMMARY_TOKEN_BUDGET + 20, total
+
+
+def test_loaded_with_one_query():
+    from app.core.memory import ConversationMemory, HISTORY_LOAD_LIMIT
+    from app.models import Chat
+    server, base_url = start_stub_server()
+    app = make_app(base_url=base_url)
+    server.shutdown()
+    with app.app_context():
+        db.session.add_all([Chat(content=f'消息 {i}', type=i % 2, username=3) for i in range(50)])
+        db.session.commit()
+        memory = ConversationMemory()
+        with capture_queries() as first:
+            window = memory.window(3)
+        with capture_queries() as second:
+            memory.record(3, '再来一条', '好的')
+            memory.window(3)
+        assert first.count == 1, first.report()
+        assert second.count == 0, second.report()
+        assert len(window) == HISTORY_LOAD_LIMIT and window[-1]['content'] == '消息 49', window
+        assert memory.stats()['hits'] == 2
+
+
+def test_chat_includes_previous_turns():
+    from app.core.memory import conversation_memory
+    conversation_memory.clear()
+    loads = conversation_memory.stats()['loads']
+    server, base_url = start_stub_server()
+    app = make_app(base_url=base_url)
+    client = login(app.test_client())
+
+    assert client.post('/api/chat', json={'message': '这个月的收支情况'}).status_code == 200
+    received = server.RequestHandlerClass.received
+    first_round = len(received)
+    assert client.post('/api/chat', json={'message': '那上个月呢'}).status_code == 200
+    server.shutdown()
+
+    first_stage, second_stage = received[first_round:]
+    for body in (first_stage, second_stage):
+        contents = [message['content'] for message in body['messages']]
+        assert '这个月的收支情况' in contents, contents
+        assert REPLY in contents, contents
+        assert any('get_summary' in content for content in contents), contents
+        assert sum('那上个月呢' in content for content in contents) == 1, contents
+    assert conversation_memory.stats()['loads'] - loads == 1
+
+
+def test_follow_up_resolved_in_context():
+    from app.core.intent_cache import intent_cache
+    from app.core.memory import conversation_memory
+    conversation_memory.clear()
+    intent_cache.clear()
+    server, base_url = start_stub_server()
+    handler = server.RequestHandlerClass
+    app = make_app(base_url=base_url)
+    client = login(app.test_client(), '6')
+
+    def chat(message, tool_name, args):
+        handler.tool_call = dict(TOOL_CALL, tool_names=tool_name, args_list={tool_name: dict(args, username='6')})
+        before = handler.requests
+        assert client.post('/api/chat', json={'message': message}).status_code == 200
+        return handler.requests - before
+
+    try:
+        assert chat('这个月的收支情况', 'get_summary', {}) == 2
+        assert chat('那上个月呢', 'get_reports', {'range_type': 'month'}) == 2
+        assert chat('看看预算', 'get_budgets', {}) == 2
+        # 上一轮不同：再次解析，得到新的工具调用
+        assert chat('那上个月呢', 'get_transactions', {'limit': 5}) == 2
+        assert 'get_transactions' in conversation_memory.window('6')[-2]['content']
+    finally:
+        intent_cache.clear()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    test_window_is_token_bounded()
+    test_loaded_with_one_query()
+    test_chat_includes_previous_turns()
+    test_follow_up_resolved_in_context()
+    print("memory_test 通过")
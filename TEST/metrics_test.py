@@ -0,0 +1,81 @@
+"""
+/api/metrics 测试
+
+启动本地桩服务代替真实 LLM，使用 SQLite 内存库，请求一次 /api/chat 和 /api/summary 后检查：
+1. 输出是合法的 Prometheus 文本格式
+2. 包含两个路由的请求耗时、聊天各阶段耗时、get_summary 工具耗时
+3. 每个请求的 SQL 语句数被统计到对应路由
+4. create_app 在 Prometheus 默认的 /metrics 路径上输出同样的内容
+
+    cd backend
+    python ../TEST/metrics_test.py
+"""
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from conftest import make_app, login
+from llm_stub_server import start_stub_server
+
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[^}]*\})? [-+0-9.eInf]+$')
+
+
+def parse_samples(text):
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith('#') or not line:
+            continue
+        assert SAMPLE_LINE.match(line), f"不合法的指标行: {line}"
+        name, value = line.rsplit(' ', 1)
+        samples[name] = float(value)
+    return samples
+
+
+def test_metrics():
+    from app.core.intent_cache import intent_cache
+    # 同一进程中的其他测试可能缓存了同一条消息，命中时会跳过第一阶段
+    intent_cache.clear()
+    server, base_url = start_stub_server()
+    app = make_app(base_url=base_url)
+    client = login(app.test_client())
+    # 统计是进程级的，和其他测试在同一进程中运行时只比较本测试产生的增量
+    before = parse_samples(client.get('/api/metrics').get_data(as_text=True))
+
+    assert client.post('/api/chat', json={'message': '这个月的收支情况'}).status_code == 200
+    assert client.get('/api/summary').status_code == 200
+
+    response = client.get('/api/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    after = parse_samples(response.get_data(as_text=True))
+    samples = {name: value - before.get(name, 0) for name, value in after.items()}
+    server.shutdown()
+
+    assert samples['app_request_duration_seconds_count{method="POST",route="/api/chat",status="200"}'] == 1
+    assert samples['app_request_duration_seconds_count{method="GET",route="/api/summary",status="200"}'] == 1
+    for stage in ('chat_llm', 'call_llm', 'llm_first_stage', 'llm_second_stage', 'chat_persist', 'fastpath'):
+        assert samples[f'app_stage_duration_seconds_count{{stage="{stage}"}}'] >= 1, stage
+    assert samples['app_tool_duration_seconds_count{tool="get_summary"}'] == 1
+    # /api/summary 只需读取月度汇总
+    assert samples['app_request_sql_queries_sum{route="/api/summary"}'] >= 1
+    assert samples['app_request_sql_queries_sum{route="/api/chat"}'] >= 3
+    assert samples['app_sql_query_duration_seconds_count{statement="SELECT"}'] >= 2
+    assert samples['app_llm_hedge_total{event="requests"}'] == 2
+
+
+def test_metrics_at_default_path():
+    from app import create_app
+    client = create_app('testing').test_client()
+    response = client.get('/metrics')
+    assert response.status_code == 200 and response.content_type.startswith('text/plain')
+    assert set(parse_samples(response.get_data(as_text=True))) == \
+        set(parse_samples(client.get('/api/metrics').get_data(as_text=True)))
+
+
+if __name__ == '__main__':
+    test_metrics()
+    test_metrics_at_default_path()
+    print("metrics_test 通过")
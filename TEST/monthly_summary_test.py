@@ -0,0 +1,85 @@
+"""
+月度汇总测试
+
+使用 SQLite 内存库，依次创建、修改（金额 / 类型 / 分类）、删除交易并批量导入历史月份的交易，
+每一步之后检查 monthly_summary 与 rebuild_summaries() 根据交易表重新生成的结果一致，
+并检查 get_summary 读到的本月收支。
+
+    cd backend
+    python ../TEST/monthly_summary_test.py
+"""
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from app import db
+from conftest import make_app
+
+USERNAME = 11
+OTHER = 12
+
+
+def summaries():
+    """{(用户, 年, 月, 类型): (金额, 笔数)}，忽略增量维护留下的 0 笔记录"""
+    from app.models import MonthlySummary
+    rows = db.session.execute(db.select(MonthlySummary)).scalars()
+    return {(row.username, row.year, row.month, row.type): (round(row.total, 2), row.count)
+            for row in rows if row.count}
+
+
+def check_matches_rebuild():
+    import app.core.functions as F
+    maintained = summaries()
+    F.rebuild_summaries()
+    rebuilt = summaries()
+    assert maintained == rebuilt, (maintained, rebuilt)
+    return rebuilt
+
+
+def test_summary_follows_writes(app):
+    import app.core.functions as F
+    with app.app_context():
+        now = datetime.utcnow()
+        key = (USERNAME, now.year, now.month)
+
+        lunch = F.create_transaction(USERNAME, {'amount': 25, 'type': 'expense', 'category': '餐饮'})['data']
+        salary = F.create_transaction(USERNAME, {'amount': 8000, 'type': 'income', 'category': '其他'})['data']
+        F.create_transaction(OTHER, {'amount': 99, 'type': 'expense', 'category': '购物'})
+        assert check_matches_rebuild()[key + ('expense',)] == (-25, 1)
+
+        # 金额、分类、类型变化
+        assert F.update_transaction(lunch['id'], {'amount': -40, 'category': '交通'})['success']
+        assert check_matches_rebuild()[key + ('expense',)] == (-40, 1)
+        assert F.update_transaction(salary['id'], {'type': 'expense', 'amount': -300})['success']
+        state = check_matches_rebuild()
+        assert state[key + ('expense',)] == (-340, 2) and key + ('income',) not in state, state
+
+        # 历史月份：导入后修改和删除都作用在交易日期所在的月份
+        last_year = datetime(now.year - 1, 3, 15, 12)
+        F.import_transactions(USERNAME, [
+            {'amount': -10.5, 'type': 'expense', 'category': '餐饮', 'description': None,
+             'date': last_year, 'username': USERNAME},
+            {'amount': 500, 'type': 'income', 'category': '其他', 'description': None,
+             'date': last_year, 'username': USERNAME},
+        ])
+        state = check_matches_rebuild()
+        assert state[(USERNAME, now.year - 1, 3, 'expense')] == (-10.5, 1)
+        from app.models import Transaction
+        old = db.session.execute(db.select(Transaction.id).where(Transaction.amount == 500)).scalar()
+        assert F.update_transaction(old, {'amount': 650})['success']
+        assert check_matches_rebuild()[(USERNAME, now.year - 1, 3, 'income')] == (650, 1)
+        assert F.delete_transaction(old)['success']
+        assert (USERNAME, now.year - 1, 3, 'income') not in check_matches_rebuild()
+
+        assert F.delete_transaction(lunch['id'])['success']
+        assert check_matches_rebuild()[key + ('expense',)] == (-300, 1)
+        assert F.get_summary(USERNAME)['data'] == {'expense': -300, 'income': 0, 'balance': -300}
+        assert F.get_summary(OTHER)['data']['expense'] == -99
+
+
+if __name__ == '__main__':
+    test_summary_follows_writes(make_app())
+    print("monthly_summary_test 通过")
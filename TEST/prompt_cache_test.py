@@ -0,0 +1,59 @@
+"""
+system prompt 缓存测试
+
+使用 SQLite 内存库，检查：
+1. 分类和工具集合都没有变化时，再次构建 prompt 直接复用两个片段
+2. 添加 / 改名分类后分类片段重新拼接，prompt 中出现新的分类
+3. 工具集合变化时工具片段重新生成，换回原来的工具集合时命中缓存
+
+    cd backend
+    python ../TEST/prompt_cache_test.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from app import db
+from conftest import make_app
+
+
+def misses():
+    from app.core.llm import get_prompt_stats
+    stats = get_prompt_stats()
+    return stats['tool_block_misses'], stats['category_block_misses']
+
+
+def test_prompt_blocks_cached_and_invalidated(app):
+    import app.core.functions as F
+    from app.core.llm import format_tools_for_prompt, available_functions
+    with app.app_context():
+        first = format_tools_for_prompt(available_functions, username='1')
+        before = misses()
+        assert format_tools_for_prompt(available_functions, username='1') == first
+        assert misses() == before, "没有变化时不应重新拼接"
+        # 用户名不属于缓存的片段
+        assert format_tools_for_prompt(available_functions, username='2') != first and misses() == before
+
+        added = F.add_category('宠物')
+        assert added['success'], added
+        prompt = format_tools_for_prompt(available_functions, username='1')
+        assert '宠物' in prompt and misses() == (before[0], before[1] + 1)
+        assert F.update_category(added['data']['id'], '萌宠')['success']
+        prompt = format_tools_for_prompt(available_functions, username='1')
+        assert '萌宠' in prompt and '宠物' not in prompt
+        assert misses() == (before[0], before[1] + 2)
+
+        subset = {name: available_functions[name] for name in ('get_summary', 'create_transaction')}
+        prompt = format_tools_for_prompt(subset, username='1')
+        assert 'get_summary' in prompt and 'delete_category' not in prompt
+        assert misses() == (before[0] + 1, before[1] + 2)
+        format_tools_for_prompt(available_functions, username='1')
+        format_tools_for_prompt(subset, username='1')
+        assert misses() == (before[0] + 1, before[1] + 2)
+
+
+if __name__ == '__main__':
+    test_prompt_blocks_cached_and_invalidated(make_app())
+    print("prompt_cache_test 通过")
@@ -0,0 +1,125 @@
+"""
+SQL 查询预算测试（N+1 / 慢查询检测）
+
+使用 SQLite 内存库，先执行 bootstrap 并导入 MONTH_ROWS 条本月交易，
+再用 app.metrics.capture_queries() 记录每个 api 请求执行的 SQL，检查：
+1. 每个路由的 SQL 语句数不超过 QUERY_BUDGETS 中的预算
+2. 没有同一条语句执行 N_PLUS_ONE_THRESHOLD 次以上（循环中逐条查询）
+3. 没有单条语句超过 SLOW_QUERY_SECONDS 秒
+
+修改 functions.py 等数据访问代码后，如果语句数增加，先确认是否必要，再调整这里的预算。
+
+    cd backend
+    python ../TEST/query_budget_test.py
+    SLOW_QUERY_SECONDS=0.01 python ../TEST/query_budget_test.py
+"""
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from app.metrics import capture_queries
+from conftest import make_app, login
+
+SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_SECONDS', 0.1))
+N_PLUS_ONE_THRESHOLD = 3
+MONTH_ROWS = 50
+
+# (方法, 路由) -> 允许执行的 SQL 语句数（SELECT / INSERT / UPDATE / DELETE）
+QUERY_BUDGETS = {
+    ('GET', '/api/summary'): 1,
+    ('GET', '/api/transactions'): 1,
+    # 插入交易，月度汇总一条增量 UPDATE，预算查找所在周期 + 一条增量 UPDATE
+    ('POST', '/api/transactions'): 4,
+    # 读取、更新交易，月度汇总一条，新旧两个分类的预算各两条
+    ('PUT', '/api/transactions/<id>'): 7,
+    ('DELETE', '/api/transactions/<id>'): 5,
+    # 月度汇总按 (年, 月, 类型) 各 UPDATE 一次（首次再加一条 INSERT），预算周期一次查询、
+    # 一次插入、一次 executemany 更新，与导入行数无关
+    ('POST', '/api/transactions/import'): 9,
+    # 当前周期和预算一起 JOIN 读出，新周期第一次访问时再插入一条，不扫描交易表
+    ('GET', '/api/plans'): 2,
+    # 插入预算、统计第一个周期已有支出、插入周期；分类检查使用进程内的分类字典
+    ('POST', '/api/plans'): 3,
+    ('GET', '/api/categories'): 1,
+    ('GET', '/api/reports'): 1,
+    ('GET', '/api/reports/series'): 2,
+}
+
+
+def month_rows(count):
+    today = datetime.utcnow()
+    categories = ['餐饮', '交通', '娱乐', '购物']
+    return [{
+        'amount': 10 + i,
+        'type': 'expense' if i % 5 else 'income',
+        'category': categories[i % len(categories)],
+        'description': f'第 {i} 条',
+        'date': today.replace(day=1 + i % min(today.day, 28), hour=12).strftime('%Y-%m-%d %H:%M:%S'),
+    } for i in range(count)]
+
+
+class QueryBudget:
+    """依次请求各路由并记录 SQL，最后统一检查"""
+
+    def __init__(self, client):
+        self.client = client
+        self.results = []
+
+    def call(self, method, url, route, **kwargs):
+        with capture_queries() as queries:
+            response = self.client.open(url, method=method, **kwargs)
+        assert response.status_code < 300, (method, url, response.status_code, response.get_data(as_text=True))
+        self.results.append(((method, route), queries))
+        return response.get_json()
+
+    def print_table(self):
+        print(f"{'路由':<40}{'SQL 数':>8}{'预算':>6}{'耗时 ms':>10}")
+        for key, queries in self.results:
+            print(f"{' '.join(key):<40}{queries.count:>8}{QUERY_BUDGETS.get(key, '-'):>6}"
+                  f"{queries.total_seconds * 1000:>10.2f}")
+
+    def check(self):
+        failures = []
+        for key, queries in self.results:
+            budget = QUERY_BUDGETS[key]
+            if queries.count > budget:
+                failures.append(f"{' '.join(key)} 执行了 {queries.count} 条 SQL，预算 {budget}\n{queries.report()}")
+            for statement, n in queries.repeated(N_PLUS_ONE_THRESHOLD).items():
+                failures.append(f"{' '.join(key)} 疑似 N+1：同一条语句执行了 {n} 次\n  {statement[:200]}")
+            for statement, elapsed in queries.slow(SLOW_QUERY_SECONDS):
+                failures.append(f"{' '.join(key)} 慢查询 {elapsed * 1000:.1f} ms\n  {statement[:200]}")
+        assert not failures, '\n'.join(failures)
+
+
+def test_query_budgets(client, user):
+    budget = QueryBudget(client)
+    budget.call('POST', '/api/transactions/import', '/api/transactions/import', json=month_rows(MONTH_ROWS))
+
+    budget.call('GET', '/api/summary', '/api/summary')
+    budget.call('GET', '/api/transactions?limit=20', '/api/transactions')
+    created = budget.call('POST', '/api/transactions', '/api/transactions',
+                          json={'amount': 30, 'type': 'expense', 'category': '餐饮', 'description': '午饭'})
+    transaction_id = created['data']['id']
+    budget.call('PUT', f'/api/transactions/{transaction_id}', '/api/transactions/<id>',
+                json={'amount': -45, 'category': '交通'})
+    budget.call('DELETE', f'/api/transactions/{transaction_id}', '/api/transactions/<id>')
+
+    budget.call('POST', '/api/plans', '/api/plans',
+                json={'name': '购物预算', 'target_amount': 800, 'category': '购物'})
+    budget.call('GET', '/api/plans', '/api/plans')
+    budget.call('GET', '/api/categories', '/api/categories')
+    budget.call('GET', '/api/reports?range=month', '/api/reports')
+    today = datetime.utcnow().date()
+    budget.call('GET', f'/api/reports/series?start_date={today.replace(day=1)}&end_date={today}&compare=true',
+                '/api/reports/series')
+
+    budget.print_table()
+    budget.check()
+
+
+if __name__ == '__main__':
+    test_query_budgets(login(make_app().test_client()), '1')
+    print("query_budget_test 通过")
@@ -0,0 +1,129 @@
+"""
+限流与 LLM 用量测试
+
+启动本地桩服务代替真实 LLM，使用 SQLite 内存库，检查：
+1. 令牌桶按时间恢复令牌
+2. 用户消息超过频率限制时 /api/chat 立即返回 429 和 Retry-After，不再请求 LLM
+3. 每次请求的 usage 按 (用户, 日期, LLM) 累加，可以从 /api/usage 查询；超过每天的 token 上限时返回 429
+4. 首选 LLM 被限流时切换到备用 LLM，所有 LLM 都被限流时返回 429
+
+    cd backend
+    python ../TEST/ratelimit_test.py
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from conftest import make_app, login
+from llm_stub_server import start_stub_server, TOOL_CALL, REPLY
+
+
+def test_token_bucket():
+    from app.core.ratelimit import TokenBucket
+    now = [0.0]
+    bucket = TokenBucket(2, 0.5, clock=lambda: now[0])
+    assert bucket.acquire() == 0 and bucket.acquire() == 0
+    assert bucket.acquire() == 2.0
+    now[0] = 1.0
+    assert bucket.acquire() == 1.0
+    now[0] = 2.0
+    assert bucket.acquire() == 0
+    now[0] = 100.0
+    assert bucket.acquire(2) == 0 and bucket.acquire() > 0, "令牌数不超过容量"
+
+
+def test_user_rate_limit():
+    from app.core import ratelimit
+    server, base_url = start_stub_server()
+    app = make_app(base_url=base_url)
+    client = login(app.test_client(), '31')
+    saved = ratelimit.USER_RATE_LIMIT
+    ratelimit.USER_RATE_LIMIT = {"capacity": 2, "per_second": 0.01}
+    try:
+        assert client.post('/api/chat', json={'message': '本月花了多少钱'}).status_code == 200
+        assert client.post('/api/chat', json={'message': '这个月的收支'}).status_code == 200
+        requests = server.RequestHandlerClass.requests
+        response = client.post('/api/chat', json={'message': '上个月呢'})
+        assert response.status_code == 429, response.get_json()
+        assert int(response.headers['Retry-After']) >= 1
+        assert client.post('/api/chat/stream', json={'message': '上个月呢'}).status_code == 429
+        assert server.RequestHandlerClass.requests == requests, "被限流的消息不应请求 LLM"
+        # 其他用户不受影响
+        assert login(app.test_client(), '32').post('/api/chat', json={'message': '本月花了多少钱'}).status_code == 200
+    finally:
+        ratelimit.USER_RATE_LIMIT = saved
+        ratelimit.user_buckets.clear()
+        server.shutdown()
+
+
+def test_usage_recorded_and_daily_budget():
+    import app.core.llm as llm
+    from app.core import ratelimit
+    server, base_url = start_stub_server()
+    app = make_app(base_url=base_url)
+    client = login(app.test_client(), '33')
+
+    assert client.post('/api/chat', json={'message': '本月花了多少钱'}).status_code == 200
+    data = client.get('/api/usage').get_json()['data']
+    first_stage = len(json.dumps(TOOL_CALL, ensure_ascii=False))
+    assert data['days'] == [{
+        'day': data['days'][0]['day'], 'llm': llm.DEFAULT_LLM, 'requests': 2,
+        'prompt_tokens': 200, 'completion_tokens': first_stage + len(REPLY),
+    }], data
+    assert data['today_tokens'] == 200 + first_stage + len(REPLY)
+
+    # 流式回复的桩服务不返回 usage，按估算计入
+    response = client.post('/api/chat/stream', json={'message': '这个月的收支'})
+    assert response.status_code == 200 and 'event: done' in response.get_data(as_text=True)
+    data = client.get('/api/usage').get_json()['data']
+    assert data['days'][0]['requests'] == 4 and data['today_tokens'] > 200 + first_stage + len(REPLY), data
+
+    saved = ratelimit.USER_DAILY_TOKEN_BUDGET
+    ratelimit.USER_DAILY_TOKEN_BUDGET = data['today_tokens']
+    try:
+        response = client.post('/api/chat', json={'message': '上个月呢'})
+        assert response.status_code == 429 and '用量' in response.get_json()['error'], response.get_json()
+        assert client.get('/api/usage').get_json()['data']['daily_token_budget'] == data['today_tokens']
+    finally:
+        ratelimit.USER_DAILY_TOKEN_BUDGET = saved
+        server.shutdown()
+
+
+def test_provider_limit_falls_back():
+    import app.core.llm as llm
+    from app.core import ratelimit
+    server, base_url = start_stub_server()
+    app = make_app(base_url=base_url)
+    client = login(app.test_client(), '34')
+    primary = llm.DEFAULT_LLM
+    ratelimit.provider_buckets.clear()
+    llm.LLM_CONFIGS[primary]['rate_limit'] = {"capacity": 1, "per_second": 0.001}
+    try:
+        # 第一阶段用掉首选 LLM 的唯一一个令牌，第二阶段直接切换到备用 LLM
+        assert client.post('/api/chat', json={'message': '本月花了多少钱'}).status_code == 200
+        requests = {row['llm']: row['requests'] for row in client.get('/api/usage').get_json()['data']['days']}
+        assert requests == {primary: 1, next(name for name in llm.LLM_CONFIGS if name != primary): 1}, requests
+
+        for config in llm.LLM_CONFIGS.values():
+            config['rate_limit'] = {"capacity": 0, "per_second": 0.001}
+        handled = server.RequestHandlerClass.requests
+        response = client.post('/api/chat', json={'message': '这个月的收支'})
+        assert response.status_code == 429, response.get_json()
+        assert server.RequestHandlerClass.requests == handled
+        assert ratelimit.get_rate_limit_stats()['provider'] >= 3
+    finally:
+        for config in llm.LLM_CONFIGS.values():
+            config.pop('rate_limit', None)
+        ratelimit.provider_buckets.clear()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    test_token_bucket()
+    test_user_rate_limit()
+    test_usage_recorded_and_daily_budget()
+    test_provider_limit_falls_back()
+    print("ratelimit_test 通过")
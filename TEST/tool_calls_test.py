@@ -0,0 +1,181 @@
+"""
+一轮多个工具调用的测试
+
+启动本地桩服务代替真实 LLM，使用 SQLite 内存库，检查：
+1. 解析新的 tool_calls 列表格式，也兼容只有一个工具的 tool_names / args_list 格式
+2. "记一笔午饭25和打车30，再告诉我本月总支出"：两次写入在一个事务中提交，只读工具在写入之后执行，
+   能读到刚写入的交易，所有结果一起交给一次第二阶段 LLM 调用
+3. 多个只读工具在线程池中并发执行
+4. 同一轮中任何一个写入失败时，已执行的写入一起回滚，/api/chat 的用户消息仍然保存
+5. 单个写入工具失败时只回滚它自己的修改，会话中尚未提交的用户消息不受影响
+
+    cd backend
+    python ../TEST/tool_calls_test.py
+"""
+import json
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from app import db
+from conftest import make_app, login
+from llm_stub_server import start_stub_server
+
+USERNAME = '1'
+
+LUNCH_AND_TAXI = {
+    "thought": "用户记了两笔支出，并想知道本月总支出",
+    "status": "true",
+    "tool_calls": [
+        {"name": "create_transaction",
+         "args": {"username": USERNAME, "data": {"amount": 25, "type": "expense", "category": "餐饮",
+                                                 "description": "午饭"}}},
+        {"name": "create_transaction",
+         "args": {"username": USERNAME, "data": {"amount": 30, "type": "expense", "category": "交通",
+                                                 "description": "打车"}}},
+        {"name": "get_summary", "args": {"username": USERNAME}},
+        {"name": "get_reports", "args": {"username": USERNAME}},
+    ],
+}
+
+
+def test_parse_tool_calls():
+    from app.core.toolcalls import parse_tool_calls, MAX_TOOL_CALLS
+    assert parse_tool_calls(LUNCH_AND_TAXI)[0] == ('create_transaction', LUNCH_AND_TAXI['tool_calls'][0]['args'])
+    assert [name for name, _ in parse_tool_calls(LUNCH_AND_TAXI)] == \
+        ['create_transaction', 'create_transaction', 'get_summary', 'get_reports']
+    legacy = {"tool_names": "get_summary", "args_list": {"get_summary": {"username": USERNAME}}}
+    assert parse_tool_calls(legacy) == [('get_summary', {'username': USERNAME})]
+    assert parse_tool_calls({"tool_names": "", "args_list": {}}) == []
+    many = {"tool_calls": [{"name": "add", "args": {"a": i, "b": 1}} for i in range(MAX_TOOL_CALLS + 5)]}
+    assert len(parse_tool_calls(many)) == MAX_TOOL_CALLS
+
+
+def test_writes_then_reads_in_one_turn():
+    from app.core.memory import conversation_memory
+    from app.models import Transaction
+    conversation_memory.clear()
+    server, base_url = start_stub_server(tool_call=LUNCH_AND_TAXI)
+    app = make_app(base_url=base_url)
+    client = login(app.test_client(), USERNAME)
+
+    response = client.post('/api/chat', json={'message': '记一笔午饭25和打车30，再告诉我本月总支出'})
+    server.shutdown()
+    assert response.status_code == 200, response.get_json()
+
+    received = server.RequestHandlerClass.received
+    assert len(received) == 2, "多个工具的结果应该只调用一次第二阶段 LLM"
+    prompt = received[1]['messages'][-1]['content']
+    results = json.loads(prompt.split('根据用户请求调用函数后结果为：\n"+ ', 1)[1].split(' + "\n\n', 1)[0])['result']
+    assert [call['tool_name'] for call in results] == [call['name'] for call in LUNCH_AND_TAXI['tool_calls']]
+    assert all(call['result']['success'] for call in results), results
+    # 只读工具在写入提交之后执行
+    assert results[2]['result']['data']['expense'] == -55, results[2]
+    with app.app_context():
+        assert db.session.execute(db.select(db.func.count(Transaction.id))).scalar() == 2
+
+
+def test_reads_run_concurrently():
+    from app.core.toolcalls import run_tool_calls, READ_ONLY_TOOLS
+    server, base_url = start_stub_server()
+    app = make_app(base_url=base_url)
+    server.shutdown()
+    # 两个只读工具都要等对方开始执行后才能返回，串行执行时会超时
+    barrier = threading.Barrier(2, timeout=5)
+
+    def get_summary(username):
+        barrier.wait()
+        return {"success": True, "data": threading.current_thread().name}
+
+    def get_reports(username):
+        barrier.wait()
+        return {"success": True, "data": threading.current_thread().name}
+
+    assert {'get_summary', 'get_reports'} <= READ_ONLY_TOOLS
+    with app.app_context():
+        results = run_tool_calls({'get_summary': get_summary, 'get_reports': get_reports},
+                                 [('get_summary', {'username': USERNAME}), ('get_reports', {'username': USERNAME})])
+    assert all('error' not in call for call in results), results
+    assert results[0]['result']['data'] != results[1]['result']['data']
+
+
+def test_failed_write_rolls_back_batch():
+    import app.core.functions as F
+    from app.core.toolcalls import run_tool_calls
+    from app.models import Transaction, MonthlySummary
+    server, base_url = start_stub_server()
+    app = make_app(base_url=base_url)
+    server.shutdown()
+    functions = {'create_transaction': F.create_transaction, 'create_budget': F.create_budget}
+    with app.app_context():
+        results = run_tool_calls(functions, [
+            ('create_transaction', {'username': USERNAME, 'data': {'amount': 25, 'type': 'expense', 'category': '餐饮'}}),
+            ('create_budget', {'username': USERNAME, 'data': {'name': '预算', 'target_amount': 100,
+                                                                'category': '不存在的分类'}}),
+            ('create_transaction', {'username': USERNAME, 'data': {'amount': 30, 'type': 'expense', 'category': '交通'}}),
+        ])
+        assert [call['result']['success'] for call in results] == [False, False, False], results
+        assert 'Invalid category' in results[1]['result']['error']
+        assert db.session.execute(db.select(db.func.count(Transaction.id))).scalar() == 0
+        assert db.session.execute(db.select(db.func.count()).select_from(MonthlySummary)).scalar() == 0
+
+
+def test_failed_batch_keeps_user_message():
+    from app.core.memory import conversation_memory
+    from app.models import Chat, Transaction
+    conversation_memory.clear()
+    server, base_url = start_stub_server(tool_call={
+        "thought": "记一笔支出并创建预算",
+        "status": "true",
+        "tool_calls": [
+            {"name": "create_transaction",
+             "args": {"username": USERNAME, "data": {"amount": 25, "type": "expense", "category": "餐饮"}}},
+            {"name": "create_budget",
+             "args": {"username": USERNAME, "data": {"name": "预算", "target_amount": 100, "category": "不存在的分类"}}},
+        ],
+    })
+    app = make_app(base_url=base_url)
+    client = login(app.test_client(), USERNAME)
+
+    response = client.post('/api/chat', json={'message': '记一笔午饭，再建一个预算'})
+    server.shutdown()
+    assert response.status_code == 200, response.get_json()
+    with app.app_context():
+        assert db.session.execute(db.select(db.func.count(Transaction.id))).scalar() == 0
+        chats = db.session.execute(db.select(Chat.type, Chat.content).order_by(Chat.id)).all()
+        assert [chat.type for chat in chats] == [1, 0], chats
+        assert chats[0].content == '记一笔午饭，再建一个预算'
+
+
+def test_failed_write_keeps_pending_chat():
+    import app.core.functions as F
+    from app.models import Chat, Transaction
+    server, base_url = start_stub_server()
+    app = make_app(base_url=base_url)
+    server.shutdown()
+    with app.app_context():
+        lunch = F.create_transaction(USERNAME, {'amount': 25, 'type': 'expense', 'category': '餐饮'})['data']
+        db.session.add(Chat(content='记一笔', type=1, username=USERNAME))
+        # category 不能为空，INSERT / UPDATE 在保存点中失败
+        assert not F.create_transaction(USERNAME, {'amount': 30, 'type': 'expense', 'category': None})['success']
+        assert not F.update_transaction(lunch['id'], {'amount': 40, 'category': None})['success']
+        assert not F.delete_transaction(lunch['id'] + 100)['success']
+        db.session.commit()
+
+        assert db.session.execute(db.select(Chat.content)).scalars().all() == ['记一笔']
+        amounts = db.session.execute(db.select(Transaction.amount)).scalars().all()
+        assert amounts == [-25], amounts
+        assert F.get_summary(USERNAME)['data']['expense'] == -25
+
+
+if __name__ == '__main__':
+    test_parse_tool_calls()
+    test_writes_then_reads_in_one_turn()
+    test_reads_run_concurrently()
+    test_failed_write_rolls_back_batch()
+    test_failed_batch_keeps_user_message()
+    test_failed_write_keeps_pending_chat()
+    print("tool_calls_test 通过")
@@ -3,4 +3,8 @@ from flask import Blueprint
 # url_prefix 会在 app/__init__.py 中注册蓝图时指定，这里不需要
 bp = Blueprint('api', __name__) 
 
+# 统计每个请求的耗时和 SQL，见 /api/metrics
+from app.metrics import instrument_blueprint
+instrument_blueprint(bp)
+
 from . import routes # 导入这个蓝图下的路由定义
\ No newline at end of file
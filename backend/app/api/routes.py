@@ -4,14 +4,30 @@ from app.core.functions import (
     create_budget, get_categories, add_category, update_category,
     delete_category, get_reports,
 )
-from app.core.llm import call_llm, chat_llm
+from app.core.functions import import_transactions, get_category_snapshot, list_transactions, get_report_series
+from app.core.importers import parse_import, validate_rows, check_row_limit, ImportFormatError
+from app.core.llm import call_llm, chat_llm, stream_chat_llm, get_prompt_stats, get_available_llms
+from app.core.intent_cache import intent_cache
+from app.core.memory import conversation_memory
+from app.core.jobs import submit_chat, get_job
+from app.core import ratelimit
+from app.core.ratelimit import RateLimited, check_user, get_rate_limit_stats
+from app.core.usage import get_usage, daily_tokens
+from app.core.fastpath import get_fastpath_stats
+from app.core.llm_async import HEDGE_STATS
+from app.core.breaker import STATES as BREAKER_STATES
+from app.metrics import render_metrics, register_collector, timed
 from app.models import *
-from flask import request, jsonify
+from flask import request, jsonify, Response, stream_with_context
 from flask import session
 
 from . import bp
 
 import json
+import logging
+import math
+
+logger = logging.getLogger(__name__)
 
 # ============ 测试接口 ============
 @bp.route('/test', methods=['GET'])
@@ -33,7 +49,101 @@ def debug_session():
         "headers": dict(request.headers),
         "username": session.get('username', 'No user logged in')
     }), 200
+
+@bp.route('/debug/prompt', methods=['GET'])
+def debug_prompt():
+    """调试接口：查看 system prompt 构建耗时、长度和缓存命中情况"""
+    return jsonify({
+        "success": True,
+        "data": get_prompt_stats()
+    }), 200
+
+@bp.route('/debug/intent-cache', methods=['GET'])
+def debug_intent_cache():
+    """调试接口：查看只读意图缓存的命中情况"""
+    return jsonify({
+        "success": True,
+        "data": intent_cache.stats()
+    }), 200
+
+@bp.route('/debug/fastpath', methods=['GET'])
+def debug_fastpath():
+    """调试接口：查看本地快速记账的命中情况"""
+    return jsonify({
+        "success": True,
+        "data": get_fastpath_stats()
+    }), 200
     
+@bp.route('/debug/memory', methods=['GET'])
+def debug_memory():
+    """调试接口：查看对话记忆的命中、加载和摘要情况"""
+    return jsonify({
+        "success": True,
+        "data": conversation_memory.stats()
+    }), 200
+
+@bp.route('/debug/llm-health', methods=['GET'])
+def debug_llm_health():
+    """调试接口：查看每个LLM的熔断状态、错误率和平均耗时"""
+    return jsonify({
+        "success": True,
+        "data": get_available_llms()
+    }), 200
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 格式的请求耗时、各阶段耗时、SQL 及缓存统计（同一个视图也注册在 /metrics）"""
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@register_collector
+def _cache_metrics():
+    """把 prompt 构建、LLM 对冲和熔断、意图缓存、快速记账、对话记忆、限流的统计一起输出"""
+    prompt = get_prompt_stats()
+    intent = intent_cache.stats()
+    fastpath = get_fastpath_stats()
+    memory = conversation_memory.stats()
+    llms = get_available_llms()
+    return [
+        ('app_prompt_builds_total', 'counter', "system prompt 构建次数", {}, prompt['builds']),
+        ('app_prompt_build_seconds_total', 'counter', "system prompt 构建总耗时", {}, prompt['total_build_seconds']),
+        ('app_prompt_block_misses_total', 'counter', "system prompt 片段缓存未命中次数",
+         {'block': 'tool'}, prompt['tool_block_misses']),
+        ('app_prompt_block_misses_total', 'counter', "system prompt 片段缓存未命中次数",
+         {'block': 'category'}, prompt['category_block_misses']),
+        ('app_prompt_size_chars', 'gauge', "最近一次 system prompt 的长度", {}, prompt['last_size']),
+    ] + [
+        ('app_llm_hedge_total', 'counter', "LLM 请求、对冲、备用胜出和失败次数", {'event': event}, count)
+        for event, count in HEDGE_STATS.items()
+    ] + [
+        ('app_llm_circuit_state', 'gauge', "LLM 熔断状态（0 正常，1 等待探测，2 熔断中）",
+         {'llm': llm['name']}, BREAKER_STATES.index(llm['state']))
+        for llm in llms
+    ] + [
+        ('app_llm_circuit_opens_total', 'counter', "LLM 熔断打开次数", {'llm': llm['name']}, llm['opens'])
+        for llm in llms
+    ] + [
+        ('app_llm_requests_total', 'counter', "发往各 LLM 的请求数（不含被限流和被取消的）",
+         {'llm': llm['name'], 'result': result}, count)
+        for llm in llms
+        for result, count in (('success', llm['requests'] - llm['failures']), ('failure', llm['failures']))
+    ] + [
+        ('app_intent_cache_lookups_total', 'counter', "意图缓存查询次数", {'result': 'hit'}, intent['hits']),
+        ('app_intent_cache_lookups_total', 'counter', "意图缓存查询次数", {'result': 'miss'}, intent['misses']),
+        ('app_intent_cache_invalidations_total', 'counter', "意图缓存失效次数", {}, intent['invalidations']),
+        ('app_intent_cache_entries', 'gauge', "意图缓存条目数", {}, intent['entries']),
+        ('app_fastpath_messages_total', 'counter', "快速记账处理的消息数", {'result': 'hit'}, fastpath['hits']),
+        ('app_fastpath_messages_total', 'counter', "快速记账处理的消息数", {'result': 'miss'}, fastpath['misses']),
+        ('app_memory_lookups_total', 'counter', "对话记忆查询次数", {'result': 'hit'}, memory['hits']),
+        ('app_memory_lookups_total', 'counter', "对话记忆查询次数", {'result': 'load'}, memory['loads']),
+        ('app_memory_folded_turns_total', 'counter', "压缩进摘要的对话轮数", {}, memory['folded_turns']),
+        ('app_memory_window_tokens', 'gauge', "所有用户对话记忆的估算 token 数", {}, memory['window_tokens']),
+    ] + [
+        ('app_rate_limited_total', 'counter', "被限流的请求数", {'scope': scope}, count)
+        for scope, count in get_rate_limit_stats().items()
+    ]
+
+
 @bp.route('/add', methods=['POST'])
 def add_api():
     username = session.get('username', 'No user logged in')
@@ -43,6 +153,16 @@ def add_api():
         "data": {"username": username, "result": add(**data) },
     }), 200
 # ============ 聊天接口 ============
+
+def rate_limited_response(error):
+    """被限流时立即返回 429，Retry-After 为建议的重试等待秒数"""
+    response = jsonify({
+        "success": False,
+        "error": str(error),
+        "retry_after": round(error.retry_after, 1)
+    })
+    response.headers['Retry-After'] = str(max(1, math.ceil(error.retry_after)))
+    return response, 429
     
     
 @bp.route('/chat', methods=['POST'])
@@ -54,6 +174,11 @@ def chat():
             "error": "用户不存在"
         }), 401
 
+    try:
+        check_user(username)
+    except RateLimited as e:
+        return rate_limited_response(e)
+
     message = request.json.get('message', '')
     try:
         user_chat = Chat(
@@ -78,8 +203,9 @@ def chat():
             type=0,  # 机器人消息
             username=username
         )
-        db.session.add(robot_chat)
-        db.session.commit()  # 提交事务
+        with timed('chat_persist'):
+            db.session.add(robot_chat)
+            db.session.commit()  # 提交事务
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -89,12 +215,139 @@ def chat():
 
     if result['success']:
         return jsonify(result), 200
+    elif 'retry_after' in result:
+        return rate_limited_response(RateLimited(result['data'], result['retry_after']))
     else:
         return jsonify({
             "success": False,
             "error": "LLM调用失败"
         }), 500
 
+def sse_event(event, data):
+    """按 Server-Sent Events 格式编码一条事件"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """流式聊天：先推送工具调用结果，再逐段推送回复，结束后保存聊天记录"""
+    username = session.get('username', 'No user logged in')
+    if username == 'No user logged in':
+        return jsonify({
+            "success": False,
+            "error": "用户不存在"
+        }), 401
+
+    try:
+        check_user(username)
+    except RateLimited as e:
+        return rate_limited_response(e)
+
+    message = request.json.get('message', '')
+
+    def generate():
+        result = {"success": False, "data": "抱歉，我暂时无法处理您的请求，请稍后再试。"}
+        for event, data in stream_chat_llm(username, message):
+            if event == 'done':
+                result = data
+            else:
+                yield sse_event(event, data)
+
+        try:
+            db.session.add(Chat(content=message, type=1, username=username))  # 用户消息
+            db.session.add(Chat(content=result['data'], type=0, username=username))  # 机器人消息
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            yield sse_event('error', {"success": False, "error": "保存聊天记录失败"})
+            return
+        yield sse_event('done', result)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # 关闭反向代理的缓冲，保证逐段到达
+        }
+    )
+
+@bp.route('/chat/jobs', methods=['POST'])
+def chat_job_submit():
+    """提交一轮聊天在后台执行，立即返回任务 id，结果用 GET /chat/jobs/<id> 查询"""
+    username = session.get('username', 'No user logged in')
+    if username == 'No user logged in':
+        return jsonify({
+            "success": False,
+            "error": "用户不存在"
+        }), 401
+
+    try:
+        check_user(username)
+    except RateLimited as e:
+        return rate_limited_response(e)
+
+    message = (request.json or {}).get('message', '')
+    if not message:
+        return jsonify({
+            "success": False,
+            "error": "消息不能为空"
+        }), 400
+    try:
+        job = submit_chat(username, message)
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("提交聊天任务失败", extra={"username": username})
+        return jsonify({
+            "success": False,
+            "error": "提交聊天任务失败"
+        }), 500
+    return jsonify({
+        "success": True,
+        "data": job
+    }), 202
+
+@bp.route('/chat/jobs/<job_id>', methods=['GET'])
+def chat_job_status(job_id):
+    """查询聊天任务，wait 为未完成时最多等待的秒数（长轮询）"""
+    username = session.get('username', 'No user logged in')
+    if username == 'No user logged in':
+        return jsonify({
+            "success": False,
+            "error": "用户不存在"
+        }), 401
+
+    job = get_job(job_id, username, wait=request.args.get('wait', default=0, type=float))
+    if job is None:
+        return jsonify({
+            "success": False,
+            "error": "任务不存在"
+        }), 404
+    return jsonify({
+        "success": True,
+        "data": job
+    }), 200
+
+@bp.route('/usage', methods=['GET'])
+def usage():
+    """当前用户最近几天的 LLM 用量，以及今天的 token 用量和上限"""
+    username = session.get('username', 'No user logged in')
+    if username == 'No user logged in':
+        return jsonify({
+            "success": False,
+            "error": "用户不存在"
+        }), 401
+
+    days = min(max(request.args.get('days', default=7, type=int), 1), 90)
+    return jsonify({
+        "success": True,
+        "data": {
+            "days": get_usage(username, days),
+            "today_tokens": daily_tokens(username),
+            "daily_token_budget": ratelimit.USER_DAILY_TOKEN_BUDGET
+        }
+    }), 200
+
 @bp.route('/chat/history', methods=['GET'])
 def get_chat_history():
     username = session.get('username', 'No user logged in')
@@ -128,29 +381,13 @@ def get_chat_history():
 @bp.route('/summary', methods=['GET'])
 def get_summary_api():
     """获取用户当前月份的财务摘要：收入、支出、结余"""
-    # 添加调试信息
-    print("=== /api/summary 调试信息 ===")
-    print(f"Session内容: {dict(session)}")
-    print(f"Request headers: {dict(request.headers)}")
-    print(f"Request cookies: {request.cookies}")
-
     username = session.get('username', 'No user logged in')
-    print(f"获取到的username: {username}")
-
     if username == 'No user logged in':
-        print("❌ 用户未登录，返回400错误")
-        return jsonify({
-            "success": False,
-            "error": "Missing username",
-            "debug_info": {
-                "session": dict(session),
-                "cookies": dict(request.cookies)
-            }
-        }), 400
+        logger.info("未登录的请求", extra={"path": request.path})
+        return jsonify({"success": False, "error": "Missing username"}), 400
 
-    print(f"✅ 用户已登录: {username}")
     result = get_summary(username)
-    print(f"get_summary结果: {result}")
+    logger.debug("get_summary", extra={"username": username, "result": result})
 
     if result['success']:
         return jsonify(result), 200
@@ -159,31 +396,34 @@ def get_summary_api():
 
 @bp.route('/transactions', methods=['GET'])
 def get_transactions_api():
-    """获取用户的最近交易记录，默认按时间倒序返回10条"""
-    # 添加调试信息
-    print("=== /api/transactions 调试信息 ===")
-    print(f"Session内容: {dict(session)}")
-
+    """
+    按时间倒序分页获取用户的交易记录，默认返回最新的10条
+    查询参数：limit, cursor, direction(next/prev), start_date, end_date, type, category,
+    min_amount, max_amount, keyword；翻页时把响应中的 next_cursor / prev_cursor 作为 cursor 传回
+    """
     username = session.get('username', 'No user logged in')
     limit = request.args.get('limit', default=10, type=int)
 
-    print(f"获取到的username: {username}")
-    print(f"limit参数: {limit}")
-
     if username == 'No user logged in':
-        print("❌ 用户未登录，返回400错误")
-        return jsonify({
-            "success": False,
-            "error": "Missing username",
-            "debug_info": {
-                "session": dict(session),
-                "cookies": dict(request.cookies)
-            }
-        }), 400
+        logger.info("未登录的请求", extra={"path": request.path})
+        return jsonify({"success": False, "error": "Missing username"}), 400
 
-    print(f"✅ 用户已登录: {username}")
-    result = get_transactions(username, limit)
-    print(f"get_transactions结果: {result}")
+    result = list_transactions(
+        username,
+        cursor=request.args.get('cursor'),
+        direction=request.args.get('direction', 'next'),
+        limit=limit,
+        start_date=request.args.get('start_date'),
+        end_date=request.args.get('end_date'),
+        type=request.args.get('type'),
+        category=request.args.get('category'),
+        min_amount=request.args.get('min_amount', type=float),
+        max_amount=request.args.get('max_amount', type=float),
+        keyword=request.args.get('keyword'),
+    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("list_transactions", extra={"username": username, "query": request.args.to_dict(),
+                                                 "rows": len(result.get('data') or [])})
 
     if result['success']:
         return jsonify(result), 200
@@ -213,6 +453,48 @@ def create_transaction_api():
     
 
 
+@bp.route('/transactions/import', methods=['POST'])
+def import_transactions_api():
+    """
+    批量导入交易记录
+    支持上传文件（multipart 的 file 字段）、直接提交文件内容，或 JSON 数组 / {"rows": [...]}
+    查询参数 format: jsonl / csv / alipay / wechat，不传时自动识别
+    查询参数 skip_invalid=true 时跳过校验失败的行，否则有任何一行不合法就整体拒绝
+    """
+    username = session.get('username', 'No user logged in')
+    if username == 'No user logged in':
+        return jsonify({"success": False, "error": "Missing username"}), 400
+
+    import_format = request.args.get('format') or request.form.get('format')
+    skip_invalid = request.args.get('skip_invalid', 'false').lower() in ('1', 'true', 'yes')
+
+    try:
+        if 'file' in request.files:
+            rows = parse_import(request.files['file'].read(), import_format)
+        elif request.is_json:
+            data = request.get_json()
+            rows = data.get('rows', []) if isinstance(data, dict) else data
+            if not isinstance(rows, list):
+                return jsonify({"success": False, "error": "rows 必须是数组"}), 400
+            check_row_limit(rows)
+        else:
+            rows = parse_import(request.get_data(), import_format)
+    except ImportFormatError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    _, categories = get_category_snapshot()
+    valid, errors = validate_rows(rows, username, {category['name'] for category in categories})
+    if errors and not skip_invalid:
+        return jsonify({"success": False, "error": "存在不合法的记录", "errors": errors[:100]}), 400
+
+    result = import_transactions(username, valid)
+    if result['success']:
+        result['data']['skipped'] = len(errors)
+        result['data']['errors'] = errors[:100]
+        return jsonify(result), 201
+    return jsonify(result), 400
+
+
 @bp.route('/transactions/<int:id>', methods=['PUT']) # 存在安全问题，实际应用中应使用安全的验证方式
 def update_transaction_api(id):
     """更新指定 ID 的交易记录"""
@@ -327,24 +609,41 @@ def delete_category_api(id):
 @bp.route('/reports', methods=['GET'])
 def get_reports_api():
     """根据时间范围获取支出分类统计数据"""
-    print("=== /api/reports 调试信息 ===")
-    print(f"Session内容: {dict(session)}")
-
     username = session.get('username', 'No user logged in')
     range_type = request.args.get('range', 'month')  # month/quarter/year
 
-    print(f"获取到的username: {username}")
-    print(f"range_type参数: {range_type}")
-
     if username == 'No user logged in':
-        print("❌ 用户未登录，返回400错误")
+        logger.info("未登录的请求", extra={"path": request.path})
         return jsonify({"success": False, "error": "Missing username"}), 400
 
-    print(f"✅ 用户已登录: {username}")
-    # 修复：调用正确的函数 get_reports 而不是 get_summary
     result = get_reports(username, range_type)
-    print(f"get_reports结果: {result}")
+    logger.debug("get_reports", extra={"username": username, "range": range_type, "result": result})
 
     if result['success']:
         return jsonify(result), 200
     return jsonify(result), 400
+
+
+@bp.route('/reports/series', methods=['GET'])
+def get_report_series_api():
+    """任意时间范围内按天/周/月的分类统计时间序列，可与上一个等长周期对比"""
+    username = session.get('username', 'No user logged in')
+    if username == 'No user logged in':
+        return jsonify({"success": False, "error": "Missing username"}), 400
+
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    if not start_date or not end_date:
+        return jsonify({"success": False, "error": "start_date and end_date are required"}), 400
+
+    result = get_report_series(
+        username,
+        start_date,
+        end_date,
+        granularity=request.args.get('granularity', 'day'),
+        type=request.args.get('type', 'expense'),
+        compare=request.args.get('compare', 'false'),
+    )
+    if result['success']:
+        return jsonify(result), 200
+    return jsonify(result), 400
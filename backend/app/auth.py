@@ -0,0 +1,132 @@
+"""
+注册、登录、登出
+
+用户保存在 users 表中，和其它数据共用 SQLAlchemy 的连接池。
+"""
+import logging
+
+from flask import Blueprint, session, request, render_template, jsonify
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app import db
+from app.models import User
+
+bp = Blueprint('auth', __name__)
+logger = logging.getLogger(__name__)
+
+
+def find_user(login, password):
+    """
+    按用户名或邮箱加密码查找用户，一次查询完成；用户名匹配优先于邮箱匹配
+    :return: (id, username) 行，找不到时为 None
+    """
+    return db.session.execute(
+        db.select(User.id, User.username)
+        .where(db.or_(User.username == login, User.email == login), User.password == password)
+        .order_by(db.case((User.username == login, 0), else_=1))
+        .limit(1)
+    ).first()
+
+
+# 渲染注册页面
+@bp.route('/register', methods=['GET'])
+def register_page():
+    return render_template('register.html')
+# 渲染登录页面
+@bp.route('/login', methods=['GET'])
+def login_page():
+    return render_template('login.html')
+
+@bp.route('/api/register', methods=['POST', 'OPTIONS'])
+def register():
+    # 处理OPTIONS预检请求
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    # 根据Content-Type选择正确的数据获取方式
+    if request.content_type == 'application/json':
+        # 处理JSON数据
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "Invalid JSON data"}), 400
+        username = data.get('username')
+        password = data.get('password')
+        email = data.get('email')
+    else:
+        # 处理表单数据
+        username = request.form.get('username')
+        password = request.form.get('password')
+        email = request.form.get('email')
+    logger.debug("注册请求", extra={"username": username})
+
+    if not username or not password:
+        return jsonify({"error": "Username and password cannot be empty"}), 400
+    if len(username) > User.username.type.length or len(password) > 20:
+        return jsonify({"error": "Username and password must be less than 20 characters"}), 400
+    # 超长的值在 MySQL 上插入时抛出 DataError，先按列宽检查
+    if email and len(email) > User.email.type.length:
+        return jsonify({"error": f"Email must be at most {User.email.type.length} characters"}), 400
+
+    try:
+        db.session.add(User(username=username, password=password, email=email or None))
+        db.session.commit()
+        logger.info("用户已注册", extra={"username": username})
+        return jsonify({"message": "User registered successfully"}), 201
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "Username already exists"}), 400
+    except DataError:
+        # 列宽之外的其它数据错误（例如字符集不支持的字符）
+        db.session.rollback()
+        logger.warning("注册数据无法写入", extra={"username": username}, exc_info=True)
+        return jsonify({"error": "Invalid registration data"}), 400
+
+@bp.route('/api/login', methods=['POST', 'OPTIONS'])
+def login():
+    # 处理OPTIONS预检请求
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    # 尝试多种方式获取数据
+    username = None
+    password = None
+
+    # 方式1: form data
+    if request.form:
+        username = request.form.get('username')
+        password = request.form.get('password')
+
+    # 方式2: JSON data
+    if not username and request.is_json:
+        json_data = request.get_json()
+        if json_data:
+            username = json_data.get('username')
+            password = json_data.get('password')
+
+    # 方式3: raw data 无法解析，不记录内容以免泄露密码
+    if not username and request.data:
+        logger.debug("无法解析登录请求体", extra={"content_type": request.content_type})
+
+    user = find_user(username, password) if username and password else None
+    if user is not None:
+        session['username'] = username
+        field = 'username' if user.username == username else 'email'
+        logger.info("登录成功", extra={"username": username, "login_field": field})
+        return jsonify({
+                'message': 'Login successful',
+                'user': {
+                    field: username
+                }
+            }), 200
+
+    logger.info("登录失败", extra={"username": username})
+    return jsonify({"error": "Invalid username or password"}), 401
+@bp.route('/logout', methods=['GET', 'POST', 'OPTIONS'])
+def logout():
+    # 处理OPTIONS预检请求
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    username = session.pop('username', None)
+    logger.info("已登出", extra={"username": username})
+    return jsonify({'message': 'Logout successful'}), 200
@@ -0,0 +1,78 @@
+"""
+一次性初始化：数据库迁移、预设分类、默认用户的示例预算
+
+create_app 不访问数据库，部署或首次运行前执行一次（重复执行不会产生重复数据）：
+
+    python manage.py bootstrap
+
+gunicorn 启动时会在 master 进程中自动执行一次，见 gunicorn.conf.py。
+"""
+from datetime import datetime
+
+from app import db
+
+DEFAULT_CATEGORIES = [
+    '餐饮', '交通', '购物', '娱乐', '医疗', '教育',
+    '住房', '通讯', '旅游', '其他', '储蓄'
+]
+
+# 为默认用户(username=1)初始化一些示例预算
+DEFAULT_USERNAME = 1
+SAMPLE_BUDGETS = [
+    {'name': '娱乐预算', 'category': '娱乐', 'target_amount': 500.0},
+    {'name': '餐饮预算', 'category': '餐饮', 'target_amount': 1000.0},
+    {'name': '交通预算', 'category': '交通', 'target_amount': 300.0},
+]
+
+
+def seed_categories():
+    """一条 INSERT 写入所有预设分类，已存在的分类由唯一索引忽略"""
+    from app.models import Category
+    statement = (db.insert(Category)
+                 .prefix_with('OR IGNORE', dialect='sqlite')
+                 .prefix_with('IGNORE', dialect='mysql'))
+    result = db.session.connection().execute(statement, [{'name': name} for name in DEFAULT_CATEGORIES])
+    return max(result.rowcount, 0)
+
+
+def seed_sample_budgets():
+    """默认用户还没有任何预算时写入示例预算"""
+    from app.models import Budget, Category
+    from app.core.budgets import period_bounds
+    exists = db.session.execute(
+        db.select(Budget.id).where(Budget.username == DEFAULT_USERNAME).limit(1)
+    ).first()
+    if exists:
+        return 0
+
+    # 每月循环的预算，各周期的已用金额在首次访问或交易写入时生成，见 app.core.budgets
+    today = datetime.utcnow().date()
+    start_date, end_date = period_bounds('month', today, today, today)
+    category_ids = dict(db.session.execute(db.select(Category.name, Category.id)).all())
+    db.session.execute(db.insert(Budget), [dict(
+        budget,
+        category_id=category_ids.get(budget['category']),
+        current_amount=0.0,
+        period='month',
+        start_date=start_date,
+        end_date=end_date,
+        username=DEFAULT_USERNAME
+    ) for budget in SAMPLE_BUDGETS])
+    return len(SAMPLE_BUDGETS)
+
+
+def bootstrap():
+    """
+    执行迁移并写入初始数据，需要在 app context 中调用
+    :return: {"migrations": [...], "categories": 新增分类数, "budgets": 新增预算数}
+    """
+    from app.migrations import upgrade
+    applied = upgrade()
+    categories = seed_categories()
+    budgets = seed_sample_budgets()
+    db.session.commit()
+    if categories:
+        # 同一进程中已缓存的分类快照不包含新写入的分类
+        from app.core.functions import invalidate_category_cache
+        invalidate_category_cache()
+    return {"migrations": applied, "categories": categories, "budgets": budgets}
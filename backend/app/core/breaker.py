@@ -0,0 +1,178 @@
+"""
+LLM 熔断与健康状态
+
+每个 LLM（LLM_CONFIGS 的条目）一个熔断器，记录最近 WINDOW_SIZE 次请求的成败和耗时：
+
+- closed：正常使用。连续失败 FAILURE_THRESHOLD 次，或最近至少 MIN_REQUESTS 次请求中
+  失败比例达到 ERROR_RATE_THRESHOLD 时打开
+- open：get_llm_candidates 不再把它作为候选，请求直接发给健康的 LLM，不用每次先等它失败
+  （所有 LLM 都打开时仍按原顺序尝试）
+- half_open：打开 OPEN_SECONDS 秒后放行一个探测请求，成功则关闭，失败则重新打开；
+  探测请求超过 PROBE_TIMEOUT 秒没有结果（例如排在后面没有真正发出）时再放行一个
+
+被限流或因对冲被取消的请求不计入。状态保存在进程内存中，gunicorn 多 worker 部署时每个 worker 分别统计。
+"""
+import math
+import threading
+import time
+from collections import deque
+
+WINDOW_SIZE = 20
+MIN_REQUESTS = 10
+ERROR_RATE_THRESHOLD = 0.5
+FAILURE_THRESHOLD = 5
+OPEN_SECONDS = 30.0
+PROBE_TIMEOUT = 30.0
+# 耗时的指数移动平均系数
+LATENCY_ALPHA = 0.2
+# 计算耗时分位数（对冲延迟）时保留的最近成功请求数
+LATENCY_WINDOW = 50
+
+STATES = ('closed', 'half_open', 'open')
+
+
+def _quantile(samples, q):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class CircuitBreaker:
+    def __init__(self, name, clock=time.monotonic):
+        self.name = name
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._state = 'closed'
+        self.outcomes = deque(maxlen=WINDOW_SIZE)  # 最近的请求是否成功
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_started = None
+        self.avg_latency = None
+        self.latencies = deque(maxlen=LATENCY_WINDOW)  # 最近成功请求的耗时
+        self.successes = 0
+        self.failures = 0
+        self.opens = 0
+
+    def _refresh(self):
+        """打开超过 OPEN_SECONDS 后进入半开状态（调用方持有锁）"""
+        if self._state == 'open' and self.clock() - self.opened_at >= OPEN_SECONDS:
+            self._state = 'half_open'
+            self.probe_started = None
+
+    def _open(self):
+        self._state = 'open'
+        self.opened_at = self.clock()
+        self.probe_started = None
+        self.opens += 1
+
+    @property
+    def state(self):
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def allow(self):
+        """是否可以向该 LLM 发请求；半开状态下每次只放行一个探测请求"""
+        with self._lock:
+            self._refresh()
+            if self._state == 'closed':
+                return True
+            if self._state == 'open':
+                return False
+            now = self.clock()
+            if self.probe_started is None or now - self.probe_started > PROBE_TIMEOUT:
+                self.probe_started = now
+                return True
+            return False
+
+    def record(self, ok, latency):
+        """记录一次请求的结果和耗时（秒）"""
+        with self._lock:
+            self._refresh()
+            self.outcomes.append(ok)
+            if self.avg_latency is None:
+                self.avg_latency = latency
+            else:
+                self.avg_latency += LATENCY_ALPHA * (latency - self.avg_latency)
+            if ok:
+                self.latencies.append(latency)
+                self.successes += 1
+                self.consecutive_failures = 0
+                if self._state == 'half_open':
+                    # 探测成功：恢复使用，之前的失败不再计入错误率
+                    self._state = 'closed'
+                    self.outcomes.clear()
+                    self.outcomes.append(True)
+                    self.probe_started = None
+                return
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self._state == 'half_open':
+                self._open()
+            elif self._state == 'closed' and (self.consecutive_failures >= FAILURE_THRESHOLD
+                                              or self._error_rate_exceeded()):
+                self._open()
+
+    def latency_quantile(self, q, min_samples=1):
+        """最近成功请求耗时的 q 分位数（秒），样本少于 min_samples 时返回 None"""
+        with self._lock:
+            samples = list(self.latencies)
+        if len(samples) < max(min_samples, 1):
+            return None
+        return _quantile(samples, q)
+
+    def release(self):
+        """请求没有得到结果（被取消或限流），半开状态下释放探测名额"""
+        with self._lock:
+            if self._state == 'half_open':
+                self.probe_started = None
+
+    def _error_rate_exceeded(self):
+        if len(self.outcomes) < MIN_REQUESTS:
+            return False
+        return self.outcomes.count(False) / len(self.outcomes) >= ERROR_RATE_THRESHOLD
+
+    def snapshot(self):
+        """当前健康状态：{"state", "error_rate", "consecutive_failures", "avg_latency", "retry_in", ...}"""
+        with self._lock:
+            self._refresh()
+            retry_in = None
+            if self._state == 'open':
+                retry_in = round(max(0.0, OPEN_SECONDS - (self.clock() - self.opened_at)), 1)
+            return {
+                "state": self._state,
+                "error_rate": round(self.outcomes.count(False) / len(self.outcomes), 3) if self.outcomes else 0.0,
+                "consecutive_failures": self.consecutive_failures,
+                "avg_latency": round(self.avg_latency, 3) if self.avg_latency is not None else None,
+                "p95_latency": round(_quantile(self.latencies, 0.95), 3) if self.latencies else None,
+                "requests": self.successes + self.failures,
+                "failures": self.failures,
+                "opens": self.opens,
+                "retry_in": retry_in,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(llm_name):
+    breaker = _breakers.get(llm_name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(llm_name, CircuitBreaker(llm_name))
+    return breaker
+
+
+def reset_breakers():
+    """清空所有熔断器（测试或手动恢复时使用）"""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def order_by_health(names):
+    """
+    去掉熔断中的 LLM，保持原有优先级；全部熔断时按原顺序返回，仍然尝试
+    半开的 LLM 只在放行探测请求时保留
+    """
+    healthy = [name for name in names if get_breaker(name).allow()]
+    return healthy or list(names)
@@ -0,0 +1,179 @@
+"""
+周期预算
+
+Budget 是预算定义：period 为 week / month 时按自然周（从星期一开始）/ 自然月循环，
+为 custom 时以 start_date ~ end_date 的天数为一个周期，从 start_date 开始循环。
+start_date 之前的交易不计入预算。
+
+每个周期的已用金额保存在 BudgetPeriod 中：
+- 创建预算时写入第一个周期（统计一次已有支出）
+- 交易写入时，交易日期所在的周期不存在就先插入，再执行 spent = spent - :amount_change
+- get_budgets 读取当前周期，不存在时插入一个已用金额为 0 的周期
+
+交易写入总会先生成所在的周期，因此读取时缺少的周期一定没有支出，读取预算不需要扫描交易表。
+交易和预算按 category_id 对应，category_id 为空（分类不存在或已删除）的交易不计入任何预算。
+“今天”与 Transaction.date 使用同一个时钟（UTC，datetime.utcnow），否则在时区差的几个小时里，
+刚写入的交易会落在读取时“当前周期”之外。
+"""
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Budget, BudgetPeriod, Transaction
+from app.core.reports import bucket_start, next_bucket
+from app.core.categories import category_name
+
+PERIODS = ('week', 'month', 'custom')
+
+
+def period_bounds(period, anchor_start, anchor_end, day):
+    """
+    预算在 day 所在周期的 (第一天, 最后一天)，day 早于 anchor_start 时返回 None
+    :param period: week / month / custom
+    :param anchor_start: Budget.start_date
+    :param anchor_end: Budget.end_date，custom 预算用它确定周期长度
+    """
+    if day < anchor_start:
+        return None
+    if period == 'custom':
+        length = (anchor_end - anchor_start).days + 1
+        start = anchor_start + timedelta(days=(day - anchor_start).days // length * length)
+        return start, start + timedelta(days=length - 1)
+    start = bucket_start(day, period)
+    return start, next_bucket(start, period) - timedelta(days=1)
+
+
+def _insert_periods(rows):
+    """插入周期，已存在的 (budget_id, start_date) 由唯一约束忽略，并发插入同一个周期也不会出错"""
+    if not rows:
+        return
+    statement = (db.insert(BudgetPeriod.__table__)
+                 .prefix_with('OR IGNORE', dialect='sqlite')
+                 .prefix_with('IGNORE', dialect='mysql'))
+    db.session.connection().execute(statement, rows)
+
+
+def spent_between(username, category_id, start, end):
+    """start ~ end（含）之间该分类已有支出的绝对值之和，只在创建预算时调用"""
+    return db.session.execute(
+        db.select(db.func.coalesce(db.func.sum(db.func.abs(Transaction.amount)), 0)).where(
+            Transaction.username == username,
+            Transaction.category_id == category_id,
+            Transaction.type == 'expense',
+            Transaction.date >= start,
+            Transaction.date < end + timedelta(days=1)
+        )
+    ).scalar()
+
+
+def start_budget(budget):
+    """为刚 flush 的预算写入第一个周期，已用金额为周期内已有的支出"""
+    end = period_bounds(budget.period, budget.start_date, budget.end_date, budget.start_date)[1]
+    spent = spent_between(budget.username, budget.category_id, budget.start_date, end)
+    db.session.add(BudgetPeriod(budget_id=budget.id, start_date=budget.start_date, end_date=end, spent=spent))
+    return end, spent
+
+
+def apply_expense(username, category_id, amount_change, day):
+    """
+    把一笔支出的变化计入该用户、该分类所有预算在 day 所在的周期（不提交）
+    :param amount_change: 支出为负数，已用金额增加 -amount_change
+    :return: 更新的周期数
+    """
+    covering = db.and_(BudgetPeriod.budget_id == Budget.id,
+                       BudgetPeriod.start_date <= day,
+                       BudgetPeriod.end_date >= day)
+    budgets = db.session.execute(
+        db.select(Budget.id, Budget.period, Budget.start_date, Budget.end_date, BudgetPeriod.id)
+        .outerjoin(BudgetPeriod, covering)
+        .where(Budget.username == username, Budget.category_id == category_id, Budget.start_date <= day)
+    ).all()
+    if not budgets:
+        return 0
+
+    missing = []
+    for budget_id, period, start_date, end_date, period_id in budgets:
+        if period_id is None:
+            start, end = period_bounds(period, start_date, end_date, day)
+            missing.append({"budget_id": budget_id, "start_date": start, "end_date": end, "spent": 0.0})
+    _insert_periods(missing)
+
+    result = db.session.execute(
+        db.update(BudgetPeriod)
+        .where(BudgetPeriod.budget_id.in_([row[0] for row in budgets]),
+               BudgetPeriod.start_date <= day,
+               BudgetPeriod.end_date >= day)
+        .values(spent=BudgetPeriod.spent - amount_change)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def apply_expenses(username, expense_by_category):
+    """
+    批量导入时把支出计入各预算周期：每个 (预算, 周期) 只更新一次（不提交）
+    :param expense_by_category: {category_id: [(日期, 金额), ...]}
+    :return: 更新的周期数
+    """
+    if not expense_by_category:
+        return 0
+    budgets = db.session.execute(
+        db.select(Budget.id, Budget.category_id, Budget.period, Budget.start_date, Budget.end_date).where(
+            Budget.username == username,
+            Budget.category_id.in_(list(expense_by_category))
+        )
+    ).all()
+
+    changes = {}
+    for budget_id, category_id, period, start_date, end_date in budgets:
+        for day, amount in expense_by_category[category_id]:
+            bounds = period_bounds(period, start_date, end_date, day)
+            if bounds is not None:
+                changes[(budget_id, bounds)] = changes.get((budget_id, bounds), 0) + amount
+    changes = {key: amount for key, amount in changes.items() if amount}
+    if not changes:
+        return 0
+
+    _insert_periods([{"budget_id": budget_id, "start_date": start, "end_date": end, "spent": 0.0}
+                     for budget_id, (start, end) in changes])
+    table = BudgetPeriod.__table__
+    db.session.connection().execute(
+        db.update(table)
+        .where(table.c.budget_id == db.bindparam('b_budget_id'), table.c.start_date == db.bindparam('b_start_date'))
+        .values(spent=table.c.spent - db.bindparam('amount_change')),
+        [{"b_budget_id": budget_id, "b_start_date": start, "amount_change": amount}
+         for (budget_id, (start, _)), amount in changes.items()]
+    )
+    return len(changes)
+
+
+def current_periods(username, today=None):
+    """
+    用户所有预算在 today 所在的周期，缺少的周期插入已用金额为 0 的记录（不提交）
+    尚未开始的预算返回第一个周期，分类名称从分类字典中取
+    :return: [((id, name, target_amount, category, period), 周期第一天, 最后一天, 已用金额), ...]
+    """
+    today = today or datetime.utcnow().date()
+    covering = db.and_(BudgetPeriod.budget_id == Budget.id,
+                       BudgetPeriod.start_date <= today,
+                       BudgetPeriod.end_date >= today)
+    rows = db.session.execute(
+        db.select(Budget.id, Budget.name, Budget.target_amount, Budget.category_id, Budget.category, Budget.period,
+                  Budget.start_date, Budget.end_date,
+                  BudgetPeriod.start_date, BudgetPeriod.end_date, BudgetPeriod.spent)
+        .outerjoin(BudgetPeriod, covering)
+        .where(Budget.username == username)
+        .order_by(Budget.id)
+    ).all()
+
+    result = []
+    missing = []
+    for budget_id, name, target, category_id, category, period, anchor_start, anchor_end, start, end, spent in rows:
+        if start is None:
+            start, end = period_bounds(period, anchor_start, anchor_end, max(today, anchor_start))
+            spent = 0.0
+            if anchor_start <= today:
+                missing.append({"budget_id": budget_id, "start_date": start, "end_date": end, "spent": spent})
+        result.append(((budget_id, name, target, category_name(category_id, category), period), start, end, spent))
+    _insert_periods(missing)
+    return result
+
@@ -0,0 +1,81 @@
+"""
+分类字典
+
+分类只有几十个，整张 category 表以快照的形式缓存在进程内存中，同时建立 id ↔ 名称两个字典：
+- 写入交易、创建预算时按名称取 category_id（同时完成分类校验），不再查询 category 表
+- 报表按 category_id 汇总后用字典取分类名称，分类改名后旧记录也显示新名称
+
+交易和预算上的 category 列保留写入时的名称：分类不存在（LLM 给出的新名称）或已删除时 category_id 为空，
+这些记录只能靠它显示和筛选。有 category_id 的记录一律用 category_name(category_id, category) 取名称，
+分类改名只更新 category 表的一行，不回写引用它的记录；删除分类时才把当前名称写回这些记录。
+
+分类增删改提交后失效（app.core.functions.invalidate_category_cache）。多进程部署时其它进程感知不到失效，
+因此另设一个较短的过期时间兜底；按名称查不到时，如果快照已经加载超过 MISS_RELOAD_SECONDS 秒，
+立即重新加载一次，其它进程刚添加的分类不用等到过期。
+"""
+import logging
+import threading
+import time
+
+from app import db
+from app.models import Category
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_CACHE_TTL = 60
+MISS_RELOAD_SECONDS = 1.0
+
+_cache = {'version': 0, 'data': None, 'by_id': {}, 'by_name': {}, 'loaded_at': 0.0}
+_lock = threading.Lock()
+
+
+def _load():
+    """从数据库重新加载快照（调用方持有锁），失败时保留旧快照"""
+    try:
+        rows = db.session.execute(db.select(Category.id, Category.name).order_by(Category.id)).all()
+    except Exception:
+        logger.exception("读取分类失败")
+        return
+    _cache.update(
+        data=[{"id": category_id, "name": name} for category_id, name in rows],
+        by_id={category_id: name for category_id, name in rows},
+        by_name={name: category_id for category_id, name in rows},
+        version=_cache['version'] + 1,
+        loaded_at=time.monotonic(),
+    )
+
+
+def _current(max_age=CATEGORY_CACHE_TTL):
+    """返回当前快照，未加载或加载超过 max_age 秒时先重新加载"""
+    with _lock:
+        if _cache['data'] is None or time.monotonic() - _cache['loaded_at'] > max_age:
+            _load()
+        return dict(_cache)
+
+
+def snapshot():
+    """:return: (version, [{"id": id1, "name": name1}, ...])，version 在每次重新加载后递增"""
+    cache = _current()
+    return cache['version'], cache['data'] or []
+
+
+def invalidate():
+    with _lock:
+        _cache['data'] = None
+
+
+def category_id(name):
+    """分类名称对应的 id，分类不存在时返回 None"""
+    if not name:
+        return None
+    found = _current()['by_name'].get(name)
+    if found is None:
+        found = _current(MISS_RELOAD_SECONDS)['by_name'].get(name)
+    return found
+
+
+def category_name(category_id, default=None):
+    """id 对应的分类名称，分类已删除（或 id 为空）时返回 default"""
+    if category_id is None:
+        return default
+    return _current()['by_id'].get(category_id, default)
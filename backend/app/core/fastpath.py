@@ -0,0 +1,145 @@
+"""
+常见记账短语的本地快速解析
+
+"午饭25元"、"打车 30"、"工资到账 8000" 这类消息只需要识别金额、收支类型和分类，
+不需要经过 LLM。parse_bookkeeping 用规则和关键词词典解析，解析成功时直接调用
+create_transaction 并用模板生成确认回复；解析不了（多个金额、疑问句、其它操作等）
+就返回 None，交给 LLM 处理。规则偏保守：宁可漏判，也不要记错账。
+"""
+import re
+import threading
+
+import app.core.functions as F
+
+# 金额：25 / 25.5 / ¥25 / 25元 / 25块；前后不能紧挨着其它数字
+_AMOUNT = re.compile(r'(?<![\d.])[¥￥]?\s*(\d+(?:\.\d{1,2})?)\s*(?:元|块钱|块|rmb|RMB)?(?![\d.])')
+
+# 紧跟在数字后面时说明它不是以元为单位的金额：数量级（1万、8k）、单位（30分钟、5公里）、外币（25美元）
+_NOT_AMOUNT_SUFFIX = re.compile(
+    r'\s*(?:[万千百亿]|[kw](?![a-z])|分钟|小时|天|周|年|岁|公里|千米|米|公斤|千克|斤|克|升|个|件|次|份|杯|瓶|张|'
+    r'人|号|点|楼|%|美元|美金|刀|欧元|英镑|日元|港币|港元|韩元|卢布|usd|eur|jpy|hkd)', re.IGNORECASE)
+
+# 出现这些词说明不是一条简单的记账，交给 LLM
+_NOT_BOOKKEEPING = [
+    '?', '？', '吗', '多少', '几', '查', '看看', '统计', '报表', '预算', '分类', '删除', '删掉', '修改', '改成',
+    '改为', '上次', '刚才', '昨天', '前天', '上周', '上个月', '和', '还有', '以及', '、', '，', ',', '再',
+    # 否定、取消和还没发生的事不能记账
+    '取消', '撤销', '不要', '不用', '别', '不记', '没', '明天', '后天', '下周', '下个月', '下次', '以后', '打算',
+    '准备', '计划', '如果', '要是', '$',
+]
+
+# 单独的"收到"不算（"收到快递付了运费"是支出），必须跟着收入的名目
+INCOME_KEYWORDS = [
+    '工资', '薪水', '薪资', '奖金', '收入', '到账', '报销', '退款', '利息', '分红', '兼职', '进账', '稿费',
+    '收到转账', '收到红包', '收到货款', '收到租金',
+]
+
+# 分类关键词，顺序即优先级
+CATEGORY_KEYWORDS = {
+    '餐饮': ['早饭', '早餐', '午饭', '午餐', '中饭', '晚饭', '晚餐', '夜宵', '宵夜', '外卖', '吃饭', '食堂', '奶茶',
+           '咖啡', '零食', '水果', '饮料', '火锅', '烧烤', '聚餐', '饭'],
+    '交通': ['打车', '地铁', '公交', '滴滴', '出租', '高铁', '火车', '机票', '加油', '停车', '共享单车', '车费'],
+    '医疗': ['买药', '药店', '医院', '看病', '挂号', '体检', '看牙'],
+    '教育': ['学费', '课程', '培训', '教材', '买书', '考试', '报名费'],
+    '住房': ['房租', '租金', '水电', '电费', '水费', '燃气', '物业'],
+    '通讯': ['话费', '流量', '宽带', '手机费'],
+    '旅游': ['旅游', '酒店', '门票', '景点', '民宿'],
+    '娱乐': ['电影', '游戏', 'ktv', '唱歌', '演唱会', '桌游', '剧本杀'],
+    '储蓄': ['存款', '存钱', '定期', '理财'],
+    # 笼统的"买"放在最后，避免把"买药""买书"归到购物
+    '购物': ['超市', '淘宝', '京东', '拼多多', '衣服', '鞋', '日用品', '网购', '买'],
+}
+
+INCOME_CATEGORY = '其他'
+
+FASTPATH_STATS = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key):
+    with _stats_lock:
+        FASTPATH_STATS[key] += 1
+
+
+def parse_bookkeeping(message, category_names):
+    """
+    解析一条简单的记账消息
+    :param message: 用户消息
+    :param category_names: 当前存在的分类名称集合
+    :return: {"amount", "type", "category", "description"}，无法确定时返回 None
+    """
+    text = (message or '').strip()
+    lowered = text.lower()
+    if not text or len(text) > 30 or any(word in lowered for word in _NOT_BOOKKEEPING):
+        return None
+
+    matches = list(_AMOUNT.finditer(text))
+    if len(matches) != 1 or _NOT_AMOUNT_SUFFIX.match(text, matches[0].end(1)):
+        return None
+    amount = float(matches[0].group(1))
+    if amount <= 0:
+        return None
+
+    description = _AMOUNT.sub(' ', text).strip(' 花了用了付了交了共计一共:：')
+    if not description:
+        return None
+
+    if any(word in lowered for word in INCOME_KEYWORDS):
+        trans_type = 'income'
+        category = INCOME_CATEGORY
+    else:
+        trans_type = 'expense'
+        category = next((name for name, words in CATEGORY_KEYWORDS.items()
+                         if any(word in lowered for word in words)), None)
+
+    if category not in category_names:
+        return None
+
+    return {
+        "amount": amount,
+        "type": trans_type,
+        "category": category,
+        "description": description,
+    }
+
+
+def format_confirmation(transaction):
+    """根据创建好的交易生成确认回复"""
+    amount = abs(transaction['amount'])
+    if transaction['type'] == 'income':
+        return (f"好的，我已经记录了这笔收入：\n💰 金额：{amount:g}元\n"
+                f"📝 说明：{transaction['description']}\n📅 时间：今天")
+    return (f"好的，我已经记录了这笔开支：\n💰 金额：{amount:g}元\n"
+            f"🏷 分类：{transaction['category']}\n📝 说明：{transaction['description']}\n📅 时间：今天")
+
+
+def try_fast_path(username, message):
+    """
+    尝试不经过 LLM 直接记账
+    :return: 成功时返回 {"tool_name", "result", "reply"}，否则返回 None
+    """
+    _, categories = F.get_category_snapshot()
+    data = parse_bookkeeping(message, {category['name'] for category in categories})
+    if data is None:
+        _count('misses')
+        return None
+
+    result = F.create_transaction(username, data)
+    if not result.get('success'):
+        _count('misses')
+        return None
+
+    _count('hits')
+    return {
+        "tool_name": "create_transaction",
+        "result": result,
+        "reply": format_confirmation(result['data']),
+    }
+
+
+def get_fastpath_stats():
+    with _stats_lock:
+        stats = dict(FASTPATH_STATS)
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / total if total else 0.0
+    return stats
@@ -1,6 +1,77 @@
+import base64
+import contextvars
+import json
+import logging
+from contextlib import contextmanager
 from datetime import datetime
 
 from app.models import *
+from app.core.intent_cache import intent_cache
+from app.core.reports import build_report, category_totals, to_date
+from app.core import budgets as budget_periods
+from app.core import categories as category_dict
+
+logger = logging.getLogger(__name__)
+
+# write_batch() 中的写入状态，不在批量写入中时为 None
+_write_batch = contextvars.ContextVar('write_batch', default=None)
+
+
+def _commit():  # 非 API 函数
+    """
+    工具函数的提交：在 write_batch() 中只 flush，由 write_batch 在所有写入完成后统一提交
+    写入工具把修改放在 db.session.begin_nested() 中，失败时只回滚这个保存点，
+    同一个会话中还没有提交的用户消息（/api/chat 先 add 用户消息再调用工具）不会被丢掉
+    """
+    if _write_batch.get() is not None:
+        db.session.flush()
+        return
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+@contextmanager
+def write_batch():  # 非 API 函数
+    """
+    在同一个数据库事务中依次执行多个写入工具：
+
+        with write_batch() as batch:
+            create_transaction(...)
+            create_transaction(...)
+            if 有工具失败:
+                batch['rollback'] = True
+
+    with 块正常结束且没有设置 rollback 时提交，否则整体回滚。
+    批量写入放在一个保存点中，回滚时只撤销这些写入，会话中还没有提交的用户消息保留下来。
+    分类缓存的失效推迟到提交之后，避免其它请求在提交前重新加载到旧的分类。
+    :return: 提交成功时 batch['committed'] 为 True
+    """
+    batch = {'rollback': False, 'committed': False, 'invalidate_categories': False}
+    token = _write_batch.set(batch)
+    savepoint = db.session.begin_nested()
+    try:
+        yield batch
+    except BaseException:
+        savepoint.rollback()
+        raise
+    finally:
+        _write_batch.reset(token)
+    if batch['rollback']:
+        savepoint.rollback()
+        return
+    try:
+        savepoint.commit()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logger.exception("批量写入提交失败")
+        return
+    batch['committed'] = True
+    if batch['invalidate_categories']:
+        invalidate_category_cache()
 
 
 def get_current_datetime() -> str:
@@ -22,61 +93,19 @@ def get_summary(username: str) -> dict:
     Returns:
         dict: 包含收入、支出和结余的摘要信息
     """
-    print("————————正在获取当前月份记录——————————————")
-    # 获取当前时间
     now = datetime.utcnow()
-
-    # 获取本月第一天（0点0分0秒）
-    first_day = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-    # 获取下个月第一天（作为查询结束时间）
-    if now.month == 12:
-        next_month = now.replace(year=now.year + 1, month=1, day=1)
-    else:
-        next_month = now.replace(month=now.month + 1, day=1)
     try:
-        # 查询本月的交易记录
-        income_records = Transaction.query.filter(
-            Transaction.username == username,
-            Transaction.type == 'income',
-            Transaction.date >= first_day,
-            Transaction.date < next_month
-        ).all()
-
-        expense_records = Transaction.query.filter(
-            Transaction.username == username,
-            Transaction.type == 'expense',
-            Transaction.date >= first_day,
-            Transaction.date < next_month
+        # 直接读取月度汇总表，最多两行（income / expense）
+        rows = MonthlySummary.query.filter_by(
+            username=username,
+            year=now.year,
+            month=now.month
         ).all()
+        totals = {row.type: row.total for row in rows}
 
-        income = sum(t.amount for t in income_records)
-        expense = sum(t.amount for t in expense_records)
+        income = totals.get('income', 0)
+        expense = totals.get('expense', 0)
         balance = income + expense  # expense已经是负数，所以用加法
-        
-        print(f"[DEBUG] 财务摘要计算: username={username}")
-        print(f"[DEBUG] 时间范围: {first_day} 到 {next_month}")
-        print(f"[DEBUG] 收入记录数: {len(income_records)}, 总收入: {income}")
-        print(f"[DEBUG] 支出记录数: {len(expense_records)}, 总支出: {expense}")
-        print(f"[DEBUG] 计算结余: {income} + ({expense}) = {balance}")
-        
-        # 检查重复交易
-        income_amounts = [record.amount for record in income_records]
-        expense_amounts = [record.amount for record in expense_records]
-        
-        income_duplicates = [x for x in set(income_amounts) if income_amounts.count(x) > 1]
-        expense_duplicates = [x for x in set(expense_amounts) if expense_amounts.count(x) > 1]
-        
-        if income_duplicates:
-            print(f"[DEBUG] 发现重复收入金额: {income_duplicates}")
-        if expense_duplicates:
-            print(f"[DEBUG] 发现重复支出金额: {expense_duplicates}")
-        
-        # 打印详细的交易记录用于调试
-        for record in income_records:
-            print(f"[DEBUG] 收入记录: {record.description}, {record.amount}, {record.date}")
-        for record in expense_records:
-            print(f"[DEBUG] 支出记录: {record.description}, {record.amount}, {record.date}")
 
         return {
             "success": True,
@@ -87,13 +116,85 @@ def get_summary(username: str) -> dict:
             }
         }
     except Exception as e:
-        print(str(e))
+        logger.exception("读取月度汇总失败", extra={"username": username})
         return {
             "success": False,
             "error": str(e)
         }
 
 
+def update_summary_for_transaction(username, trans_type, amount_change, transaction_date, count_change=0):  # 非 API 函数
+    """
+    当交易记录变更时，更新对应的月度汇总（不提交，由调用方统一提交）
+    在数据库中执行 total = total + :amount_change，并发写入不会丢失更新
+    :param username: 用户ID
+    :param trans_type: 交易类型 expense/income
+    :param amount_change: 要增加/减少的金额
+    :param transaction_date: 交易时间
+    :param count_change: 交易笔数的变化（新增 1，删除 -1）
+    """
+    if not trans_type or (amount_change == 0 and count_change == 0):
+        return
+
+    key = dict(username=username, year=transaction_date.year, month=transaction_date.month, type=trans_type)
+    table = MonthlySummary.__table__
+    conn = db.session.connection()
+    increment = (db.update(table)
+                 .where(*(table.c[name] == value for name, value in key.items()))
+                 .values(total=table.c.total + amount_change, count=table.c.count + count_change))
+    if conn.execute(increment).rowcount:
+        return
+
+    # 该月还没有汇总行：插入一行，并发插入时由唯一约束忽略，再按增量更新
+    insert = (db.insert(table)
+              .prefix_with('OR IGNORE', dialect='sqlite')
+              .prefix_with('IGNORE', dialect='mysql')
+              .values(**key, total=amount_change, count=count_change))
+    if not conn.execute(insert).rowcount:
+        conn.execute(increment)
+
+
+def rebuild_summaries(username=None) -> int:  # 非 API 函数
+    """
+    根据 Transaction 原始数据重新生成月度汇总表
+    :param username: 只重建指定用户；为 None 时重建全部用户
+    :return: 写入的汇总行数
+    """
+    year = db.extract('year', Transaction.date)
+    month = db.extract('month', Transaction.date)
+    query = db.session.query(
+        Transaction.username,
+        year,
+        month,
+        Transaction.type,
+        db.func.sum(Transaction.amount),
+        db.func.count(Transaction.id)
+    )
+    delete_query = MonthlySummary.query
+    if username is not None:
+        query = query.filter(Transaction.username == username)
+        delete_query = delete_query.filter_by(username=username)
+    rows = query.group_by(Transaction.username, year, month, Transaction.type).all()
+
+    try:
+        delete_query.delete(synchronize_session=False)
+        db.session.add_all([
+            MonthlySummary(
+                username=row_username,
+                year=int(row_year),
+                month=int(row_month),
+                type=row_type,
+                total=total or 0,
+                count=count
+            ) for row_username, row_year, row_month, row_type, total, count in rows
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(rows)
+
+
 def get_transactions(username: str, limit: int = 10) -> dict:
     """
     获取用户的最近交易记录，默认按时间倒序返回10条
@@ -113,7 +214,7 @@ def get_transactions(username: str, limit: int = 10) -> dict:
                 "id": t.id,
                 "description": t.description,
                 "amount": t.amount,
-                "category": t.category,
+                "category": category_dict.category_name(t.category_id, t.category),
                 "date": t.date.isoformat(),
                 "type": t.type
             } for t in transactions]
@@ -125,6 +226,122 @@ def get_transactions(username: str, limit: int = 10) -> dict:
         }
 
 
+# 分页接口单页最多返回的记录数
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(transaction):  # 非 API 函数
+    """把一条交易的 (date, id) 编码为分页游标"""
+    raw = json.dumps([transaction.date.isoformat(), transaction.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):  # 非 API 函数
+    """解析分页游标，返回 (date, id)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        date_str, trans_id = json.loads(raw)
+        return datetime.fromisoformat(date_str), int(trans_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def list_transactions(username: str, cursor: str = None, direction: str = 'next', limit: int = 20,
+                      start_date: str = None, end_date: str = None, type: str = None, category: str = None,
+                      min_amount: float = None, max_amount: float = None, keyword: str = None) -> dict:
+    """
+    按时间倒序分页查询用户的交易记录，支持筛选
+    
+    Args:
+        username (str): 用户名
+        cursor (str): 上一次返回的 next_cursor 或 prev_cursor，为空时从最新的记录开始
+        direction (str): 'next' 查看更早的记录，'prev' 查看更新的记录
+        limit (int): 每页记录数，默认20，最多100
+        start_date (str): 起始日期（含），如 '2025-06-01'
+        end_date (str): 结束日期（不含），如 '2025-07-01'
+        type (str): 'expense' 或 'income'
+        category (str): 分类名称
+        min_amount (float): 金额下限（按绝对值）
+        max_amount (float): 金额上限（按绝对值）
+        keyword (str): 描述中包含的关键词
+    Returns:
+        dict: 包含交易记录列表，以及 next_cursor / prev_cursor（没有更多记录时为 null）
+    """
+    try:
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        query = Transaction.query.filter(Transaction.username == username)
+        if start_date:
+            query = query.filter(Transaction.date >= datetime.fromisoformat(str(start_date)))
+        if end_date:
+            query = query.filter(Transaction.date < datetime.fromisoformat(str(end_date)))
+        if type:
+            query = query.filter(Transaction.type == type)
+        if category:
+            category_id = category_dict.category_id(category)
+            if category_id is not None:
+                query = query.filter(Transaction.category_id == category_id)
+            else:
+                # 按名称只能匹配没有分类 id 的记录，有 id 的记录上保存的可能是改名前的名称
+                query = query.filter(Transaction.category_id.is_(None), Transaction.category == category)
+        if min_amount is not None:
+            query = query.filter(db.func.abs(Transaction.amount) >= float(min_amount))
+        if max_amount is not None:
+            query = query.filter(db.func.abs(Transaction.amount) <= float(max_amount))
+        if keyword:
+            query = query.filter(Transaction.description.contains(keyword, autoescape=True))
+
+        backwards = direction == 'prev'
+        if cursor:
+            cursor_date, cursor_id = decode_cursor(cursor)
+            if backwards:
+                query = query.filter(db.or_(
+                    Transaction.date > cursor_date,
+                    db.and_(Transaction.date == cursor_date, Transaction.id > cursor_id)
+                ))
+            else:
+                query = query.filter(db.or_(
+                    Transaction.date < cursor_date,
+                    db.and_(Transaction.date == cursor_date, Transaction.id < cursor_id)
+                ))
+
+        if backwards:
+            order = (Transaction.date.asc(), Transaction.id.asc())
+        else:
+            order = (Transaction.date.desc(), Transaction.id.desc())
+        # 多取一条用来判断是否还有下一页
+        rows = query.order_by(*order).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backwards:
+            rows.reverse()
+
+        if backwards:
+            next_cursor = encode_cursor(rows[-1]) if rows else None
+            prev_cursor = encode_cursor(rows[0]) if rows and has_more else None
+        else:
+            next_cursor = encode_cursor(rows[-1]) if rows and has_more else None
+            prev_cursor = encode_cursor(rows[0]) if rows and cursor else None
+
+        return {
+            "success": True,
+            "data": [{
+                "id": t.id,
+                "description": t.description,
+                "amount": t.amount,
+                "category": category_dict.category_name(t.category_id, t.category),
+                "date": t.date.isoformat(),
+                "type": t.type
+            } for t in rows],
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
 def create_transaction(username: str, data: dict) -> dict:
     """
     创建一条交易记录
@@ -137,36 +354,31 @@ def create_transaction(username: str, data: dict) -> dict:
         dict: 包含创建结果的字典
     """
     try:
-        print(f"[DEBUG] 创建交易: username={username}, data={data}")
-        
-        # 处理金额：支出应该存储为负数
-        amount = float(data['amount'])
-        if data['type'] == 'expense' and amount > 0:
-            amount = -amount
-        
-        new = Transaction(
-            amount=amount,
-            type=data['type'],
-            category=data['category'],
-            description=data.get('description'),
-            date=datetime.utcnow(),
-            username=username
-        )
-        db.session.add(new)
-        db.session.commit()
+        with db.session.begin_nested():
+            # 处理金额：支出应该存储为负数
+            amount = float(data['amount'])
+            if data['type'] == 'expense' and amount > 0:
+                amount = -amount
         
-        print(f"[DEBUG] 交易已创建: id={new.id}, type={new.type}, category={new.category}, amount={new.amount}")
-
-        # 只有支出类交易才更新预算
-        if new.type == 'expense':
-            print(f"[DEBUG] 支出交易，开始更新预算")
-            update_budget_for_transaction(new.username, new.category, new.amount, new.date)
-        else:
-            print(f"[DEBUG] 收入交易，不更新预算")
-
-        return {
-            "success": True,
-            "data": {
+            new = Transaction(
+                amount=amount,
+                type=data['type'],
+                category=data['category'],
+                category_id=category_dict.category_id(data['category']),
+                description=data.get('description'),
+                date=datetime.utcnow(),
+                username=username
+            )
+            db.session.add(new)
+            db.session.flush()
+            # 交易、月度汇总和预算在同一个事务中提交
+            update_summary_for_transaction(new.username, new.type, new.amount, new.date, count_change=1)
+            # 只有支出类交易才更新预算
+            if new.type == 'expense':
+                update_budget_for_transaction(new.username, new.category_id, new.amount, new.date)
+
+            # 提交前取出返回值，避免提交后重新加载
+            created = {
                 "id": new.id,
                 "amount": new.amount,
                 "type": new.type,
@@ -174,6 +386,15 @@ def create_transaction(username: str, data: dict) -> dict:
                 "description": new.description,
                 "date": new.date.isoformat()
             }
+        _commit()
+        intent_cache.invalidate(username)
+
+        logger.debug("交易已创建", extra={"username": username, "transaction_id": created["id"],
+                                          "type": created["type"], "category": created["category"],
+                                          "amount": created["amount"]})
+        return {
+            "success": True,
+            "data": created
         }
     except Exception as e:
         return {
@@ -182,6 +403,27 @@ def create_transaction(username: str, data: dict) -> dict:
         }
 
 
+CONFLICT_ERROR = "交易已被其他请求修改或删除，请刷新后重试"
+
+
+def _lock_transaction(id):  # 非 API 函数
+    """
+    读取要修改 / 删除的交易并加行锁（SELECT ... FOR UPDATE）：同一条交易的并发修改和删除依次执行，
+    后面的请求读到前一个提交后的值，月度汇总和预算不会按同一个旧值重复扣减。
+    不支持行锁的 SQLite 由 _unchanged() 的条件检测并发修改。
+    """
+    return Transaction.query.with_for_update().populate_existing().filter_by(id=id).first_or_404()
+
+
+def _unchanged(trans):  # 非 API 函数
+    """UPDATE / DELETE 的条件：交易仍是读取时的金额、类型、分类和日期，否则影响 0 行"""
+    return db.and_(Transaction.id == trans.id,
+                   Transaction.amount == trans.amount,
+                   Transaction.type == trans.type,
+                   Transaction.category_id.is_not_distinct_from(trans.category_id),
+                   Transaction.date == trans.date)
+
+
 def update_transaction(id: int, data: dict) -> dict:
     """
     更新指定 ID 的交易记录
@@ -195,39 +437,62 @@ def update_transaction(id: int, data: dict) -> dict:
         dict: 包含更新结果的字典
     """
     try:
-        trans = Transaction.query.get_or_404(id)
-        old_category = trans.category
-        old_amount = trans.amount
-        old_date = trans.date
-        old_type = trans.type
-
-        # 更新字段
-        trans.amount = data.get('amount', trans.amount)
-        trans.type = data.get('type', trans.type)
-        trans.category = data.get('category', trans.category)
-        trans.description = data.get('description', trans.description)
-
-        db.session.commit()
-
-        # 如果是支出类型，并且分类或金额发生变化，则更新预算
-        if old_type == 'expense':
-            # 先减去旧值
-            update_budget_for_transaction(trans.username, old_category, -old_amount, old_date)
-
-        if trans.type == 'expense':
-            # 再加上新值
-            update_budget_for_transaction(trans.username, trans.category, trans.amount, trans.date)
+        trans = _lock_transaction(id)
+        with db.session.begin_nested():
+            username = trans.username
+            old_category_id = trans.category_id
+            old_amount = trans.amount
+            old_date = trans.date
+            old_type = trans.type
+
+            # 新的字段值
+            amount = float(data.get('amount', old_amount))
+            trans_type = data.get('type', old_type)
+            category = data.get('category', trans.category)
+            category_id = category_dict.category_id(category) if 'category' in data else old_category_id
+            description = data.get('description', trans.description)
+            changed = db.session.execute(
+                db.update(Transaction).where(_unchanged(trans))
+                .values(amount=amount, type=trans_type, category=category, category_id=category_id,
+                        description=description)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if changed != 1:
+                raise ValueError(CONFLICT_ERROR)
+            db.session.expire(trans)
+
+            # 同步月度汇总和预算：减去旧值、加上新值，同一个键上的两次变化合并为一条 UPDATE
+            summary_changes = {}
+            budget_changes = {}
+            for sign, change_type, change_category_id, change_amount in ((-1, old_type, old_category_id, old_amount),
+                                                                         (1, trans_type, category_id, amount)):
+                key = (change_type, old_date.year, old_date.month)
+                total, count = summary_changes.get(key, (0, 0))
+                summary_changes[key] = (total + sign * change_amount, count + sign)
+                if change_type == 'expense':
+                    key = (change_category_id, old_date)
+                    budget_changes[key] = budget_changes.get(key, 0) + sign * change_amount
+
+            for (change_type, year, month), (total, count) in summary_changes.items():
+                update_summary_for_transaction(username, change_type, total, datetime(year, month, 1),
+                                               count_change=count)
+            for (change_category_id, day), amount_change in budget_changes.items():
+                update_budget_for_transaction(username, change_category_id, amount_change, day)
+
+            updated = {
+                "id": id,
+                "amount": amount,
+                "type": trans_type,
+                "category": category_dict.category_name(category_id, category),
+                "description": description,
+                "date": old_date.isoformat()
+            }
+        _commit()
+        intent_cache.invalidate(username)
 
         return {
             "success": True,
-            "data": {
-                "id": trans.id,
-                "amount": trans.amount,
-                "type": trans.type,
-                "category": trans.category,
-                "description": trans.description,
-                "date": trans.date.isoformat()
-            }
+            "data": updated
         }
     except Exception as e:
         return {
@@ -236,47 +501,77 @@ def update_transaction(id: int, data: dict) -> dict:
         }
 
 
-def update_budget_for_transaction(username, category, amount_change, transaction_date):  # 非 API 函数
+def update_budget_for_transaction(username, category_id, amount_change, transaction_date):  # 非 API 函数
     """
-    当交易记录变更时，更新对应的预算
+    当交易记录变更时，更新对应的预算（不提交，由调用方和交易一起提交）
+    该用户、该分类所有预算在交易日期所在的周期执行一条
+    UPDATE budget_period SET spent = spent - :amount_change，周期不存在时先插入，见 app.core.budgets
     :param username: 用户ID
-    :param category: 分类名称
-    :param amount_change: 要增加/减少的金额
+    :param category_id: 分类 id，为空（分类不存在）时没有对应的预算
+    :param amount_change: 要增加/减少的金额（支出为负数，因此已用金额增加）
     :param transaction_date: 交易时间
+    :return: 更新的预算周期数
     """
-    if not category or amount_change == 0:
-        return
+    if category_id is None or amount_change == 0:
+        return 0
 
-    print(f"[DEBUG] 更新预算: username={username}, category={category}, amount_change={amount_change}, date={transaction_date}")
-    
-    # 将datetime转换为date进行比较
-    transaction_date_only = transaction_date.date() if hasattr(transaction_date, 'date') else transaction_date
-
-    # 找到所有该用户、该分类、时间范围内有效的预算
-    budgets = Budget.query.filter(
-        Budget.username == username,
-        Budget.category == category,
-        Budget.start_date <= transaction_date_only,
-        Budget.end_date >= transaction_date_only
-    ).all()
-    
-    print(f"[DEBUG] 找到的预算数量: {len(budgets)}")
-    
-    for budget in budgets:
-        old_amount = budget.current_amount
-        budget.current_amount = max(budget.current_amount - amount_change, 0)  # 防止负值
-        print(f"[DEBUG] 预算 '{budget.name}' 更新: {old_amount} -> {budget.current_amount}")
-        db.session.add(budget)
-    
-    if budgets:
-        try:
-            db.session.commit()
-            print(f"[DEBUG] 预算更新已提交到数据库")
-        except Exception as e:
-            db.session.rollback()
-            print(f"[DEBUG] 预算更新提交失败: {e}")
-    else:
-        print(f"[DEBUG] 没有找到匹配的预算，无需更新")
+    updated = budget_periods.apply_expense(username, category_id, amount_change, to_date(transaction_date))
+    logger.debug("预算已更新", extra={"username": username, "category_id": category_id,
+                                     "amount_change": amount_change, "budgets": updated})
+    return updated
+
+
+def import_transactions(username, rows, batch_size=1000):  # 非 API 函数
+    """
+    批量导入已校验的交易记录（见 app.core.importers.validate_rows）
+    所有记录在同一个数据库事务中分批插入；月度汇总按 (年, 月, 类型) 各更新一次，
+    预算按受影响的 (分类, 预算周期) 各重新计算一次，而不是逐条更新。
+    没有 category_id 的记录按分类名称从分类字典中补上。
+    :param username: 用户ID
+    :param rows: Transaction 字段字典的列表
+    :param batch_size: 每条 INSERT 语句插入的行数
+    :return: 导入结果字典
+    """
+    if not rows:
+        return {"success": True, "data": {"imported": 0, "budgets_updated": 0}}
+
+    summary_changes = {}
+    expense_by_category = {}
+    for row in rows:
+        if row.get('category_id') is None:
+            row['category_id'] = category_dict.category_id(row['category'])
+        key = (row['date'].year, row['date'].month, row['type'])
+        total, count = summary_changes.get(key, (0, 0))
+        summary_changes[key] = (total + row['amount'], count + 1)
+        if row['type'] == 'expense' and row['category_id'] is not None:
+            expense_by_category.setdefault(row['category_id'], []).append((row['date'].date(), row['amount']))
+
+    try:
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(db.insert(Transaction), rows[start:start + batch_size])
+
+        for (year, month, trans_type), (total, count) in summary_changes.items():
+            update_summary_for_transaction(username, trans_type, total, datetime(year, month, 1), count_change=count)
+
+        # 每个受影响的 (预算, 周期) 用一条增量 UPDATE 更新（executemany）
+        budgets_updated = budget_periods.apply_expenses(username, expense_by_category)
+
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+    intent_cache.invalidate(username)
+    return {
+        "success": True,
+        "data": {
+            "imported": len(rows),
+            "budgets_updated": budgets_updated
+        }
+    }
 
 
 def delete_transaction(id: int) -> dict:
@@ -290,13 +585,21 @@ def delete_transaction(id: int) -> dict:
         dict: 包含删除结果的字典
     """
     try:
-        trans = Transaction.query.get_or_404(id)
-        db.session.delete(trans)
-        db.session.commit()
-
-        # 同步预算
-        if trans.type == 'expense':
-            update_budget_for_transaction(trans.username, trans.category, -trans.amount, trans.date)
+        trans = _lock_transaction(id)
+        with db.session.begin_nested():
+            username = trans.username
+            deleted = db.session.execute(
+                db.delete(Transaction).where(_unchanged(trans)).execution_options(synchronize_session=False)
+            ).rowcount
+            if deleted != 1:
+                raise ValueError(CONFLICT_ERROR)
+            db.session.expunge(trans)
+            # 删除、月度汇总和预算在同一个事务中提交
+            update_summary_for_transaction(username, trans.type, -trans.amount, trans.date, count_change=-1)
+            if trans.type == 'expense':
+                update_budget_for_transaction(username, trans.category_id, -trans.amount, trans.date)
+        _commit()
+        intent_cache.invalidate(username)
 
         return {
             "success": True,
@@ -311,23 +614,30 @@ def delete_transaction(id: int) -> dict:
 
 def get_budgets(username: str) -> dict:
     """
-    获取用户的所有预算计划
+    获取用户的所有预算计划，以及每个预算当前周期的已用金额
     Args:
         username (str): 用户名
     Returns:
-        dict: 包含预算计划列表的字典
+        dict: 包含预算计划列表的字典，current_amount 为当前周期（start_date ~ end_date）的已用金额
     """
     try:
-        budgets = Budget.query.filter_by(username=username).all()
+        with db.session.begin_nested():
+            periods = budget_periods.current_periods(username)
+            data = [{
+                "id": budget_id,
+                "name": name,
+                "target_amount": target_amount,
+                "current_amount": spent,
+                "category": category,
+                "period": period,
+                "start_date": start.isoformat(),
+                "end_date": end.isoformat()
+            } for (budget_id, name, target_amount, category, period), start, end, spent in periods]
+        # 新周期第一次被访问时插入了周期记录
+        _commit()
         return {
             "success": True,
-            "data": [{
-                "id": b.id,
-                "name": b.name,
-                "target_amount": b.target_amount,
-                "current_amount": b.current_amount,
-                "category": b.category
-            } for b in budgets]
+            "data": data
         }
     except Exception as e:
         return {
@@ -338,71 +648,84 @@ def get_budgets(username: str) -> dict:
 
 def create_budget(username: str, data: dict) -> dict:
     """
-    创建一个新的预算计划
+    创建一个循环的预算计划
     
     Args:
         data (dict): 包含预算计划信息的字典
-            必须包含 name, target_amount, category, username 字段
+            必须包含 name, target_amount, category 字段
+            period 为 week（每周）/ month（每月，默认）/ custom（自定义）
+            custom 需要 start_date 和 end_date（YYYY-MM-DD），之后按相同天数循环
             
     Returns:
-        dict: 包含创建结果的字典
+        dict: 包含创建结果的字典，current_amount 为第一个周期已有的支出
     """
     try:
-        category_name = data['category']
-
-        from datetime import date
-        import calendar
-
-        now = date.today()
-        start_date = date(now.year, now.month, 1)
-        last_day = calendar.monthrange(now.year, now.month)[1]
-        end_date = date(now.year, now.month, last_day)
-
-        # 检查 category 是否是预设分类之一
-        existing_category = Category.query.filter_by(name=category_name).first()
-        if not existing_category:
-            return {
-                "success": False,
-                "error": f"Invalid category: {category_name}"
-            }, 400
-
-        budget = Budget(
-            name=data['name'],
-            target_amount=data['target_amount'],
-            current_amount=0,
-            category=category_name,
-            start_date=start_date,
-            end_date=end_date,
-            username=username,
-        )
-        db.session.add(budget)
-        db.session.commit()
-        
-        # 计算该分类在预算时间范围内已有的支出交易总额
-        existing_transactions = Transaction.query.filter(
-            Transaction.username == username,
-            Transaction.category == category_name,
-            Transaction.type == 'expense',
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).all()
-        
-        # 累计已有支出（注意：支出金额存储为负数）
-        total_spent = sum(abs(trans.amount) for trans in existing_transactions)
-        budget.current_amount = total_spent
-        
-        print(f"[DEBUG] 新预算创建: {budget.name}, 同步已有支出: {total_spent}")
-        db.session.commit()
-
-        return {
-            "success": True,
-            "data": {
+        with db.session.begin_nested():
+            category_name = data['category']
+            period = data.get('period') or 'month'
+            if period not in budget_periods.PERIODS:
+                return {
+                    "success": False,
+                    "error": f"Invalid period: {period}"
+                }
+
+            if period == 'custom':
+                if not data.get('start_date') or not data.get('end_date'):
+                    return {
+                        "success": False,
+                        "error": "start_date and end_date are required for custom budgets"
+                    }
+                start_date, end_date = to_date(data['start_date']), to_date(data['end_date'])
+                if end_date < start_date:
+                    return {
+                        "success": False,
+                        "error": "end_date must not be earlier than start_date"
+                    }
+            else:
+                today = datetime.utcnow().date()
+                start_date, end_date = budget_periods.period_bounds(period, today, today, today)
+
+            # 检查 category 是否是已有分类之一（分类字典，不查询数据库）
+            category_id = category_dict.category_id(category_name)
+            if category_id is None:
+                return {
+                    "success": False,
+                    "error": f"Invalid category: {category_name}"
+                }
+
+            budget = Budget(
+                name=data['name'],
+                target_amount=data['target_amount'],
+                current_amount=0,
+                category=category_name,
+                category_id=category_id,
+                start_date=start_date,
+                end_date=end_date,
+                username=username,
+                period=period,
+            )
+            db.session.add(budget)
+            db.session.flush()
+            # 第一个周期：统计一次已有支出，之后由交易写入按增量维护
+            _, total_spent = budget_periods.start_budget(budget)
+            created = {
                 "id": budget.id,
                 "name": budget.name,
                 "target_amount": budget.target_amount,
-                "current_amount": budget.current_amount,
-                "category": budget.category
+                "current_amount": total_spent,
+                "category": budget.category,
+                "period": period,
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat()
             }
+        _commit()
+        intent_cache.invalidate(username)
+
+        logger.debug("新预算已同步已有支出", extra={"username": username, "budget": created["name"],
+                                                "total_spent": total_spent})
+        return {
+            "success": True,
+            "data": created
         }
     except Exception as e:
         return {
@@ -420,9 +743,6 @@ def get_categories() -> dict:
     """
     try:
         categories = Category.query.all()
-        # print("———————————————————正在获取所有支出分类———————————————————")
-        # print([{"id": c.id, "name": c.name} for c in categories])  # 调试输出
-        # print("——————————————————————————————————————————————————")
         return {
             "success": True,
             "data": [{
@@ -431,13 +751,30 @@ def get_categories() -> dict:
             } for c in categories]
         }
     except Exception as e:
-        print(str(e))
+        logger.exception("读取分类失败")
         return {
             "success": False,
             "error": str(e)
         }
 
 
+def get_category_snapshot():  # 非 API 函数
+    """
+    获取分类快照，未加载或已失效时从数据库重新加载，见 app.core.categories
+    :return: (version, [{"id": id1, "name": name1}, ...])，version 在每次重新加载后递增
+    """
+    return category_dict.snapshot()
+
+
+def invalidate_category_cache():  # 非 API 函数
+    """分类写入提交后调用，下次读取快照时重新加载"""
+    batch = _write_batch.get()
+    if batch is not None:
+        batch['invalidate_categories'] = True
+        return
+    category_dict.invalidate()
+
+
 def add_category(name: str) -> dict:
     """
     添加一个新的支出分类
@@ -446,9 +783,6 @@ def add_category(name: str) -> dict:
     Returns:
         dict: 包含添加结果的字典
     """
-    print("———————————————————正在添加支出分类———————————————————")
-    print(f"添加分类名称: {name}")  # 调试输出
-    print("——————————————————————————————————————————————————")
     try:
 
         # 检查是否已存在同名分类
@@ -461,8 +795,9 @@ def add_category(name: str) -> dict:
 
         new = Category(name=name)
         db.session.add(new)
-        db.session.commit()
-        print('———————————————————添加分类成功———————————————————')
+        _commit()
+        invalidate_category_cache()
+        logger.info("分类已添加", extra={"category": name})
         return {
             "success": True,
             "data": {
@@ -471,8 +806,7 @@ def add_category(name: str) -> dict:
             }
         }
     except Exception as e:
-        print('———————————————————添加分类失败———————————————————')
-        print(str(e))  # 打印错误信息
+        logger.exception("添加分类失败", extra={"category": name})
         return {
             "success": False,
             "error": str(e)
@@ -502,8 +836,10 @@ def update_category(id: int, new_name: str) -> dict:
             "error": f"分类 '{new_name}' 已存在"
         }
 
+    # 只改分类表，交易和预算按 category_id 从分类字典取新名称（见 app/core/categories.py）
     cat.name = new_name
-    db.session.commit()
+    _commit()
+    invalidate_category_cache()
 
     return {
         "success": True,
@@ -526,14 +862,21 @@ def delete_category(id: int) -> dict:
     """
     try:
         cat = Category.query.get_or_404(id)
+        # 先解除外键引用，写回当前的分类名称（改名不回写记录），预算不再匹配交易
+        for model in (Transaction, Budget):
+            db.session.execute(
+                db.update(model).where(model.category_id == cat.id).values(category_id=None, category=cat.name)
+                .execution_options(synchronize_session=False)
+            )
         db.session.delete(cat)
-        db.session.commit()
+        _commit()
+        invalidate_category_cache()
         return {
             "success": True,
             "message": "分类删除成功"
         }
     except Exception as e:
-        print(f"删除分类失败: {str(e)}")  # 打印错误信息
+        logger.exception("删除分类失败", extra={"category_id": id})
         return {
             "success": False,
             "error": str(e)
@@ -566,24 +909,12 @@ def get_reports(username: str, range_type: str = 'month') -> dict:
             start_date = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
             title = '本年度支出分类'
         else:
-            return jsonify({"success": False, "error": "Invalid range type"}), 400
-
-        # 查询时间范围内所有支出类交易
-        transactions = Transaction.query.filter(
-            Transaction.username == username,
-            Transaction.type == 'expense',
-            Transaction.date >= start_date
-        ).all()
-
-        # 按分类统计金额
-        category_summary = {}
-        for t in transactions:
-            if t.category not in category_summary:
-                category_summary[t.category] = 0
-            category_summary[t.category] += t.amount
+            return {"success": False, "error": "Invalid range type"}
 
-        categories = [{"name": k, "amount": round(v, 2)} for k, v in category_summary.items()]
-        total = round(sum(category_summary.values()), 2)
+        # 在数据库中按分类汇总，不逐条加载交易
+        totals = category_totals(username, start_date, None)
+        categories = [{"name": k, "amount": round(v, 2)} for k, (v, _) in totals.items()]
+        total = round(sum(v for v, _ in totals.values()), 2)
 
         return {
             "success": True,
@@ -593,6 +924,43 @@ def get_reports(username: str, range_type: str = 'month') -> dict:
                 "categories": categories
             }
         }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+def get_report_series(username: str, start_date: str, end_date: str, granularity: str = 'day',
+                      type: str = 'expense', compare: bool = False) -> dict:
+    """
+    获取任意时间范围内按天/周/月的分类统计时间序列
+    
+    Args:
+        username (str): 用户名
+        start_date (str): 起始日期（含），如 '2025-06-01'
+        end_date (str): 结束日期（不含），如 '2025-07-01'
+        granularity (str): 'day', 'week' 或 'month'，为空时只返回分类合计
+        type (str): 'expense' 或 'income'，默认 'expense'
+        compare (bool): 是否与上一个等长周期对比
+    Returns:
+        dict: 包含合计、分类统计、时间序列（series）及对比数据（comparison）
+    """
+    try:
+        if type not in ('expense', 'income'):
+            return {"success": False, "error": f"Invalid type: {type}"}
+        report = build_report(
+            username,
+            datetime.fromisoformat(str(start_date)),
+            datetime.fromisoformat(str(end_date)),
+            granularity=granularity or None,
+            trans_type=type,
+            compare=str(compare).lower() in ('1', 'true', 'yes'),
+        )
+        return {
+            "success": True,
+            "data": report
+        }
     except Exception as e:
         return {
             "success": False,
@@ -0,0 +1,233 @@
+"""
+批量导入交易记录时的文件解析与校验
+
+支持的格式：
+- jsonl:  每行一个 {"amount", "type", "category", "description", "date"} 对象
+- csv:    表头为 amount,type,category,description,date 的普通 CSV
+- alipay: 支付宝导出的交易明细 CSV
+- wechat: 微信支付导出的账单 CSV
+
+parse_import 把文件内容统一解析成交易字典列表，validate_rows 负责校验并转换成
+可以直接插入 Transaction 表的数据。
+"""
+import csv
+import io
+import json
+import math
+from datetime import datetime
+
+from app.core.fastpath import CATEGORY_KEYWORDS
+
+IMPORT_FORMATS = ('jsonl', 'csv', 'alipay', 'wechat')
+
+# 单次导入的最大行数
+MAX_IMPORT_ROWS = 50000
+
+# 支付宝"交易分类"到本系统分类的映射
+ALIPAY_CATEGORIES = {
+    '餐饮美食': '餐饮',
+    '交通出行': '交通', '爱车养车': '交通',
+    '日用百货': '购物', '服饰装扮': '购物', '数码电器': '购物', '美容美发': '购物', '母婴亲子': '购物',
+    '家居家装': '购物', '宠物': '购物', '运动户外': '购物',
+    '休闲娱乐': '娱乐', '文化休闲': '娱乐',
+    '医疗健康': '医疗',
+    '教育培训': '教育',
+    '住房物业': '住房', '生活服务': '住房',
+    '充值缴费': '通讯', '通讯物流': '通讯',
+    '酒店旅游': '旅游',
+    '投资理财': '储蓄',
+}
+
+_DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y/%m/%d %H:%M:%S', '%Y/%m/%d %H:%M',
+                 '%Y-%m-%d', '%Y/%m/%d')
+
+
+class ImportFormatError(ValueError):
+    """导入文件无法解析"""
+
+
+def decode_content(content):
+    """支付宝导出的文件通常是 GBK 编码，其它格式为 UTF-8"""
+    if isinstance(content, str):
+        return content
+    for encoding in ('utf-8-sig', 'gb18030'):
+        try:
+            return content.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise ImportFormatError("无法识别文件编码，请使用 UTF-8 或 GBK")
+
+
+def detect_format(text):
+    """根据内容猜测导入格式"""
+    head = text.lstrip()[:2000]
+    if head.startswith('{'):
+        return 'jsonl'
+    if '微信支付账单' in head:
+        return 'wechat'
+    if '支付宝' in head or 'alipay' in head.lower():
+        return 'alipay'
+    return 'csv'
+
+
+def guess_category(text):
+    """用快速记账的关键词词典从商品说明中猜测分类，猜不到时为'其他'"""
+    lowered = (text or '').lower()
+    for name, words in CATEGORY_KEYWORDS.items():
+        if any(word in lowered for word in words):
+            return name
+    return '其他'
+
+
+def _parse_amount(value):
+    return float(str(value).replace('¥', '').replace('￥', '').replace(',', '').strip())
+
+
+def _bill_rows(text, header_marker):
+    """账单文件前面有若干行说明，从包含 header_marker 的表头行开始读取"""
+    lines = text.splitlines()
+    for index, line in enumerate(lines):
+        if header_marker in line and '金额' in line:
+            reader = csv.DictReader(lines[index:])
+            return [{(k or '').strip(): (v or '').strip() for k, v in row.items()} for row in reader]
+    raise ImportFormatError("没有找到账单表头")
+
+
+def _bill_type(direction):
+    if direction == '支出':
+        return 'expense'
+    if direction == '收入':
+        return 'income'
+    return None  # "/"、"不计收支" 等不是真正的收支
+
+
+def parse_jsonl(text):
+    rows = []
+    for line_no, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            rows.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise ImportFormatError(f"第 {line_no} 行不是合法的 JSON: {e}")
+    return rows
+
+
+def parse_csv(text):
+    return [dict(row) for row in csv.DictReader(io.StringIO(text))]
+
+
+def parse_alipay(text):
+    rows = []
+    for row in _bill_rows(text, '收/支'):
+        trans_type = _bill_type(row.get('收/支'))
+        if trans_type is None or row.get('交易状态', '').startswith(('交易关闭', '退款')):
+            continue
+        description = row.get('商品说明') or row.get('商品名称') or row.get('交易对方', '')
+        category = ALIPAY_CATEGORIES.get(row.get('交易分类')) or guess_category(description)
+        rows.append({
+            'amount': row.get('金额') or row.get('金额（元）'),
+            'type': trans_type,
+            'category': category if trans_type == 'expense' else '其他',
+            'description': description,
+            'date': row.get('交易时间') or row.get('交易创建时间'),
+        })
+    return rows
+
+
+def parse_wechat(text):
+    rows = []
+    for row in _bill_rows(text, '收/支'):
+        trans_type = _bill_type(row.get('收/支'))
+        if trans_type is None:
+            continue
+        description = row.get('商品') if row.get('商品') not in (None, '', '/') else row.get('交易对方', '')
+        rows.append({
+            'amount': row.get('金额(元)') or row.get('金额'),
+            'type': trans_type,
+            'category': guess_category(description) if trans_type == 'expense' else '其他',
+            'description': description,
+            'date': row.get('交易时间'),
+        })
+    return rows
+
+
+PARSERS = {
+    'jsonl': parse_jsonl,
+    'csv': parse_csv,
+    'alipay': parse_alipay,
+    'wechat': parse_wechat,
+}
+
+
+def check_row_limit(rows):
+    """文件和 JSON 数组两种提交方式共用的行数上限"""
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise ImportFormatError(f"单次最多导入 {MAX_IMPORT_ROWS} 条记录")
+
+
+def parse_import(content, import_format=None):
+    """
+    解析导入文件
+    :param content: 文件内容（bytes 或 str）
+    :param import_format: jsonl / csv / alipay / wechat，为空时自动识别
+    :return: 未校验的交易字典列表
+    """
+    text = decode_content(content)
+    import_format = import_format or detect_format(text)
+    if import_format not in PARSERS:
+        raise ImportFormatError(f"不支持的导入格式: {import_format}")
+    rows = PARSERS[import_format](text)
+    check_row_limit(rows)
+    return rows
+
+
+def parse_date(value):
+    if isinstance(value, datetime):
+        return value
+    value = str(value).strip()
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for date_format in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    raise ValueError(f"无法识别的日期: {value}")
+
+
+def validate_rows(rows, username, category_names):
+    """
+    校验并转换为 Transaction 的字段
+    :return: (valid_rows, errors)，errors 为 [{"row": 行号, "error": 说明}, ...]，行号从 1 开始
+    """
+    valid, errors = [], []
+    for index, row in enumerate(rows, 1):
+        try:
+            trans_type = str(row.get('type', '')).strip()
+            if trans_type not in ('expense', 'income'):
+                raise ValueError(f"type 必须是 expense 或 income: {trans_type}")
+            amount = abs(_parse_amount(row['amount']))
+            if not math.isfinite(amount):
+                raise ValueError(f"金额必须是有限的数字: {row['amount']}")
+            if amount == 0:
+                raise ValueError("金额不能为 0")
+            category = str(row.get('category', '')).strip()
+            if category not in category_names:
+                raise ValueError(f"未知的分类: {category}")
+            date = parse_date(row['date']) if row.get('date') else datetime.utcnow()
+            valid.append({
+                'amount': -amount if trans_type == 'expense' else amount,  # 支出存储为负数
+                'type': trans_type,
+                'category': category,
+                'description': str(row.get('description') or '').strip()[:100] or None,
+                'date': date,
+                'username': username,
+            })
+        except KeyError as e:
+            errors.append({"row": index, "error": f"缺少字段 {e.args[0]}"})
+        except (AttributeError, TypeError, ValueError) as e:
+            errors.append({"row": index, "error": str(e)})
+    return valid, errors
@@ -0,0 +1,118 @@
+"""
+只读意图缓存
+
+把用户消息（归一化后）映射到第一阶段 LLM 解析出的只读工具及参数，例如
+"本月花了多少钱" -> get_summary(username=...)。命中时跳过第一阶段 LLM 调用，直接执行工具，
+工具结果每次都会重新计算，缓存里只保存"该调用哪个工具、用什么参数"。
+
+缓存按用户隔离，用户的交易或预算发生变化时清空该用户的缓存。
+有对话记忆时，"下一页"、"那上个月呢" 这类追问的含义取决于上一轮，因此缓存键还包含最近一轮对话的摘要；
+参数里带翻页游标、记录 id 或具体日期范围的调用依赖当时的上下文，不缓存。
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# 只有这些纯读取的工具会被缓存
+CACHEABLE_TOOLS = {'get_summary', 'get_budgets', 'get_reports', 'get_transactions', 'list_transactions',
+                   'get_report_series'}
+
+# 每个用户最多缓存的消息数，超出后淘汰最久未使用的
+MAX_ENTRIES_PER_USER = 200
+# 缓存条目的有效期（秒）
+ENTRY_TTL = 3600
+
+# 参数中出现这些字段时不缓存
+CONTEXT_ARGS = {'cursor', 'id', 'start_date', 'end_date'}
+
+_PUNCTUATION = re.compile(r'[\s\W_]+', re.UNICODE)
+
+
+def normalize_message(message):
+    """归一化用户消息：全角转半角、转小写、去掉空白和标点"""
+    text = unicodedata.normalize('NFKC', message or '').lower()
+    return _PUNCTUATION.sub('', text)
+
+
+def context_digest(history):
+    """对话上下文的摘要：取最近一轮（最后两条消息），没有对话记忆时为空字符串"""
+    if not history:
+        return ''
+    recent = json.dumps(list(history)[-2:], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(recent.encode('utf-8')).hexdigest()[:16]
+
+
+class IntentCache:
+    def __init__(self, max_entries=MAX_ENTRIES_PER_USER, ttl=ENTRY_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._users = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, username, message, context=''):
+        """
+        返回缓存的 {'tool_name', 'args', 'thought'}，未命中返回 None
+        :param context: context_digest(history)，与 put 时的上下文相同才命中
+        """
+        key = (normalize_message(message), context)
+        with self._lock:
+            entries = self._users.get(str(username))
+            entry = entries.get(key) if entries else None
+            if entry is None or self.clock() - entry['stored_at'] > self.ttl:
+                if entry is not None:
+                    del entries[key]
+                self.misses += 1
+                return None
+            entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, username, message, tool_name, args, thought='', context=''):
+        """缓存一次只读工具解析结果；不是只读工具或参数依赖上下文时不缓存"""
+        key = (normalize_message(message), context)
+        if tool_name not in CACHEABLE_TOOLS or not key[0] or CONTEXT_ARGS & set(args or ()):
+            return
+        with self._lock:
+            entries = self._users.setdefault(str(username), OrderedDict())
+            entries[key] = {
+                'tool_name': tool_name,
+                'args': dict(args),
+                'thought': thought,
+                'stored_at': self.clock(),
+            }
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def invalidate(self, username):
+        """清空某个用户的缓存"""
+        with self._lock:
+            if self._users.pop(str(username), None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'users': len(self._users),
+                'entries': sum(len(entries) for entries in self._users.values()),
+            }
+
+
+intent_cache = IntentCache()
@@ -0,0 +1,169 @@
+"""
+聊天任务队列
+
+/api/chat 在请求线程中等待两次 LLM 调用（通常 5~20 秒），几个同时聊天的用户就能占满 gunicorn 的所有线程，
+/api/summary、/api/transactions 只能排队。POST /api/chat/jobs 把一轮聊天作为任务提交，立即返回任务 id：
+
+- 任务状态保存在 chat_job 表中，任意 worker 进程都能查询（GET /api/chat/jobs/<id>）
+- broker 负责执行任务，只需实现 submit(job_id) / wait(job_id, timeout) / stats()。
+  LocalBroker 在本进程的线程池中执行，可以替换为独立的任务队列（由单独的 worker 进程调用 run_job）
+- 任务在自己的应用上下文中调用 chat_llm，用户消息、机器人回复和任务结果在同一个事务中写入
+- 查询时可以带 wait 参数：任务由本进程执行时等待它完成（长轮询），减少轮询次数
+
+    job = submit_chat(username, message)        # {"id", "status": "queued", ...}
+    get_job(job['id'], username)                # status 依次为 queued -> running -> done / failed
+"""
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+
+from app import db
+from app.models import Chat, ChatJob
+
+logger = logging.getLogger(__name__)
+
+# 本进程同时执行的聊天任务数
+JOB_WORKERS = 4
+# GET /api/chat/jobs/<id>?wait= 的最长等待时间（秒）
+JOB_MAX_WAIT = 25.0
+# 保存在 app.extensions 中的 broker
+EXTENSION_KEY = 'chat_job_broker'
+
+FAILED_REPLY = "抱歉，我暂时无法处理您的请求，请稍后再试。"
+
+
+class LocalBroker:
+    """在本进程的线程池中执行任务；任务的完成通知只在本进程内有效"""
+
+    def __init__(self, app, workers=JOB_WORKERS):
+        self.app = app
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chat-job')
+        self._events = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+
+    def submit(self, job_id):
+        with self._lock:
+            self._events[job_id] = threading.Event()
+            self.submitted += 1
+        self._executor.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        try:
+            with self.app.app_context():
+                run_job(job_id)
+        except Exception:
+            logger.exception("聊天任务执行失败", extra={"job_id": job_id})
+        finally:
+            with self._lock:
+                event = self._events.pop(job_id, None)
+                self.completed += 1
+            if event is not None:
+                event.set()
+
+    def wait(self, job_id, timeout):
+        """等待本进程中的任务完成，任务不在本进程或已完成时立即返回"""
+        with self._lock:
+            event = self._events.get(job_id)
+        if event is not None:
+            event.wait(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'pending': len(self._events),
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def get_broker(app=None):
+    """获取当前应用的 broker，第一次使用时创建 LocalBroker；测试中可以预先放入 app.extensions 替换"""
+    app = app or current_app._get_current_object()
+    broker = app.extensions.get(EXTENSION_KEY)
+    if broker is None:
+        broker = app.extensions.setdefault(EXTENSION_KEY, LocalBroker(app))
+    return broker
+
+
+def job_to_dict(job):
+    return {
+        "id": job.id,
+        "status": job.status,
+        "reply": job.reply,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def submit_chat(username, message):
+    """保存任务并交给 broker，立即返回"""
+    job = ChatJob(id=uuid.uuid4().hex, username=username, message=message,
+                  status='queued', created_at=datetime.utcnow())
+    db.session.add(job)
+    created = job_to_dict(job)
+    db.session.commit()
+    get_broker().submit(job.id)
+    return created
+
+
+def get_job(job_id, username, wait=0):
+    """
+    查询任务，不存在或不属于该用户时返回 None
+    :param wait: 任务未完成时最多等待的秒数（不超过 JOB_MAX_WAIT）
+    """
+    job = db.session.get(ChatJob, job_id)
+    if job is None or str(job.username) != str(username):
+        return None
+    if wait > 0 and job.status in ('queued', 'running'):
+        # 任务由另一个线程写入，等待前结束当前事务，之后重新读取
+        db.session.rollback()
+        get_broker().wait(job_id, min(wait, JOB_MAX_WAIT))
+        job = db.session.get(ChatJob, job_id, populate_existing=True)
+    return job_to_dict(job)
+
+
+def run_job(job_id):  # 在 broker 的 worker 中、应用上下文内调用
+    """执行一个任务：认领、调用 chat_llm、保存聊天记录和结果"""
+    from app.core.llm import chat_llm
+
+    # 只有 queued 的任务会被认领，同一个任务即使被提交两次也只执行一次
+    claimed = db.session.execute(
+        db.update(ChatJob)
+        .where(ChatJob.id == job_id, ChatJob.status == 'queued')
+        .values(status='running')
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return
+    job = db.session.get(ChatJob, job_id)
+    username, message = job.username, job.message
+
+    try:
+        # 与 /api/chat 相同：用户消息先加入 session，和工具写入、机器人回复一起提交
+        db.session.add(Chat(content=message, type=1, username=username))
+        result = chat_llm(username, message)
+        reply = result.get('data') or FAILED_REPLY
+        db.session.add(Chat(content=reply, type=0, username=username))
+        job = db.session.get(ChatJob, job_id)
+        job.status = 'done' if result.get('success') else 'failed'
+        job.reply = reply
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logger.exception("聊天任务失败", extra={"job_id": job_id, "username": username})
+        db.session.execute(
+            db.update(ChatJob).where(ChatJob.id == job_id)
+            .values(status='failed', reply=FAILED_REPLY, finished_at=datetime.utcnow())
+        )
+        db.session.commit()
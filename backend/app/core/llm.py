@@ -1,10 +1,23 @@
 import json
+import time
 import datetime
+import threading
 from flask import session
 import app.core.functions as F
-from openai import OpenAI
+from app.core.llm_async import complete
+from app.core.intent_cache import intent_cache, context_digest
+from app.core.fastpath import try_fast_path
+from app.core.memory import conversation_memory, estimate_tokens
+from app.core.ratelimit import RateLimited, acquire_provider
+from app.core.breaker import get_breaker, order_by_health
+from app.core.usage import collect_usage, add_response_usage, record_usage
+from app.core.toolcalls import parse_tool_calls, run_tool_calls
+from app.metrics import timed, timed_tool
+from openai import OpenAI, DefaultHttpxClient, DEFAULT_CONNECTION_LIMITS, Timeout
 import logging
 
+logger = logging.getLogger(__name__)
+
 # LLM配置
 LLM_CONFIGS = {
     "ecnu": {
@@ -24,11 +37,33 @@ LLM_CONFIGS = {
 # 默认使用的LLM
 DEFAULT_LLM = "qwen"
 
+# 对冲请求：首选LLM超过该时间（秒）未返回时，同时请求备用LLM，取先返回的结果。
+# 'auto' 按首选LLM最近成功请求耗时的 p95 计算（不低于 LLM_HEDGE_MIN_DELAY，样本不足时就用它），
+# 只有明显慢于平常的请求才会对冲；也可以设为固定秒数，None 表示只在出错时切换。
+# LLM_CONFIGS 中的条目可以用 "hedge_delay" 字段覆盖
+LLM_HEDGE_DELAY = 'auto'
+# 思考模型的回复通常需要 5~10 秒，延迟过短时几乎每个请求都会对冲，成本和限流用量翻倍
+LLM_HEDGE_MIN_DELAY = 10.0
+LLM_HEDGE_MIN_SAMPLES = 10
+# 单次LLM调用（含对冲）的最长等待时间（秒）
+LLM_REQUEST_TIMEOUT = 90.0
+
+# 连接池与超时配置，LLM_CONFIGS 中的条目可以用 "pool" 字段覆盖其中的任意项
+LLM_POOL_CONFIG = {
+    "max_connections": 20,            # 每个LLM的最大并发连接数
+    "max_keepalive_connections": 10,  # 保持空闲的长连接数
+    "keepalive_expiry": 60.0,         # 空闲长连接的保留时间（秒）
+    "connect_timeout": 5.0,           # 建立连接的超时（秒）
+    "timeout": 60.0,                  # 读写超时（秒）
+    "max_retries": 2,
+}
+
 available_functions = {
     "get_current_datetime": F.get_current_datetime,
     "add": F.add,
     "get_summary": F.get_summary,
     "get_transactions": F.get_transactions,
+    "list_transactions": F.list_transactions,
     "create_transaction": F.create_transaction,
     "update_transaction": F.update_transaction,
     "delete_transaction": F.delete_transaction,
@@ -39,23 +74,68 @@ available_functions = {
     "update_category": F.update_category,
     "delete_category": F.delete_category,
     "get_reports": F.get_reports,
+    "get_report_series": F.get_report_series,
 }
 
+# 与 openai SDK 使用同一个 HTTP 库的连接池参数类型
+Limits = type(DEFAULT_CONNECTION_LIMITS)
+
+# 进程内共享的客户端：{llm_name: (连接参数, OpenAI客户端)}
+# OpenAI 客户端本身是线程安全的，复用它可以保留 HTTP 长连接和 TLS 会话
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_pool_config(llm_name):
+    """获取指定LLM的连接池配置"""
+    pool = dict(LLM_POOL_CONFIG)
+    pool.update(LLM_CONFIGS[llm_name].get("pool", {}))
+    return pool
+
+def create_llm_client(config, pool):
+    """按配置新建一个带连接池的客户端"""
+    http_client = DefaultHttpxClient(
+        limits=Limits(
+            max_connections=pool["max_connections"],
+            max_keepalive_connections=pool["max_keepalive_connections"],
+            keepalive_expiry=pool["keepalive_expiry"],
+        ),
+        timeout=Timeout(pool["timeout"], connect=pool["connect_timeout"]),
+    )
+    return OpenAI(
+        api_key=config["api_key"],
+        base_url=config["base_url"],
+        max_retries=pool["max_retries"],
+        http_client=http_client,
+    )
+
 def get_llm_client(llm_name=None):
-    """获取LLM客户端"""
+    """获取LLM客户端（按LLM名称复用）"""
     llm_name = llm_name or DEFAULT_LLM
     config = LLM_CONFIGS.get(llm_name)
     if not config:
         raise ValueError(f"未知的LLM: {llm_name}")
-    
-    return OpenAI(
-        api_key=config["api_key"],
-        base_url=config["base_url"]
-    ), config
 
-def format_tools_for_prompt(tools):
-    """ReAct format_tools_for_prompt"""
-    prompt_str = """
+    # base_url / api_key / 连接池配置变化后需要重新创建客户端
+    pool = get_pool_config(llm_name)
+    signature = (config["base_url"], config["api_key"], tuple(sorted(pool.items())))
+    entry = _clients.get(llm_name)
+    if entry is None or entry[0] != signature:
+        with _clients_lock:
+            entry = _clients.get(llm_name)
+            if entry is None or entry[0] != signature:
+                # 旧客户端可能仍被其它线程使用，不主动关闭，由垃圾回收释放
+                entry = (signature, create_llm_client(config, pool))
+                _clients[llm_name] = entry
+    return entry[1], config
+
+def close_llm_clients():
+    """关闭并清空所有共享的客户端"""
+    with _clients_lock:
+        for _, client in _clients.values():
+            client.close()
+        _clients.clear()
+
+PROMPT_HEADER = """
 You are a professional expense tracking assistant. Your primary task is to help users manage their expenses by accurately understanding their natural language requests and converting them into calls to the provided database operation tools (CRUD). You must strictly follow the constraints below.
 
 ### CONSTRAINTS ####
@@ -64,39 +144,144 @@ You are a professional expense tracking assistant. Your primary task is to help
 3. When you believe that you have the final answer and can respond to the user, please use the TaskCompleteTool.
 4. The Thought field must be explained in chinese.
 5. You must respond in JSON format, DO NOT include "```json" tags.
+### Partial parameter constraints ###
+1. 当前用户名为: 
 """
-    prompt_str += "### Partial parameter constraints ###\n"
-    prompt_str += "1. 当前用户名为: \n"
-    prompt_str += session['username'] + '\n'
-    prompt_str += "2. 现在已经获取所有分类的 id 与名称，如果需要修改或删除请使用下方的 id (最大id不表示分类个数)\n"
-    categories = F.get_categories()['data']
-    for category in categories:
-        prompt_str += f"- {category}\n"
-    prompt_str += "3. type 参数有下面两种\n"
-    prompt_str += "- expense\n- income\n"
-    prompt_str += "### Tool List ###\n"
-    descriptions = []
-    for tool_name, tool_function in tools.items():
-        func_description = '\n    {'
-        func_description += f"`name`: {tool_name},"
-        func_description += f"`description`: {tool_function.__doc__.strip()},"
-        func_description += f"`parameters`: {tool_function.__annotations__}"
-        func_description += '}'
-        descriptions.append(func_description)
-    prompt_str += '[' + ','.join(descriptions) + '\n]'
-    prompt_str += """
+
+PROMPT_RESPONSE_FORMAT = """
 You should only respond in JSON format as described below
 
 ### RESPONSE FORMAT ###
-    {"thought": "为什么选择这个工具的思考","status": "true", "tool_names": "工具名","args_list": {"工具名1":{"参数名1": "参数值1","参数名2": "参数值2"}}}
+    {"thought": "为什么选择这些工具的思考","status": "true", "tool_calls": [{"name": "工具名1", "args": {"参数名1": "参数值1","参数名2": "参数值2"}}]}
   
-    {"thought": "用户没有提供具体问题，因此需要请求用户提供更多信息以便选择适当的工具。","tool_names": "", "status": "false","args_list": {}}
+    {"thought": "用户没有提供具体问题，因此需要请求用户提供更多信息以便选择适当的工具。", "status": "false", "tool_calls": []}
+
+One request may need several tools, e.g. recording two expenses and then reading the monthly summary: put every call in tool_calls, in the order they should happen. The same tool may appear more than once.
 
 Make sure that the response content you return is all in JSON format and does not contain any extra content.
 """
+
+# 工具描述只依赖于函数本身，按工具集合缓存；分类部分按分类快照的版本缓存
+_tool_block_cache = {}
+_category_block_cache = {'version': None, 'text': ''}
+
+# system prompt 构建的统计信息
+PROMPT_STATS = {
+    'builds': 0,
+    'tool_block_misses': 0,
+    'category_block_misses': 0,
+    'total_build_seconds': 0.0,
+    'last_build_seconds': 0.0,
+    'last_size': 0,
+}
+
+def format_tool_block(tools):
+    """工具列表部分（静态，按工具集合缓存）"""
+    key = tuple((name, id(func)) for name, func in tools.items())
+    block = _tool_block_cache.get(key)
+    if block is None:
+        PROMPT_STATS['tool_block_misses'] += 1
+        descriptions = []
+        for tool_name, tool_function in tools.items():
+            func_description = '\n    {'
+            func_description += f"`name`: {tool_name},"
+            func_description += f"`description`: {tool_function.__doc__.strip()},"
+            func_description += f"`parameters`: {tool_function.__annotations__}"
+            func_description += '}'
+            descriptions.append(func_description)
+        block = "3. type 参数有下面两种\n- expense\n- income\n### Tool List ###\n"
+        block += '[' + ','.join(descriptions) + '\n]' + PROMPT_RESPONSE_FORMAT
+        _tool_block_cache[key] = block
+    return block
+
+def format_category_block():
+    """分类列表部分（分类快照变化时才重新拼接）"""
+    version, categories = F.get_category_snapshot()
+    if _category_block_cache['version'] != version:
+        PROMPT_STATS['category_block_misses'] += 1
+        text = "2. 现在已经获取所有分类的 id 与名称，如果需要修改或删除请使用下方的 id (最大id不表示分类个数)\n"
+        text += ''.join(f"- {category}\n" for category in categories)
+        _category_block_cache.update(version=version, text=text)
+    return _category_block_cache['text']
+
+def format_tools_for_prompt(tools, username=None):
+    """ReAct format_tools_for_prompt"""
+    start = time.perf_counter()
+    username = session['username'] if username is None else username
+    prompt_str = (PROMPT_HEADER + str(username) + '\n'
+                  + format_category_block() + format_tool_block(tools))
+
+    elapsed = time.perf_counter() - start
+    PROMPT_STATS['builds'] += 1
+    PROMPT_STATS['total_build_seconds'] += elapsed
+    PROMPT_STATS['last_build_seconds'] = elapsed
+    PROMPT_STATS['last_size'] = len(prompt_str)
+    logger.debug("system prompt 已构建", extra={"build_ms": round(elapsed * 1000, 3), "size": len(prompt_str)})
     return prompt_str
 
-def call_llm(prompt, username, functions=None, llm_name=None, use_fallback=True):
+def get_prompt_stats():
+    """获取 system prompt 构建的统计信息"""
+    stats = dict(PROMPT_STATS)
+    stats['avg_build_seconds'] = stats['total_build_seconds'] / stats['builds'] if stats['builds'] else 0.0
+    return stats
+
+def build_direct_messages(prompt, history=()):
+    """没有可调用的工具时，直接聊天使用的消息；history 为 conversation_memory.window() 返回的最近对话"""
+    return [
+        {"role": "system", "content": "You are a professional expense tracking assistant."},
+        *history,
+        {"role": "user", "content": prompt}
+    ]
+
+def build_result_messages(prompt, result, history=()):
+    """第二阶段：根据工具调用结果生成回复使用的消息"""
+    return [
+        {"role": "system", "content": "You are a professional expense tracking assistant. Please respond to the user's request based on the function call result."},
+        *history,
+        {"role": "user", "content": "用户请求为：\n" + prompt + f"""
+
+根据用户请求调用函数后结果为：\n"+ {json.dumps(result, ensure_ascii=False)} + "\n\n请给一个合适的回应比如：
+"好的，我已经记录了这笔开支：\n💰 金额：25元\n🍽 分类：餐饮\n📅 时间：今天";
+"本月您总共花费了2580.00元，主要支出为餐饮580元，交通320元。";
+"""},
+    ]
+
+def get_llm_candidates(llm_name=None, use_fallback=True):
+    """
+    按优先级返回要尝试的LLM列表 [(llm_name, config, pool), ...]，首选在前，其余作为备用
+    熔断中的LLM不作为候选（见 app.core.breaker），全部熔断时仍按原顺序尝试
+    """
+    llm_name = llm_name or DEFAULT_LLM
+    if llm_name not in LLM_CONFIGS:
+        raise ValueError(f"未知的LLM: {llm_name}")
+    names = [llm_name]
+    if use_fallback:
+        names += [name for name in LLM_CONFIGS if name != llm_name]
+    names = order_by_health(names)
+    return [(name, LLM_CONFIGS[name], get_pool_config(name)) for name in names]
+
+def get_hedge_delay(llm_name):
+    """首选LLM为 llm_name 时的对冲延迟（秒），见 LLM_HEDGE_DELAY"""
+    delay = LLM_CONFIGS[llm_name].get("hedge_delay", LLM_HEDGE_DELAY)
+    if delay != 'auto':
+        return delay
+    p95 = get_breaker(llm_name).latency_quantile(0.95, LLM_HEDGE_MIN_SAMPLES)
+    return max(LLM_HEDGE_MIN_DELAY, p95 or 0.0)
+
+def complete_chat(messages, llm_name=None, use_fallback=True, **kwargs):
+    """
+    发起一次（可能被对冲的）chat.completions 请求
+    Returns:
+        tuple: (response, 实际返回结果的llm_name)
+    """
+    candidates = get_llm_candidates(llm_name, use_fallback)
+    response, answered_by = complete(candidates, messages, hedge_delay=get_hedge_delay(candidates[0][0]),
+                                     timeout=LLM_REQUEST_TIMEOUT, **kwargs)
+    add_response_usage(answered_by, response)
+    return response, answered_by
+
+@timed('call_llm')
+def call_llm(prompt, username, functions=None, llm_name=None, use_fallback=True, history=()):
     """
     Call the LLM with a prompt and optional functions.
     
@@ -104,177 +289,308 @@ def call_llm(prompt, username, functions=None, llm_name=None, use_fallback=True)
         prompt (str): The prompt to send to the LLM.
         functions (dict, optional): A dictionary of available functions.
         llm_name (str, optional): LLM to use ('ecnu' or 'qwen')
-        use_fallback (bool): Whether to try alternative LLM if primary fails
+        use_fallback (bool): Whether to hedge to / fall back on the other LLMs
+        history (list): 最近的对话（conversation_memory.window()），放在 system prompt 之后
         
     Returns:
         dict: A dictionary containing the status, thought, and result of the LLM response.
+            多个工具调用时 tool_name 为逗号分隔的工具名，result 为
+            [{"tool_name", "args", "result"}, ...]（见 app.core.toolcalls）
     """
     llm_name = llm_name or DEFAULT_LLM
+
+    # 重复的只读问题直接使用缓存的工具和参数，跳过第一阶段LLM调用；
+    # 上一轮对话不同时（例如追问"下一页"）同一句话的含义可能不同，不会命中
+    context = context_digest(history)
+    cached = intent_cache.get(username, prompt, context)
+    if cached and functions and cached['tool_name'] in functions:
+        try:
+            with timed_tool(cached['tool_name']):
+                result = functions[cached['tool_name']](**cached['args'])
+            return {
+                'status': True,
+                'thought': cached['thought'],
+                'tool_name': cached['tool_name'],
+                'args': cached['args'],
+                'result': result,
+            }
+        except Exception as e:
+            logger.error(f"缓存的函数调用失败: {cached['tool_name']}, 参数: {cached['args']}, 错误: {str(e)}")
+            intent_cache.invalidate(username)
     
     try:
-        client, config = get_llm_client(llm_name)
         messages = [
-            {"role": "system", "content": format_tools_for_prompt(available_functions)},
+            {"role": "system", "content": format_tools_for_prompt(available_functions, username)},
+            *history,
             {"role": "user", "content": f"username: {username}" + prompt}
         ]
         
-        # 准备调用参数
-        call_params = {
-            "model": config["model"],
-            "messages": messages,
-            "extra_body": config["extra_body"]
-        }
-        
-        response = client.chat.completions.create(**call_params)
-        logging.debug("—————————————————LLM Response————————————————————————")
-        logging.debug(response.choices[0].message.content)
+        with timed('llm_first_stage'):
+            response, answered_by = complete_chat(messages, llm_name, use_fallback)
+        logger.debug("第一阶段LLM响应", extra={"llm": answered_by, "content": response.choices[0].message.content})
         
         try:
             json_response = json.loads(response.choices[0].message.content)
         except json.JSONDecodeError as e:
-            logging.error(f"JSON解析失败: {str(e)}")
-            logging.error(f"LLM原始响应: {response.choices[0].message.content}")
+            logger.error(f"JSON解析失败: {str(e)}")
+            logger.error(f"LLM原始响应: {response.choices[0].message.content}")
             return {'status': False}
             
         if json_response.get("status", "false") == "false":
             return {'status': False}
         thought = json_response.get("thought", "")
-        function_name = json_response.get("tool_names", None)
-        args = json_response.get("args_list", {})
-        args = args.get(function_name, {}) if function_name else {}
-        function = functions.get(function_name) if function_name else None
-        
-        try:
-            result = function(**args) if function else None
-        except Exception as e:
-            logging.error(f"函数调用失败: {function_name}, 参数: {args}, 错误: {str(e)}")
-            return {'status': False}
+        calls = parse_tool_calls(json_response)
+        if len(calls) > 1:
+            # 多个工具：写入在一个事务中依次执行，只读工具并发执行，结果一起交给第二阶段
+            executed = run_tool_calls(functions or {}, calls)
+            return {
+                'status': True,
+                'thought': thought,
+                'tool_name': ', '.join(name for name, _ in calls),
+                'args': None,
+                'result': executed,
+            }
+
+        function_name, args = calls[0] if calls else (None, {})
+        if function_name and functions:
+            call = run_tool_calls(functions, calls)[0]
+            if 'error' in call:
+                return {'status': False}
+            result = call['result']
+        else:
+            result = None
+
+        if isinstance(result, dict) and result.get('success'):
+            intent_cache.put(username, prompt, function_name, args, thought, context)
             
         return {
             'status': True,
             'thought': thought,
+            'tool_name': function_name,
+            'args': args,
             'result': result,
         }
         
     except Exception as e:
-        logging.error(f"LLM调用异常 ({llm_name}): {str(e)}")
-        
-        # 如果启用了fallback且当前不是备用LLM，尝试备用LLM
-        fallback_llm = "qwen" if llm_name == "ecnu" else "ecnu"
-        if use_fallback and llm_name != fallback_llm:
-            logging.info(f"尝试使用备用LLM: {fallback_llm}")
-            return call_llm(prompt, username, functions, fallback_llm, use_fallback=False)
-        
+        logger.error(f"LLM调用异常 ({llm_name}): {str(e)}")
         return {'status': False}
 
+def save_usage(username, usages):
+    """把本轮的 LLM 用量累加到 llm_usage（随聊天记录一起提交），失败时只记录日志"""
+    if not usages:
+        return
+    try:
+        record_usage(username, usages)
+    except Exception:
+        logger.exception("保存LLM用量失败", extra={"username": username})
+
+def remember(username, prompt, reply, result):
+    """把一轮对话和工具调用结果加入对话记忆，失败时只记录日志"""
+    try:
+        if result.get('tool_name') and result.get('status', True):
+            conversation_memory.record(username, prompt, reply, result['tool_name'],
+                                       result.get('args'), result.get('result'))
+        else:
+            conversation_memory.record(username, prompt, reply)
+    except Exception:
+        logger.exception("保存对话记忆失败", extra={"username": username})
+
+@timed('chat_llm')
 def chat_llm(username, prompt, llm_name=None, use_fallback=True):
     """
     这是一个二阶段的调用函数，首先调用call_llm函数获取结果：
     如果结果状态为False，则直接使用OpenAI的API进行聊天回复。
     如果结果状态为True，则根据调用函数后的结果使用OpenAI的API进行聊天回复。
+    两个阶段各自独立地对冲/切换备用LLM，某一阶段切换时不会重做另一阶段。
     
     Args:
         prompt (str): The prompt to send to the LLM.
         username (str): The username of the user making the request.
         llm_name (str, optional): LLM to use ('ecnu' or 'qwen')
-        use_fallback (bool): Whether to try alternative LLM if primary fails
+        use_fallback (bool): Whether to hedge to / fall back on the other LLMs
     Returns:
         dict: A dictionary containing the status and data of the response.
     """
     llm_name = llm_name or DEFAULT_LLM
+
+    # 简单的记账消息在本地解析并直接记账，不调用LLM
+    with timed('fastpath'):
+        fast = try_fast_path(username, prompt)
+    if fast:
+        remember(username, prompt, fast['reply'], fast)
+        return {
+            "success": True,
+            "data": fast['reply']
+        }
     
-    try:
-        result = call_llm(prompt, username, functions=available_functions, 
-                         llm_name=llm_name, use_fallback=use_fallback)
-        
-        client, config = get_llm_client(llm_name)
-        
-        if result['status'] == False:
-            try:
-                messages = [
-                    {"role": "system", "content": "You are a professional expense tracking assistant."},
-                    {"role": "user", "content": prompt}
-                ]
-                call_params = {
-                    "model": config["model"],
-                    "messages": messages,
-                    "extra_body": config["extra_body"]
-                }
-                response = client.chat.completions.create(**call_params)
-                return {
-                    "success": True,
-                    "data": response.choices[0].message.content.strip()
-                }
-            except Exception as e:
-                logging.error(f"直接聊天调用失败 ({llm_name}): {str(e)}")
-                
-                # 尝试备用LLM
-                fallback_llm = "qwen" if llm_name == "ecnu" else "ecnu"
-                if use_fallback and llm_name != fallback_llm:
-                    logging.info(f"尝试使用备用LLM进行聊天: {fallback_llm}")
-                    return chat_llm(username, prompt, fallback_llm, use_fallback=False)
-                
-                return {
-                    "success": False,
-                    "data": "抱歉，我暂时无法处理您的请求，请稍后再试。"
-                }
-        
+    with collect_usage() as usages:
         try:
-            messages = [
-                {"role": "system", "content": "You are a professional expense tracking assistant. Please respond to the user's request based on the function call result."},
-                {"role": "user", "content": "用户请求为：\n" + prompt + f"""
-
-根据用户请求调用函数后结果为：\n"+ {json.dumps(result, ensure_ascii=False)} + "\n\n请给一个合适的回应比如：
-"好的，我已经记录了这笔开支：\n💰 金额：25元\n🍽 分类：餐饮\n📅 时间：今天";
-"本月您总共花费了2580.00元，主要支出为餐饮580元，交通320元。";
-"""},
-            ]
-            logging.debug(f"第二阶段LLM调用 - 用户: {username}, 函数结果: {json.dumps(result, ensure_ascii=False)}")
+            # 最近的对话，使追问可以直接引用上一轮的结果
+            history = conversation_memory.window(username)
+            result = call_llm(prompt, username, functions=available_functions, 
+                             llm_name=llm_name, use_fallback=use_fallback, history=history)
             
-            call_params = {
-                "model": config["model"],
-                "messages": messages,
-                "extra_body": config["extra_body"]
-            }
-            response = client.chat.completions.create(**call_params)
-            logging.debug(f"第二阶段LLM响应: {response.choices[0].message.content}")
+            if result['status']:
+                messages = build_result_messages(prompt, result, history)
+                logger.debug("第二阶段LLM调用", extra={"username": username, "tool_result": result})
+            else:
+                messages = build_direct_messages(prompt, history)
+
+            with timed('llm_second_stage'):
+                response, answered_by = complete_chat(messages, llm_name, use_fallback)
+            logger.debug("第二阶段LLM响应", extra={"llm": answered_by, "content": response.choices[0].message.content})
+            reply = response.choices[0].message.content.strip()
+            remember(username, prompt, reply, result)
             return {
                 "success": True,
-                "data": response.choices[0].message.content.strip()
+                "data": reply
+            }
+        except RateLimited as e:
+            # 所有LLM都被限流：不再等待上游，由接口返回 429
+            logger.warning(f"chat_llm被限流: {str(e)}", extra={"username": username})
+            return {
+                "success": False,
+                "data": "当前使用的人较多，请稍后再试。",
+                "retry_after": e.retry_after
             }
         except Exception as e:
-            logging.error(f"函数结果处理调用失败 ({llm_name}): {str(e)}")
-            
-            # 尝试备用LLM
-            fallback_llm = "qwen" if llm_name == "ecnu" else "ecnu"
-            if use_fallback and llm_name != fallback_llm:
-                logging.info(f"第二阶段尝试使用备用LLM: {fallback_llm}")
-                return chat_llm(username, prompt, fallback_llm, use_fallback=False)
-            
+            logger.error(f"chat_llm整体调用失败: {str(e)}")
             return {
                 "success": False,
                 "data": "抱歉，我暂时无法处理您的请求，请稍后再试。"
             }
-    except Exception as e:
-        logging.error(f"chat_llm整体调用失败: {str(e)}")
-        return {
-            "success": False,
-            "data": "抱歉，我暂时无法处理您的请求，请稍后再试。"
-        }
+        finally:
+            save_usage(username, usages)
+
+def stream_chat_llm(username, prompt, llm_name=None, use_fallback=True):
+    """
+    chat_llm 的流式版本：第一阶段（工具选择与调用）完成后立即产出结果，
+    第二阶段的回复按 token 逐段产出。
+    
+    Args:
+        username (str): The username of the user making the request.
+        prompt (str): The prompt to send to the LLM.
+        llm_name (str, optional): LLM to use ('ecnu' or 'qwen')
+        use_fallback (bool): Whether to try alternative LLM if primary fails
+    Yields:
+        tuple: (event, data)，event 依次为
+            'tool'  -> {"status", "tool_name", "thought"} 第一阶段结果
+            'token' -> str 第二阶段回复的增量文本
+            'done'  -> {"success", "data"} 完整回复，data 与 chat_llm 的返回一致
+    """
+    llm_name = llm_name or DEFAULT_LLM
+
+    fast = try_fast_path(username, prompt)
+    if fast:
+        remember(username, prompt, fast['reply'], fast)
+        yield 'tool', {"status": True, "tool_name": fast['tool_name'], "thought": "本地快速记账"}
+        yield 'token', fast['reply']
+        yield 'done', {"success": True, "data": fast['reply']}
+        return
+
+    history = conversation_memory.window(username)
+    # 生成器会在 yield 处切换上下文，只在第一阶段（不含 yield）中用 collect_usage 收集，流式回复的用量直接追加
+    with collect_usage() as usages:
+        result = call_llm(prompt, username, functions=available_functions,
+                          llm_name=llm_name, use_fallback=use_fallback, history=history)
+    yield 'tool', {
+        "status": result['status'],
+        "tool_name": result.get('tool_name'),
+        "thought": result.get('thought', ''),
+    }
+
+    if result['status']:
+        messages = build_result_messages(prompt, result, history)
+    else:
+        messages = build_direct_messages(prompt, history)
+
+    for candidate, _, _ in get_llm_candidates(llm_name, use_fallback):
+        chunks = []
+        usage = None
+        breaker = get_breaker(candidate)
+        started = time.perf_counter()
+        try:
+            client, config = get_llm_client(candidate)
+            acquire_provider(candidate, config)
+            started = time.perf_counter()
+            response = client.chat.completions.create(
+                model=config["model"],
+                messages=messages,
+                extra_body=config["extra_body"],
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            for chunk in response:
+                # 最后一段没有 choices，只带本次请求的 usage
+                usage = getattr(chunk, 'usage', None) or usage
+                if not chunk.choices:
+                    continue
+                # 只转发正式回复，思考过程(reasoning_content)不下发
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    chunks.append(delta)
+                    yield 'token', delta
+        except RateLimited as e:
+            logger.warning(f"流式回复被限流 ({candidate}): {str(e)}")
+            breaker.release()
+            continue
+        except GeneratorExit:
+            # 客户端断开连接，不代表该LLM出错
+            breaker.release()
+            raise
+        except Exception as e:
+            logger.error(f"流式回复调用失败 ({candidate}): {str(e)}")
+            breaker.record(False, time.perf_counter() - started)
+            if chunks:
+                # 已经向客户端输出了部分内容，不能再换一个模型从头开始
+                break
+            continue
+        breaker.record(True, time.perf_counter() - started)
+        reply = ''.join(chunks).strip()
+        if usage is not None:
+            usages.append((candidate, usage.prompt_tokens or 0, usage.completion_tokens or 0))
+        else:
+            # 不支持 stream_options 的服务不返回 usage，按字符数估算，避免流式接口绕过每日用量限制
+            usages.append((candidate, sum(estimate_tokens(m['content']) for m in messages), estimate_tokens(reply)))
+        save_usage(username, usages)
+        remember(username, prompt, reply, result)
+        yield 'done', {"success": True, "data": reply}
+        return
+
+    save_usage(username, usages)
+    yield 'done', {"success": False, "data": "抱歉，我暂时无法处理您的请求，请稍后再试。"}
 
 # 便利函数
 def set_default_llm(llm_name):
-    """设置默认LLM"""
+    """
+    设置默认LLM，返回它当前的健康状态（见 get_available_llms）
+    熔断中的LLM也可以设为默认，恢复之前请求会先发给其它健康的LLM
+    """
     global DEFAULT_LLM
     if llm_name in LLM_CONFIGS:
         DEFAULT_LLM = llm_name
-        logging.info(f"默认LLM已设置为: {llm_name}")
+        health = get_breaker(llm_name).snapshot()
+        if health['state'] != 'closed':
+            logger.warning(f"默认LLM已设置为: {llm_name}，但它当前处于熔断状态 ({health['state']})")
+        else:
+            logger.info(f"默认LLM已设置为: {llm_name}")
+        return health
     else:
         raise ValueError(f"未知的LLM: {llm_name}")
 
 def get_available_llms():
-    """获取可用的LLM列表"""
-    return list(LLM_CONFIGS.keys())
+    """
+    获取LLM列表及实时健康状态
+    Returns:
+        list: [{"name", "model", "default", "state", "error_rate", "avg_latency", ...}, ...]
+              state 为 closed（正常）、open（熔断中）或 half_open（等待探测）
+    """
+    return [{
+        "name": name,
+        "model": config["model"],
+        "default": name == DEFAULT_LLM,
+        **get_breaker(name).snapshot(),
+    } for name, config in LLM_CONFIGS.items()]
     
 if __name__ == "__main__":
     # Example usage
@@ -289,6 +605,6 @@ if __name__ == "__main__":
     set_default_llm("qwen")
     print(chat_llm("user1", "你好"))
     
-    print(f"\n=== 可用的LLM: {get_available_llms()} ===")
+    print(f"\n=== 可用的LLM: {[llm['name'] for llm in get_available_llms()]} ===")
     
     # 因为涉及到Flask上下文， 涉及到数据库查询的只能通过api调用来测试
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""
+基于 asyncio 的 LLM 请求层，支持对冲请求（hedged request）
+
+所有异步请求都运行在一个常驻的后台事件循环中，这样 AsyncOpenAI 客户端和它的连接池
+可以在多个 Flask 请求线程之间复用。同步代码通过 complete() 提交请求并等待结果：
+
+    response, llm_name = complete(candidates, messages, hedge_delay=3.0)
+
+candidates 是按优先级排列的 [(llm_name, config, pool), ...]。首选 LLM 在 hedge_delay 秒内
+没有返回时，把同样的请求发给下一个 LLM，取先成功返回的结果，并取消另一个请求；
+首选 LLM 直接报错（包括被 app.core.ratelimit 限流）时立即切换，不再等待。
+每次请求的成败和耗时记入该 LLM 的熔断器（app.core.breaker）。
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DEFAULT_CONNECTION_LIMITS, Timeout
+
+from app.core.breaker import get_breaker
+from app.core.ratelimit import acquire_provider
+
+logger = logging.getLogger(__name__)
+
+Limits = type(DEFAULT_CONNECTION_LIMITS)
+
+_loop = None
+_loop_lock = threading.Lock()
+
+# 只在后台事件循环线程中访问：{llm_name: (连接参数, AsyncOpenAI客户端)}
+_async_clients = {}
+
+# 对冲统计
+HEDGE_STATS = {
+    'requests': 0,
+    'hedged': 0,       # 触发了对冲（向备用LLM发出第二个请求）的次数
+    'fallback_wins': 0,  # 备用LLM先返回的次数
+    'failures': 0,
+}
+
+
+def get_loop():
+    """获取（必要时启动）后台事件循环"""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='llm-async-loop', daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def get_async_client(llm_name, config, pool):
+    """获取LLM的异步客户端（只能在后台事件循环中调用）"""
+    signature = (config["base_url"], config["api_key"], tuple(sorted(pool.items())))
+    entry = _async_clients.get(llm_name)
+    if entry is None or entry[0] != signature:
+        http_client = DefaultAsyncHttpxClient(
+            limits=Limits(
+                max_connections=pool["max_connections"],
+                max_keepalive_connections=pool["max_keepalive_connections"],
+                keepalive_expiry=pool["keepalive_expiry"],
+            ),
+            timeout=Timeout(pool["timeout"], connect=pool["connect_timeout"]),
+        )
+        entry = (signature, AsyncOpenAI(
+            api_key=config["api_key"],
+            base_url=config["base_url"],
+            max_retries=pool["max_retries"],
+            http_client=http_client,
+        ))
+        _async_clients[llm_name] = entry
+    return entry[1]
+
+
+async def acomplete(llm_name, config, pool, messages, **kwargs):
+    """向单个LLM发起一次 chat.completions 请求，返回 (response, llm_name)；该LLM被限流时抛出 RateLimited"""
+    breaker = get_breaker(llm_name)
+    try:
+        acquire_provider(llm_name, config)
+    except Exception:
+        breaker.release()
+        raise
+    client = get_async_client(llm_name, config, pool)
+    started = time.perf_counter()
+    try:
+        response = await client.chat.completions.create(
+            model=config["model"],
+            messages=messages,
+            extra_body=config["extra_body"],
+            **kwargs
+        )
+    except asyncio.CancelledError:
+        # 对冲中落后被取消，不代表该LLM出错
+        breaker.release()
+        raise
+    except Exception:
+        breaker.record(False, time.perf_counter() - started)
+        raise
+    breaker.record(True, time.perf_counter() - started)
+    return response, llm_name
+
+
+async def hedged_complete(candidates, messages, hedge_delay=None, **kwargs):
+    """
+    按优先级向 candidates 发起请求，返回最先成功的 (response, llm_name)
+    :param candidates: [(llm_name, config, pool), ...]
+    :param hedge_delay: 等待首选LLM的时间（秒），超时后并发请求下一个；None 表示只在出错时切换
+    """
+    HEDGE_STATS['requests'] += 1
+    remaining = list(candidates)
+    pending = set()
+    timed_out = False
+    last_error = None
+
+    try:
+        while True:
+            # 发起下一个候选：第一次、等待首选超时、或者进行中的请求都已失败
+            if remaining and (not pending or timed_out):
+                name, config, pool = remaining.pop(0)
+                if pending:
+                    HEDGE_STATS['hedged'] += 1
+                    logger.info(f"LLM在 {hedge_delay}s 内未返回，对冲请求: {name}")
+                pending.add(asyncio.ensure_future(acomplete(name, config, pool, messages, **kwargs)))
+            if not pending:
+                break
+
+            # 还有候选时最多等待 hedge_delay，否则一直等到有请求结束
+            wait_timeout = hedge_delay if remaining and hedge_delay is not None else None
+            done, pending = await asyncio.wait(pending, timeout=wait_timeout, return_when=asyncio.FIRST_COMPLETED)
+            timed_out = not done
+
+            for task in done:
+                if task.exception() is None:
+                    response, name = task.result()
+                    if name != candidates[0][0]:
+                        HEDGE_STATS['fallback_wins'] += 1
+                    return response, name
+                last_error = task.exception()
+                logger.error(f"LLM请求失败: {last_error}")
+    finally:
+        # 取消落后的请求
+        for task in pending:
+            task.cancel()
+
+    HEDGE_STATS['failures'] += 1
+    raise last_error or RuntimeError("没有可用的LLM")
+
+
+def complete(candidates, messages, hedge_delay=None, timeout=None, **kwargs):
+    """
+    hedged_complete 的同步入口，可在 Flask 请求线程中调用
+    :param timeout: 整体等待时间（秒），超时后取消所有请求并抛出 TimeoutError
+    """
+    future = asyncio.run_coroutine_threadsafe(
+        hedged_complete(candidates, messages, hedge_delay=hedge_delay, **kwargs),
+        get_loop()
+    )
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        raise TimeoutError(f"LLM请求超过 {timeout}s 未返回")
@@ -0,0 +1,186 @@
+"""
+对话记忆
+
+chat_llm 在两个阶段的消息中带上最近的对话，使"把刚才那笔改成30"之类的追问可以直接引用上一轮的
+交易 id 等信息，不需要再调用 get_transactions 查找。
+
+- 每个用户的最近对话保存在进程内存中，第一次使用时用一条查询（ix_chat_username_date）
+  读取最近 HISTORY_LOAD_LIMIT 条 Chat 记录，之后每轮对话直接追加
+- 工具调用结果（截断后）也作为一轮对话保存，只在内存中，不写入 Chat 表
+- 按估算的 token 数限制窗口大小：超出 WINDOW_TOKEN_BUDGET 时，最早的一轮被压缩成一行摘要，
+  摘要超出 SUMMARY_TOKEN_BUDGET 时丢弃最早的摘要行。每次只处理被挤出的那一轮，不会重新生成整段摘要
+
+多进程部署时各进程分别缓存，超过 ENTRY_TTL 秒未使用的记忆会从数据库重新读取。
+"""
+import json
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+from app import db
+
+# 放入上下文的最近对话（含工具结果）的 token 上限
+WINDOW_TOKEN_BUDGET = 1200
+# 更早对话的摘要的 token 上限
+SUMMARY_TOKEN_BUDGET = 300
+# 第一次使用时从 Chat 表读取的记录数
+HISTORY_LOAD_LIMIT = 20
+# 单条工具结果保留的字符数
+TOOL_RESULT_CHARS = 600
+# 摘要中每一轮保留的字符数
+SUMMARY_LINE_CHARS = 60
+# 最多缓存的用户数，超出后淘汰最久未使用的
+MAX_USERS = 1000
+# 记忆的有效期（秒）
+ENTRY_TTL = 1800
+
+ROLE_LABELS = {'user': '用户', 'assistant': '助手', 'tool': '工具'}
+
+_CJK = re.compile(r'[\u3000-\u303f\u3400-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数：中文字符和全角标点约 1 个 token，其余字符约 4 个一个 token"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def format_tool_turn(tool_name, args, result):
+    """把一次工具调用压缩成一轮对话的文本"""
+    text = json.dumps({"tool": tool_name, "args": args or {}, "result": result}, ensure_ascii=False, default=str)
+    if len(text) > TOOL_RESULT_CHARS:
+        text = text[:TOOL_RESULT_CHARS] + '…'
+    return text
+
+
+class Conversation:
+    """一个用户的记忆：最近的对话轮次和更早对话的摘要行"""
+
+    def __init__(self):
+        self.turns = deque()      # (role, content, tokens)
+        self.summary = deque()    # (line, tokens)
+        self.tokens = 0
+        self.summary_tokens = 0
+        self.used_at = time.monotonic()
+
+    def append(self, role, content):
+        """追加一轮，返回因此被压缩进摘要的轮数"""
+        tokens = estimate_tokens(content)
+        self.turns.append((role, content, tokens))
+        self.tokens += tokens
+        folded = 0
+        # 至少保留最新的一轮，即使它本身超出预算
+        while self.tokens > WINDOW_TOKEN_BUDGET and len(self.turns) > 1:
+            old_role, old_content, old_tokens = self.turns.popleft()
+            self.tokens -= old_tokens
+            self._summarize(old_role, old_content)
+            folded += 1
+        return folded
+
+    def _summarize(self, role, content):
+        text = ' '.join(content.split())
+        if len(text) > SUMMARY_LINE_CHARS:
+            text = text[:SUMMARY_LINE_CHARS] + '…'
+        line = f"{ROLE_LABELS[role]}: {text}"
+        tokens = estimate_tokens(line)
+        self.summary.append((line, tokens))
+        self.summary_tokens += tokens
+        while self.summary_tokens > SUMMARY_TOKEN_BUDGET and self.summary:
+            self.summary_tokens -= self.summary.popleft()[1]
+
+    def messages(self):
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": "更早的对话摘要：\n" +
+                             '\n'.join(line for line, _ in self.summary)})
+        for role, content, _ in self.turns:
+            if role == 'tool':
+                messages.append({"role": "assistant", "content": "工具调用结果：" + content})
+            else:
+                messages.append({"role": role, "content": content})
+        return messages
+
+
+class ConversationMemory:
+    def __init__(self, max_users=MAX_USERS, ttl=ENTRY_TTL):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.folded = 0
+
+    def _load(self, username):
+        """用一条查询读取最近的聊天记录；调用方可能已把本轮的用户消息加入 session，不能自动 flush"""
+        from app.models import Chat
+        with db.session.no_autoflush:
+            rows = db.session.execute(
+                db.select(Chat.type, Chat.content)
+                .where(Chat.username == username)
+                .order_by(Chat.date.desc(), Chat.id.desc())
+                .limit(HISTORY_LOAD_LIMIT)
+            ).all()
+        conversation = Conversation()
+        for chat_type, content in reversed(rows):
+            conversation.append('user' if chat_type == 1 else 'assistant', content)
+        return conversation
+
+    def _get(self, username):
+        key = str(username)
+        with self._lock:
+            conversation = self._users.get(key)
+            if conversation is not None and time.monotonic() - conversation.used_at <= self.ttl:
+                conversation.used_at = time.monotonic()
+                self._users.move_to_end(key)
+                self.hits += 1
+                return conversation
+
+        conversation = self._load(username)
+        with self._lock:
+            self.loads += 1
+            self._users[key] = conversation
+            self._users.move_to_end(key)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return conversation
+
+    def window(self, username):
+        """放入 LLM 消息的最近对话：[{"role", "content"}, ...]，按时间顺序"""
+        conversation = self._get(username)
+        with self._lock:
+            return conversation.messages()
+
+    def record(self, username, message, reply, tool_name=None, args=None, result=None):
+        """一轮对话结束后追加用户消息、工具结果和回复"""
+        conversation = self._get(username)
+        with self._lock:
+            folded = conversation.append('user', message)
+            if tool_name:
+                folded += conversation.append('tool', format_tool_turn(tool_name, args, result))
+            folded += conversation.append('assistant', reply)
+            self.folded += folded
+
+    def invalidate(self, username):
+        with self._lock:
+            self._users.pop(str(username), None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'loads': self.loads,
+                'folded_turns': self.folded,
+                'users': len(self._users),
+                'window_tokens': sum(c.tokens + c.summary_tokens for c in self._users.values()),
+            }
+
+
+conversation_memory = ConversationMemory()
@@ -0,0 +1,126 @@
+"""
+LLM 请求限流
+
+- 每个用户：令牌桶限制聊天消息的频率（USER_RATE_LIMIT），并按 llm_usage 表限制每天的 token 用量
+  （USER_DAILY_TOKEN_BUDGET）。超出时聊天接口直接返回 429 和 Retry-After，不再请求上游 LLM
+- 每个 LLM：令牌桶限制发往该 LLM 的请求数（含对冲和备用请求），默认 PROVIDER_RATE_LIMIT，
+  LLM_CONFIGS 中的条目可以用 "rate_limit" 字段覆盖。某个 LLM 被限流时立即切换到下一个候选，
+  所有候选都被限流时抛出 RateLimited
+
+令牌桶保存在进程内存中，gunicorn 多 worker 部署时每个 worker 分别限流；每天的 token 用量保存在数据库中，全局生效。
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+# 每个用户的聊天消息：最多连续 capacity 条，之后每秒恢复 per_second 条
+USER_RATE_LIMIT = {"capacity": 20, "per_second": 0.5}
+# 每个 LLM 的请求数（每个进程）
+PROVIDER_RATE_LIMIT = {"capacity": 60, "per_second": 2.0}
+# 每个用户每天的 token 上限，None 表示不限制
+USER_DAILY_TOKEN_BUDGET = 200000
+# 最多保存令牌桶的用户数，超出后淘汰最久未使用的（被淘汰的用户相当于桶已满）
+MAX_USERS = 10000
+
+RATE_LIMIT_STATS = {
+    'user': 0,       # 用户消息频率超限
+    'quota': 0,      # 用户当天 token 用量超限
+    'provider': 0,   # 某个 LLM 的请求数超限（会切换到下一个候选）
+}
+
+
+class RateLimited(Exception):
+    """请求被限流，retry_after 为建议的重试等待秒数"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, capacity, per_second, clock=time.monotonic):
+        self.capacity = capacity
+        self.per_second = per_second
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+
+    def acquire(self, amount=1):
+        """取出 amount 个令牌，成功返回 0，否则返回还需要等待的秒数（不取出）"""
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_second)
+        self.updated = now
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0
+        if self.per_second <= 0:
+            return float('inf')
+        return (amount - self.tokens) / self.per_second
+
+
+class BucketGroup:
+    """按键保存的一组令牌桶，限流参数变化时重新创建该键的桶"""
+
+    def __init__(self, max_keys=None):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key, limits, amount=1):
+        signature = (limits["capacity"], limits["per_second"])
+        with self._lock:
+            entry = self._buckets.get(key)
+            if entry is None or entry[0] != signature:
+                entry = (signature, TokenBucket(*signature))
+                self._buckets[key] = entry
+            self._buckets.move_to_end(key)
+            if self.max_keys is not None:
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            return entry[1].acquire(amount)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+user_buckets = BucketGroup(MAX_USERS)
+provider_buckets = BucketGroup()
+
+
+def _seconds_until_tomorrow():
+    now = datetime.utcnow()
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (tomorrow - now).total_seconds()
+
+
+def check_user(username):
+    """
+    聊天接口收到消息时调用（需要在 app context 中），超限时抛出 RateLimited
+    先检查进程内的令牌桶，通过后再查询当天的 token 用量
+    """
+    retry_after = user_buckets.acquire(str(username), USER_RATE_LIMIT)
+    if retry_after:
+        RATE_LIMIT_STATS['user'] += 1
+        raise RateLimited("请求过于频繁，请稍后再试", retry_after)
+
+    if USER_DAILY_TOKEN_BUDGET is not None:
+        from app.core.usage import daily_tokens
+        if daily_tokens(username) >= USER_DAILY_TOKEN_BUDGET:
+            RATE_LIMIT_STATS['quota'] += 1
+            raise RateLimited("今天的对话用量已达上限，请明天再试", _seconds_until_tomorrow())
+
+
+def acquire_provider(llm_name, config):
+    """向某个 LLM 发出请求前调用，超限时抛出 RateLimited"""
+    limits = dict(PROVIDER_RATE_LIMIT)
+    limits.update(config.get("rate_limit", {}))
+    retry_after = provider_buckets.acquire(llm_name, limits)
+    if retry_after:
+        RATE_LIMIT_STATS['provider'] += 1
+        raise RateLimited(f"LLM {llm_name} 请求过多", retry_after)
+
+
+def get_rate_limit_stats():
+    return dict(RATE_LIMIT_STATS)
@@ -0,0 +1,162 @@
+"""
+报表统计引擎
+
+所有聚合都在数据库中用 GROUP BY 完成：先按 (分类, 日期) 汇总出每天每个分类的金额，
+再在内存中把这份很小的日汇总合并成按天 / 周 / 月的时间序列。无论时间范围内有多少条交易，
+都不会把 Transaction 逐条加载成 ORM 对象。
+分组使用 category_id，分类名称从进程内的分类字典（app.core.categories）中取，不需要再查询或 JOIN category 表。
+"""
+from datetime import date, datetime, timedelta
+
+from app import db
+from app.models import Transaction
+from app.core.categories import category_name
+
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def to_date(value):
+    """func.date() 在 SQLite 中返回字符串，在 MySQL 中返回 date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def bucket_start(day, granularity):
+    """day 所在统计周期的第一天；周从星期一开始"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day, granularity):
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    if granularity == 'month':
+        return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+    return day + timedelta(days=1)
+
+
+def _base_filter(query, username, trans_type, start, end):
+    query = query.filter(
+        Transaction.username == username,
+        Transaction.type == trans_type,
+        Transaction.date >= start
+    )
+    if end is not None:
+        query = query.filter(Transaction.date < end)
+    return query
+
+
+def _label(category_id, category):
+    """分类名称：按 category_id 从分类字典中取，分类不存在或已删除时使用交易上保存的名称"""
+    return category_name(category_id, category)
+
+
+def category_totals(username, start, end, trans_type='expense'):
+    """时间范围内每个分类的金额和笔数：{分类: (金额, 笔数)}；end 为 None 时不限结束时间"""
+    rows = _base_filter(
+        db.session.query(Transaction.category_id, Transaction.category,
+                         db.func.sum(Transaction.amount), db.func.count(Transaction.id)),
+        username, trans_type, start, end
+    ).group_by(Transaction.category_id, Transaction.category).all()
+    totals = {}
+    for category_id, category, amount, count in rows:
+        label = _label(category_id, category)
+        amount_sum, count_sum = totals.get(label, (0, 0))
+        totals[label] = (amount_sum + (amount or 0), count_sum + count)
+    return totals
+
+
+def daily_totals(username, start, end, trans_type='expense'):
+    """时间范围内按 (分类, 日期) 汇总的金额：[(分类, date, 金额, 笔数), ...]"""
+    day = db.func.date(Transaction.date)
+    rows = _base_filter(
+        db.session.query(Transaction.category_id, Transaction.category, day,
+                         db.func.sum(Transaction.amount), db.func.count(Transaction.id)),
+        username, trans_type, start, end
+    ).group_by(Transaction.category_id, Transaction.category, day).all()
+    return [(_label(category_id, category), to_date(value), amount or 0, count)
+            for category_id, category, value, amount, count in rows]
+
+
+def build_series(daily, start, end, granularity):
+    """把日汇总合并成连续的时间序列，没有交易的周期金额为 0"""
+    buckets = {}
+    for category, day, amount, count in daily:
+        bucket = buckets.setdefault(bucket_start(day, granularity), {'total': 0, 'count': 0, 'categories': {}})
+        bucket['total'] += amount
+        bucket['count'] += count
+        bucket['categories'][category] = bucket['categories'].get(category, 0) + amount
+
+    series = []
+    current = bucket_start(start.date() if isinstance(start, datetime) else start, granularity)
+    last = (end - timedelta(microseconds=1)).date() if isinstance(end, datetime) else end - timedelta(days=1)
+    while current <= last:
+        bucket = buckets.get(current, {'total': 0, 'count': 0, 'categories': {}})
+        series.append({
+            "period": current.isoformat(),
+            "total": round(bucket['total'], 2),
+            "count": bucket['count'],
+            "categories": {name: round(amount, 2) for name, amount in bucket['categories'].items()},
+        })
+        current = next_bucket(current, granularity)
+    return series
+
+
+def build_report(username, start, end, granularity=None, trans_type='expense', compare=False):
+    """
+    生成 [start, end) 时间范围内的分类统计
+    :param granularity: None 只统计分类；'day' / 'week' / 'month' 额外返回时间序列
+    :param compare: 为 True 时与紧挨着的上一个等长周期做对比
+    """
+    if granularity is not None and granularity not in GRANULARITIES:
+        raise ValueError(f"Invalid granularity: {granularity}")
+    if end <= start:
+        raise ValueError("end 必须晚于 start")
+
+    if granularity is None:
+        totals = category_totals(username, start, end, trans_type)
+    else:
+        daily = daily_totals(username, start, end, trans_type)
+        totals = {}
+        for category, _, amount, count in daily:
+            amount_sum, count_sum = totals.get(category, (0, 0))
+            totals[category] = (amount_sum + amount, count_sum + count)
+
+    report = {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "type": trans_type,
+        "total": round(sum(amount for amount, _ in totals.values()), 2),
+        "count": sum(count for _, count in totals.values()),
+        "categories": [{"name": name, "amount": round(amount, 2), "count": count}
+                       for name, (amount, count) in sorted(totals.items(), key=lambda item: item[1][0])],
+    }
+    if granularity is not None:
+        report["granularity"] = granularity
+        report["series"] = build_series(daily, start, end, granularity)
+
+    if compare:
+        previous_start = start - (end - start)
+        previous = category_totals(username, previous_start, start, trans_type)
+        previous_total = sum(amount for amount, _ in previous.values())
+        names = sorted(set(totals) | set(previous))
+        report["comparison"] = {
+            "start": previous_start.isoformat(),
+            "end": start.isoformat(),
+            "total": round(previous_total, 2),
+            "change": round(report["total"] - previous_total, 2),
+            "change_rate": round((report["total"] - previous_total) / abs(previous_total), 4) if previous_total else None,
+            "categories": [{
+                "name": name,
+                "amount": round(totals.get(name, (0, 0))[0], 2),
+                "previous": round(previous.get(name, (0, 0))[0], 2),
+                "change": round(totals.get(name, (0, 0))[0] - previous.get(name, (0, 0))[0], 2),
+            } for name in names],
+        }
+    return report
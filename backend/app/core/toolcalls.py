@@ -0,0 +1,145 @@
+"""
+一轮对话中的多个工具调用
+
+第一阶段 LLM 可以一次返回多个工具调用，例如"记一笔午饭25和打车30，再告诉我本月总支出"：
+
+    {"tool_calls": [{"name": "create_transaction", "args": {...}},
+                    {"name": "create_transaction", "args": {...}},
+                    {"name": "get_summary", "args": {"username": "1"}}]}
+
+- 写入工具按返回的顺序在同一个数据库事务中执行（functions.write_batch），
+  任何一个失败都会整体回滚，不会只记下其中几笔
+- 写入提交后再执行只读工具，因此能读到本轮刚写入的数据；有多个只读工具时在线程池中并发执行，
+  每个线程推入自己的应用上下文，使用独立的数据库会话
+- 结果按调用顺序返回，由调用方一起交给第二阶段 LLM
+"""
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+import app.core.functions as F
+from app.metrics import timed_tool
+
+logger = logging.getLogger(__name__)
+
+# 不写数据库的工具，可以并发执行；其余工具（包括会补写预算周期的 get_budgets）按写入处理
+READ_ONLY_TOOLS = {'get_current_datetime', 'add', 'get_summary', 'get_transactions', 'list_transactions',
+                   'get_categories', 'get_reports', 'get_report_series'}
+# 一轮最多执行的工具调用数，多出的忽略
+MAX_TOOL_CALLS = 8
+# 并发执行只读工具的线程数
+TOOL_WORKERS = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """获取（必要时创建）执行只读工具的线程池"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix='tool')
+    return _executor
+
+
+def parse_tool_calls(response):
+    """
+    从第一阶段的 JSON 响应中取出工具调用
+    兼容只有一个工具的旧格式：{"tool_names": "工具名", "args_list": {"工具名": {...}}}
+    :return: [(工具名, 参数字典), ...]
+    """
+    calls = response.get("tool_calls")
+    if isinstance(calls, list):
+        parsed = [(call.get("name"), call.get("args") or {}) for call in calls if isinstance(call, dict)]
+    else:
+        names = response.get("tool_names") or []
+        args_list = response.get("args_list") or {}
+        if isinstance(names, str):
+            names = [names]
+        parsed = [(name, args_list.get(name) or {}) for name in names]
+    parsed = [(name, args) for name, args in parsed if name]
+    if len(parsed) > MAX_TOOL_CALLS:
+        logger.warning("工具调用过多，只执行前几个", extra={"tool_calls": len(parsed), "limit": MAX_TOOL_CALLS})
+    return parsed[:MAX_TOOL_CALLS]
+
+
+def _call(functions, name, args):
+    """执行一个工具，异常时返回带 error 的结果，不向外抛出"""
+    function = functions.get(name)
+    if function is None:
+        return {"tool_name": name, "args": args, "result": None}
+    try:
+        with timed_tool(name):
+            result = function(**args)
+    except Exception as e:
+        logger.error(f"函数调用失败: {name}, 参数: {args}, 错误: {str(e)}")
+        return {"tool_name": name, "args": args, "result": None, "error": str(e)}
+    return {"tool_name": name, "args": args, "result": result}
+
+
+def _call_in_app_context(app, functions, name, args):
+    with app.app_context():
+        return _call(functions, name, args)
+
+
+def failed(call):
+    """工具调用是否失败：抛出异常，或返回了 success 为 False 的结果"""
+    result = call['result']
+    return 'error' in call or (isinstance(result, dict) and result.get('success') is False)
+
+
+def run_writes(functions, calls):
+    """按顺序在一个事务中执行写入工具，任何一个失败时整体回滚，之后的写入不再执行"""
+    results = []
+    with F.write_batch() as batch:
+        for name, args in calls:
+            call = _call(functions, name, args)
+            results.append(call)
+            if failed(call):
+                batch['rollback'] = True
+                break
+    if batch['committed']:
+        return results
+
+    # 已执行的写入随事务一起回滚，结果中如实告诉第二阶段 LLM
+    reason = "同一轮的写入操作有失败，已全部撤销" if batch['rollback'] else "保存失败，已全部撤销"
+    for call in results:
+        if not failed(call):
+            call['result'] = {"success": False, "error": reason}
+    for name, args in calls[len(results):]:
+        results.append({"tool_name": name, "args": args, "result": {"success": False, "error": reason}})
+    return results
+
+
+def run_reads(functions, calls):
+    """执行只读工具，多于一个时在线程池中并发执行"""
+    if len(calls) <= 1:
+        return [_call(functions, name, args) for name, args in calls]
+    app = current_app._get_current_object()
+    executor = get_executor()
+    # 每个任务复制一份 contextvars，使 SQL 统计和 capture_queries() 也能记录线程中的查询
+    futures = [executor.submit(contextvars.copy_context().run, _call_in_app_context, app, functions, name, args)
+               for name, args in calls]
+    return [future.result() for future in futures]
+
+
+def run_tool_calls(functions, calls):
+    """
+    执行一轮中的所有工具调用：先写入（一个事务），再并发读取
+    :param calls: parse_tool_calls() 的结果
+    :return: 按调用顺序排列的 [{"tool_name", "args", "result"}, ...]，抛出异常的调用另有 "error"
+    """
+    writes = [(i, call) for i, call in enumerate(calls) if call[0] not in READ_ONLY_TOOLS]
+    reads = [(i, call) for i, call in enumerate(calls) if call[0] in READ_ONLY_TOOLS]
+    results = [None] * len(calls)
+    if writes:
+        for (i, _), call in zip(writes, run_writes(functions, [call for _, call in writes])):
+            results[i] = call
+    for (i, _), call in zip(reads, run_reads(functions, [call for _, call in reads])):
+        results[i] = call
+    return results
@@ -0,0 +1,101 @@
+"""
+LLM 用量统计
+
+每次 chat.completions 返回的 usage（prompt_tokens / completion_tokens）按 (用户, 日期, LLM) 累加到 llm_usage 表，
+GET /api/usage 查询最近几天的用量，app.core.ratelimit 据此限制每个用户每天的 token 数。
+日期按 UTC 划分，与交易和预算周期使用同一个时钟。
+
+    with collect_usage() as usages:
+        ...                              # complete_chat() / 流式回复把 (llm_name, usage) 加入 usages
+    record_usage(username, usages)       # 不提交，由调用方和聊天记录一起提交
+"""
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import LlmUsage
+
+# collect_usage() 正在收集的 [(llm_name, prompt_tokens, completion_tokens), ...]
+_collector = contextvars.ContextVar('llm_usage', default=None)
+
+
+@contextmanager
+def collect_usage():
+    """收集 with 块中当前上下文发出的 LLM 请求的用量"""
+    usages = []
+    token = _collector.set(usages)
+    try:
+        yield usages
+    finally:
+        _collector.reset(token)
+
+
+def add_usage(llm_name, prompt_tokens, completion_tokens):
+    """记录一次 LLM 请求的用量，不在 collect_usage() 中时忽略"""
+    usages = _collector.get()
+    if usages is not None:
+        usages.append((llm_name, prompt_tokens or 0, completion_tokens or 0))
+
+
+def add_response_usage(llm_name, response):
+    """记录一个 chat.completions 响应中的 usage，响应中没有 usage 时只计请求数"""
+    usage = getattr(response, 'usage', None)
+    add_usage(llm_name, getattr(usage, 'prompt_tokens', 0), getattr(usage, 'completion_tokens', 0))
+
+
+def record_usage(username, usages, day=None):
+    """
+    把收集到的用量累加到 llm_usage（不提交）
+    每个 LLM 执行一条 requests = requests + :n 的增量 UPDATE，当天还没有记录时先插入
+    """
+    day = day or datetime.utcnow().date()
+    totals = {}
+    for llm_name, prompt_tokens, completion_tokens in usages:
+        requests, prompt, completion = totals.get(llm_name, (0, 0, 0))
+        totals[llm_name] = (requests + 1, prompt + prompt_tokens, completion + completion_tokens)
+
+    table = LlmUsage.__table__
+    conn = db.session.connection()
+    for llm_name, (requests, prompt, completion) in totals.items():
+        key = dict(username=username, day=day, llm=llm_name)
+        increment = (db.update(table)
+                     .where(*(table.c[name] == value for name, value in key.items()))
+                     .values(requests=table.c.requests + requests,
+                             prompt_tokens=table.c.prompt_tokens + prompt,
+                             completion_tokens=table.c.completion_tokens + completion))
+        if conn.execute(increment).rowcount:
+            continue
+        # 当天第一次使用该 LLM：插入一行，并发插入时由唯一约束忽略，再按增量更新
+        insert = (db.insert(table)
+                  .prefix_with('OR IGNORE', dialect='sqlite')
+                  .prefix_with('IGNORE', dialect='mysql')
+                  .values(**key, requests=requests, prompt_tokens=prompt, completion_tokens=completion))
+        if not conn.execute(insert).rowcount:
+            conn.execute(increment)
+
+
+def daily_tokens(username, day=None):
+    """用户当天在所有 LLM 上用掉的 token 数"""
+    day = day or datetime.utcnow().date()
+    return db.session.execute(
+        db.select(db.func.coalesce(db.func.sum(LlmUsage.prompt_tokens + LlmUsage.completion_tokens), 0))
+        .where(LlmUsage.username == username, LlmUsage.day == day)
+    ).scalar()
+
+
+def get_usage(username, days=7):
+    """最近 days 天（含今天）的用量，按日期倒序：[{"day", "llm", "requests", "prompt_tokens", "completion_tokens"}, ...]"""
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    rows = db.session.execute(
+        db.select(LlmUsage.day, LlmUsage.llm, LlmUsage.requests, LlmUsage.prompt_tokens, LlmUsage.completion_tokens)
+        .where(LlmUsage.username == username, LlmUsage.day >= since)
+        .order_by(LlmUsage.day.desc(), LlmUsage.llm)
+    ).all()
+    return [{
+        "day": day.isoformat(),
+        "llm": llm_name,
+        "requests": requests,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+    } for day, llm_name, requests, prompt_tokens, completion_tokens in rows]
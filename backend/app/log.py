@@ -0,0 +1,141 @@
+"""
+日志配置
+
+- 每条日志输出为一行 JSON：{"time", "level", "logger", "message", ...extra 中的字段}
+- 各模块的级别单独配置，例如 LOG_LEVELS="app.api.routes=DEBUG,app.core.llm=WARNING"
+- DEBUG 日志按模块采样，例如 LOG_SAMPLE_RATES="app.api.routes=0.01" 只保留 1%
+- 日志先放入内存队列，由后台线程写出，请求线程不会阻塞在 I/O 上
+
+模块中使用 logging.getLogger(__name__)，需要逐条输出数据时先判断 logger.isEnabledFor(logging.DEBUG)。
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+# LogRecord 自带的属性，其余属性视为 extra 字段
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+# 启动 _listener 的进程：gunicorn 的 master 在 on_starting 中创建过应用，fork 出的 worker
+# 继承了 _listener，但后台线程不会跟着 fork，worker 需要重新启动自己的
+_listener_pid = None
+
+
+def parse_mapping(value, convert=str):
+    """把 "a=1,b=2" 或 dict 转成 dict"""
+    if isinstance(value, dict):
+        return {name: convert(v) for name, v in value.items()}
+    mapping = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            name, v = item.split('=', 1)
+            mapping[name.strip()] = convert(v.strip())
+    return mapping
+
+
+def _lookup(mapping, name, default):
+    """按最长前缀查找模块的配置：app.core.functions 依次匹配 app.core.functions、app.core、app"""
+    while name:
+        if name in mapping:
+            return mapping[name]
+        name = name.rpartition('.')[0]
+    return default
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        if record.stack_info:
+            entry["stack_info"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler.prepare 会把异常堆栈拼进 message 并清空 exc_info，JSON 中就没有单独的 exc_info 字段。
+    这里只合并消息参数，堆栈在入队前格式化成文本放在 exc_text 中（traceback 对象不进入队列），
+    由输出端的 formatter 决定怎样输出
+    """
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """按模块对 DEBUG 日志采样，INFO 及以上不受影响"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or not self.rates:
+            return True
+        rate = _lookup(self.rates, record.name, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+def setup_logging(config):
+    """
+    根据配置初始化日志，每个进程只生效一次（fork 出的子进程会重新初始化）
+    :param config: Flask 的 app.config，读取 LOG_LEVEL / LOG_LEVELS / LOG_SAMPLE_RATES / LOG_FORMAT
+    """
+    global _listener, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        return
+    first = _listener is None
+
+    output = logging.StreamHandler(sys.stderr)
+    if config.get('LOG_FORMAT', 'json') == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    handler = StructuredQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(parse_mapping(config.get('LOG_SAMPLE_RATES'), float)))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(config.get('LOG_LEVEL', 'INFO'))
+    for name, level in parse_mapping(config.get('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener_pid = os.getpid()
+    _listener.start()
+    if first:
+        atexit.register(_stop_listener)
+
+
+def _stop_listener():
+    """退出时写完队列中剩余的日志，只停止本进程启动的 _listener"""
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
@@ -0,0 +1,279 @@
+"""
+请求耗时与 SQL 统计，以 Prometheus 文本格式从 /api/metrics 输出
+
+- app_request_duration_seconds{method, route, status}   api 蓝图每个路由的耗时
+- app_stage_duration_seconds{stage}                     call_llm / chat_llm / 第一、二阶段 LLM / 保存聊天记录等阶段
+- app_tool_duration_seconds{tool}                       每个工具函数的耗时
+- app_request_sql_queries{route}                        每个请求执行的 SQL 语句数
+- app_request_sql_duration_seconds{route}               每个请求的 SQL 总耗时
+- app_sql_query_duration_seconds{statement}             每条 SQL 的耗时（按 SELECT / INSERT / UPDATE / DELETE 分类）
+
+统计保存在进程内存中，gunicorn 多 worker 部署时每个 worker 分别统计，输出中带有 pid 标签的 app_process_info 便于区分。
+
+    from app.metrics import timed
+    with timed('llm_first_stage'):
+        ...
+
+测试中可以用 capture_queries() 记录一段代码执行的每条 SQL，检查语句数、重复语句（N+1）和慢查询：
+
+    with capture_queries() as queries:
+        client.get('/api/summary')
+    assert queries.count <= 2, queries.report()
+"""
+import contextvars
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 秒级耗时的默认分桶，覆盖几毫秒的 SQL 到几十秒的 LLM 调用
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_registry = []
+_collectors = []
+
+# 当前请求的 SQL 统计：[语句数, 总耗时]，不在 api 请求中时为 None
+_request_sql = contextvars.ContextVar('request_sql', default=None)
+# capture_queries() 正在记录的 QueryLog
+_query_log = contextvars.ContextVar('query_log', default=None)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}  # 标签值 -> [各分桶计数..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = [(key, list(series)) for key, series in sorted(self._series.items())]
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {series[-2]!r}')
+            lines.append(f'{self.name}_count{labels} {series[-1]}')
+        return lines
+
+
+REQUEST_DURATION = Histogram('app_request_duration_seconds', "api 蓝图请求耗时", ('method', 'route', 'status'))
+STAGE_DURATION = Histogram('app_stage_duration_seconds', "聊天请求各阶段耗时", ('stage',))
+TOOL_DURATION = Histogram('app_tool_duration_seconds', "工具函数耗时", ('tool',))
+REQUEST_SQL_QUERIES = Histogram('app_request_sql_queries', "每个请求执行的 SQL 语句数", ('route',), COUNT_BUCKETS)
+REQUEST_SQL_DURATION = Histogram('app_request_sql_duration_seconds', "每个请求的 SQL 总耗时", ('route',))
+SQL_QUERY_DURATION = Histogram('app_sql_query_duration_seconds', "单条 SQL 耗时", ('statement',))
+
+
+@contextmanager
+def timed(stage):
+    """统计一个阶段的耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=stage)
+
+
+@contextmanager
+def timed_tool(tool):
+    """统计一次工具调用的耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        TOOL_DURATION.observe(time.perf_counter() - start, tool=tool)
+
+
+def register_collector(func):
+    """
+    注册额外的统计输出，func() 返回 [(指标名, 类型, 说明, {标签: 值}, 数值), ...]
+    用于把 prompt / 对冲 / 意图缓存 / 快速记账等已有统计一起输出
+    """
+    _collectors.append(func)
+    return func
+
+
+def _statement_type(statement):
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+    return verb if verb in ('SELECT', 'INSERT', 'UPDATE', 'DELETE') else 'OTHER'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    SQL_QUERY_DURATION.observe(elapsed, statement=_statement_type(statement))
+    stats = _request_sql.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += elapsed
+    log = _query_log.get()
+    if log is not None:
+        log.statements.append((statement, elapsed))
+
+
+_sql_events_installed = False
+
+
+def install_sql_events():
+    """监听所有 Engine 的语句执行，只需安装一次"""
+    global _sql_events_installed
+    if _sql_events_installed:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    _sql_events_installed = True
+
+
+_WHITESPACE = re.compile(r'\s+')
+# 只统计真正访问数据的语句，事务控制、PRAGMA 等不计入
+_COUNTED = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+
+class QueryLog:
+    """capture_queries() 记录到的 SQL：[(语句, 耗时秒), ...]"""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def queries(self):
+        return [(statement, elapsed) for statement, elapsed in self.statements
+                if _statement_type(statement) in _COUNTED]
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_seconds(self):
+        return sum(elapsed for _, elapsed in self.queries)
+
+    def repeated(self, min_count=3):
+        """执行了至少 min_count 次的同一条语句（参数不同），通常意味着循环中逐条查询（N+1）"""
+        counts = {}
+        for statement, _ in self.queries:
+            key = _WHITESPACE.sub(' ', statement).strip()
+            counts[key] = counts.get(key, 0) + 1
+        return {statement: n for statement, n in counts.items() if n >= min_count}
+
+    def slow(self, threshold):
+        """耗时超过 threshold 秒的语句"""
+        return [(statement, elapsed) for statement, elapsed in self.queries if elapsed > threshold]
+
+    def report(self):
+        lines = [f"{self.count} 条 SQL，共 {self.total_seconds * 1000:.2f} ms"]
+        for statement, elapsed in self.queries:
+            lines.append(f"  {elapsed * 1000:8.2f} ms  {_WHITESPACE.sub(' ', statement).strip()[:160]}")
+        return '\n'.join(lines)
+
+
+@contextmanager
+def capture_queries():
+    """记录 with 块中当前上下文执行的每条 SQL"""
+    install_sql_events()
+    log = QueryLog()
+    token = _query_log.set(log)
+    try:
+        yield log
+    finally:
+        _query_log.reset(token)
+
+
+def current_sql_stats():
+    """当前请求到目前为止的 (SQL 语句数, 总耗时)，不在 api 请求中时返回 None"""
+    stats = _request_sql.get()
+    return tuple(stats) if stats is not None else None
+
+
+def instrument_blueprint(bp):
+    """为蓝图的每个请求统计耗时和 SQL"""
+
+    @bp.before_request
+    def _start_timer():
+        request.environ['app.metrics.start'] = time.perf_counter()
+        request.environ['app.metrics.sql_token'] = _request_sql.set([0, 0.0])
+
+    @bp.after_request
+    def _observe(response):
+        start = request.environ.pop('app.metrics.start', None)
+        if start is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unknown'
+        REQUEST_DURATION.observe(time.perf_counter() - start, method=request.method,
+                                 route=route, status=response.status_code)
+        stats = _request_sql.get()
+        if stats is not None:
+            REQUEST_SQL_QUERIES.observe(stats[0], route=route)
+            REQUEST_SQL_DURATION.observe(stats[1], route=route)
+        return response
+
+    @bp.teardown_request
+    def _reset(exc):
+        token = request.environ.pop('app.metrics.sql_token', None)
+        if token is not None:
+            try:
+                _request_sql.reset(token)
+            except ValueError:
+                # 流式响应在另一个上下文中结束，直接清空
+                _request_sql.set(None)
+
+    install_sql_events()
+
+
+def render_metrics():
+    """输出 Prometheus 文本格式"""
+    lines = ['# HELP app_process_info 输出统计的进程', '# TYPE app_process_info gauge',
+             f'app_process_info{{pid="{os.getpid()}"}} 1']
+    for histogram in _registry:
+        lines.extend(histogram.render())
+    for collect in _collectors:
+        declared = set()
+        for name, kind, documentation, labels, value in collect():
+            if name not in declared:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                declared.add(name)
+            lines.append(f'{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
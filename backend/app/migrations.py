@@ -0,0 +1,283 @@
+"""
+数据库结构的版本化迁移
+
+每个迁移用 @migration(版本号, 说明) 注册，按版本号顺序执行，
+已执行的版本记录在 schema_version 表中。新增表或索引时只需追加一个新的迁移，
+不要修改已经发布的迁移。
+
+    from app.migrations import upgrade
+    upgrade()          # 执行所有未执行的迁移（需要在 app context 中调用）
+"""
+import logging
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+schema_version = db.Table(
+    'schema_version',
+    db.MetaData(),
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String(200), nullable=False),
+    db.Column('applied_at', db.DateTime, server_default=db.func.now()),
+)
+
+
+def migration(version, description):
+    """注册一个迁移函数，函数接收一个已开启事务的 Connection"""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+
+def _create(conn, *items):
+    """创建表或索引，已存在时跳过（兼容迁移出现之前由 db.create_all() 建好的表）"""
+    for item in items:
+        item.create(bind=conn, checkfirst=True)
+
+
+# 每个迁移只使用自己定义的表结构（执行该迁移时的列和索引），不引用 app.models：
+# 模型之后新增的列或索引由后面的迁移添加，旧的迁移在任何数据库上执行的结果都不变
+
+
+@migration(1, "基础表：transaction, budget, category, chat, monthly_summary")
+def _initial_tables(conn):
+    metadata = db.MetaData()
+    _create(
+        conn,
+        db.Table('category', metadata,
+                 db.Column('id', db.Integer, primary_key=True),
+                 db.Column('name', db.String(20), unique=True, nullable=False)),
+        db.Table('transaction', metadata,
+                 db.Column('id', db.Integer, primary_key=True),
+                 db.Column('amount', db.Float, nullable=False),
+                 db.Column('type', db.String(10), nullable=False),
+                 db.Column('category', db.String(20), nullable=False),
+                 db.Column('description', db.String(100)),
+                 db.Column('date', db.DateTime),
+                 db.Column('username', db.Integer, nullable=False)),
+        db.Table('budget', metadata,
+                 db.Column('id', db.Integer, primary_key=True),
+                 db.Column('name', db.String(50), nullable=False),
+                 db.Column('target_amount', db.Float, nullable=False),
+                 db.Column('current_amount', db.Float),
+                 db.Column('category', db.String(20), nullable=False),
+                 db.Column('start_date', db.Date),
+                 db.Column('end_date', db.Date),
+                 db.Column('username', db.Integer, nullable=False)),
+        db.Table('chat', metadata,
+                 db.Column('id', db.Integer, primary_key=True),
+                 db.Column('content', db.Text, nullable=False),
+                 db.Column('type', db.Integer, nullable=False),
+                 db.Column('date', db.DateTime),
+                 db.Column('username', db.Integer, nullable=False)),
+        db.Table('monthly_summary', metadata,
+                 db.Column('id', db.Integer, primary_key=True),
+                 db.Column('username', db.Integer, nullable=False),
+                 db.Column('year', db.Integer, nullable=False),
+                 db.Column('month', db.Integer, nullable=False),
+                 db.Column('type', db.String(10), nullable=False),
+                 db.Column('total', db.Float, nullable=False),
+                 db.Column('count', db.Integer, nullable=False),
+                 db.UniqueConstraint('username', 'year', 'month', 'type', name='uq_monthly_summary_key')),
+    )
+
+
+@migration(2, "Transaction / Budget / Chat 的组合索引")
+def _composite_indexes(conn):
+    metadata = db.MetaData()
+    transaction = db.Table('transaction', metadata, db.Column('username'), db.Column('type'), db.Column('category'),
+                           db.Column('date'))
+    budget = db.Table('budget', metadata, db.Column('username'), db.Column('category'), db.Column('start_date'),
+                      db.Column('end_date'))
+    chat = db.Table('chat', metadata, db.Column('username'), db.Column('date'))
+    _create(
+        conn,
+        db.Index('ix_transaction_username_date', transaction.c.username, transaction.c.date),
+        db.Index('ix_transaction_username_type_date', transaction.c.username, transaction.c.type, transaction.c.date),
+        db.Index('ix_transaction_username_category_date',
+                 transaction.c.username, transaction.c.category, transaction.c.date),
+        db.Index('ix_budget_username_category_dates',
+                 budget.c.username, budget.c.category, budget.c.start_date, budget.c.end_date),
+        db.Index('ix_chat_username_date', chat.c.username, chat.c.date),
+    )
+
+
+@migration(3, "users 表（替代 db/*.db 中的 SQLite 用户库）")
+def _users_table(conn):
+    users = db.Table('users', db.MetaData(),
+                     db.Column('id', db.Integer, primary_key=True),
+                     db.Column('username', db.String(20), nullable=False),
+                     db.Column('password', db.String(128), nullable=False),
+                     db.Column('email', db.String(120)),
+                     db.Index('ix_users_username', 'username', unique=True),
+                     db.Index('ix_users_email', 'email', unique=True))
+    _create(conn, users)
+
+
+@migration(4, "周期预算：budget.period 列和 budget_period 表")
+def _budget_periods(conn):
+    from app.core.budgets import period_bounds
+    metadata = db.MetaData()
+    columns = {column['name'] for column in db.inspect(conn).get_columns('budget')}
+    if 'period' not in columns:
+        conn.execute(db.text("ALTER TABLE budget ADD COLUMN period VARCHAR(10) NOT NULL DEFAULT 'month'"))
+    budget_period = db.Table('budget_period', metadata,
+                             db.Column('id', db.Integer, primary_key=True),
+                             db.Column('budget_id', db.Integer, nullable=False),
+                             db.Column('start_date', db.Date, nullable=False),
+                             db.Column('end_date', db.Date, nullable=False),
+                             db.Column('spent', db.Float, nullable=False),
+                             db.UniqueConstraint('budget_id', 'start_date', name='uq_budget_period_start'))
+    _create(conn, budget_period)
+
+    # 已有预算都是按月的：把原来的 current_amount 写入 start_date 所在月份的周期
+    budget = db.Table('budget', metadata,
+                      db.Column('id', db.Integer, primary_key=True),
+                      db.Column('current_amount', db.Float),
+                      db.Column('start_date', db.Date),
+                      db.Column('end_date', db.Date))
+    rows = conn.execute(db.select(budget.c.id, budget.c.start_date, budget.c.current_amount)).all()
+    periods = []
+    for budget_id, start_date, current_amount in rows:
+        start = start_date.replace(day=1)
+        end = period_bounds('month', start, start, start)[1]
+        periods.append({"budget_id": budget_id, "start_date": start, "end_date": end, "spent": current_amount or 0})
+    if periods:
+        conn.execute(budget.update()
+                     .where(budget.c.id == db.bindparam('b_id'))
+                     .values(start_date=db.bindparam('b_start'), end_date=db.bindparam('b_end')),
+                     [{"b_id": p["budget_id"], "b_start": p["start_date"], "b_end": p["end_date"]} for p in periods])
+        conn.execute(budget_period.insert(), periods)
+
+
+@migration(5, "chat_job 表：后台执行的聊天任务")
+def _chat_jobs(conn):
+    chat_job = db.Table('chat_job', db.MetaData(),
+                        db.Column('id', db.String(32), primary_key=True),
+                        db.Column('username', db.Integer, nullable=False),
+                        db.Column('message', db.Text, nullable=False),
+                        db.Column('status', db.String(10), nullable=False),
+                        db.Column('reply', db.Text),
+                        db.Column('created_at', db.DateTime),
+                        db.Column('finished_at', db.DateTime))
+    _create(conn, chat_job)
+
+
+@migration(6, "llm_usage 表：每个用户每天的 LLM 用量")
+def _llm_usage(conn):
+    llm_usage = db.Table('llm_usage', db.MetaData(),
+                         db.Column('id', db.Integer, primary_key=True),
+                         db.Column('username', db.Integer, nullable=False),
+                         db.Column('day', db.Date, nullable=False),
+                         db.Column('llm', db.String(20), nullable=False),
+                         db.Column('requests', db.Integer, nullable=False),
+                         db.Column('prompt_tokens', db.Integer, nullable=False),
+                         db.Column('completion_tokens', db.Integer, nullable=False),
+                         db.UniqueConstraint('username', 'day', 'llm', name='uq_llm_usage_key'))
+    _create(conn, llm_usage)
+
+
+@migration(7, "transaction / budget 的 category_id 外键，按名称回填，分类索引改用 category_id")
+def _category_ids(conn):
+    metadata = db.MetaData()
+    category = db.Table('category', metadata, db.Column('id', db.Integer), db.Column('name', db.String(20)))
+    transaction = db.Table('transaction', metadata, db.Column('category'), db.Column('category_id', db.Integer),
+                           db.Column('username'), db.Column('date'))
+    budget = db.Table('budget', metadata, db.Column('category'), db.Column('category_id', db.Integer),
+                      db.Column('username'), db.Column('start_date'), db.Column('end_date'))
+    for table, old_index in ((transaction, 'ix_transaction_username_category_date'),
+                             (budget, 'ix_budget_username_category_dates')):
+        name = conn.dialect.identifier_preparer.quote(table.name)
+        inspector = db.inspect(conn)
+        if 'category_id' not in {column['name'] for column in inspector.get_columns(table.name)}:
+            if conn.dialect.name == 'sqlite':
+                # SQLite 不能单独添加外键约束，只能随列一起声明
+                conn.execute(db.text(f"ALTER TABLE {name} ADD COLUMN category_id INTEGER REFERENCES category (id)"))
+            else:
+                conn.execute(db.text(
+                    f"ALTER TABLE {name} ADD COLUMN category_id INTEGER NULL, "
+                    f"ADD CONSTRAINT fk_{table.name}_category_id FOREIGN KEY (category_id) REFERENCES category (id)"))
+        if old_index in {index['name'] for index in inspector.get_indexes(table.name)}:
+            # 按分类名称的旧索引由下面按 category_id 的索引代替
+            on_table = '' if conn.dialect.name == 'sqlite' else f" ON {name}"
+            conn.execute(db.text(f"DROP INDEX {old_index}{on_table}"))
+
+        # 按名称回填，找不到对应分类的记录保持为空
+        conn.execute(table.update()
+                     .where(table.c.category_id.is_(None))
+                     .values(category_id=db.select(category.c.id)
+                             .where(category.c.name == table.c.category)
+                             .scalar_subquery()))
+    _create(
+        conn,
+        db.Index('ix_transaction_username_category_id_date',
+                 transaction.c.username, transaction.c.category_id, transaction.c.date),
+        db.Index('ix_budget_username_category_id_dates',
+                 budget.c.username, budget.c.category_id, budget.c.start_date, budget.c.end_date),
+    )
+
+
+
+@migration(8, "budget_period.budget_id 外键，删除预算时级联删除周期")
+def _budget_period_fk(conn):
+    inspector = db.inspect(conn)
+    if [fk for fk in inspector.get_foreign_keys('budget_period') if fk['referred_table'] == 'budget']:
+        return
+    # 先清理预算已不存在的周期，否则加不上外键
+    conn.execute(db.text("DELETE FROM budget_period WHERE budget_id NOT IN (SELECT id FROM budget)"))
+    if conn.dialect.name != 'sqlite':
+        conn.execute(db.text(
+            "ALTER TABLE budget_period ADD CONSTRAINT fk_budget_period_budget_id "
+            "FOREIGN KEY (budget_id) REFERENCES budget (id) ON DELETE CASCADE"))
+        return
+
+    # SQLite 不能给已有的列添加外键约束，按新结构重建表后复制数据
+    metadata = db.MetaData()
+    db.Table('budget', metadata, db.Column('id', db.Integer, primary_key=True))
+    rebuilt = db.Table('budget_period_new', metadata,
+                       db.Column('id', db.Integer, primary_key=True),
+                       db.Column('budget_id', db.Integer,
+                                 db.ForeignKey('budget.id', name='fk_budget_period_budget_id', ondelete='CASCADE'),
+                                 nullable=False),
+                       db.Column('start_date', db.Date, nullable=False),
+                       db.Column('end_date', db.Date, nullable=False),
+                       db.Column('spent', db.Float, nullable=False),
+                       db.UniqueConstraint('budget_id', 'start_date', name='uq_budget_period_start'))
+    rebuilt.create(bind=conn)
+    conn.execute(db.text("INSERT INTO budget_period_new (id, budget_id, start_date, end_date, spent) "
+                         "SELECT id, budget_id, start_date, end_date, spent FROM budget_period"))
+    conn.execute(db.text("DROP TABLE budget_period"))
+    conn.execute(db.text("ALTER TABLE budget_period_new RENAME TO budget_period"))
+
+
+def current_version(conn):
+    """返回数据库当前的结构版本，未初始化时为 0"""
+    schema_version.create(bind=conn, checkfirst=True)
+    version = conn.execute(db.select(db.func.max(schema_version.c.version))).scalar()
+    return version or 0
+
+
+def upgrade(target=None):
+    """
+    执行所有版本号大于当前版本（且不超过 target）的迁移
+    :param target: 目标版本，默认为最新版本
+    :return: 本次执行的迁移版本号列表
+    """
+    with db.engine.begin() as conn:
+        version = current_version(conn)
+
+    applied = []
+    for number, description, func in MIGRATIONS:
+        if number <= version or (target is not None and number > target):
+            continue
+        logger.info(f"执行数据库迁移 {number}: {description}")
+        with db.engine.begin() as conn:
+            func(conn)
+            conn.execute(schema_version.insert().values(version=number, description=description))
+        applied.append(number)
+    return applied
@@ -1,33 +1,127 @@
 from datetime import datetime  # 用于时间字段
 from app import db
-from datetime import datetime, date
 
 class Transaction(db.Model):
+    __table_args__ = (
+        # get_transactions / 分页：按用户取最近记录
+        db.Index('ix_transaction_username_date', 'username', 'date'),
+        # get_reports / rebuild_summaries：按用户、收支类型和时间范围筛选
+        db.Index('ix_transaction_username_type_date', 'username', 'type', 'date'),
+        # create_budget / list_transactions：按用户、分类和时间范围筛选
+        db.Index('ix_transaction_username_category_id_date', 'username', 'category_id', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     amount = db.Column(db.Float, nullable=False)
     type = db.Column(db.String(10), nullable=False)  # expense/income
+    # 写入时的分类名称，只在 category_id 为空时作为显示名称；分类改名不回写，显示名称从分类字典取
     category = db.Column(db.String(20), nullable=False)
+    # 分类不存在（例如 LLM 给出的新名称）或已删除时为空，见 app/core/categories.py
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id', name='fk_transaction_category_id'))
     description = db.Column(db.String(100))
     date = db.Column(db.DateTime, default=datetime.utcnow)
     username = db.Column(db.Integer, nullable=False)
 
 class Budget(db.Model):
+    __table_args__ = (
+        # update_budget_for_transaction：按用户、分类和有效期查找预算
+        db.Index('ix_budget_username_category_id_dates', 'username', 'category_id', 'start_date', 'end_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False)
     target_amount = db.Column(db.Float, nullable=False)
-    current_amount = db.Column(db.Float, default=0)
-    category = db.Column(db.String(20), nullable=False)
-    start_date = db.Column(db.Date, default=date.today)
-    end_date = db.Column(db.Date, default=date.today)
+    current_amount = db.Column(db.Float, default=0)  # 迁移 4 之前的已用金额，现在由 BudgetPeriod.spent 维护
+    category = db.Column(db.String(20), nullable=False)  # 同 Transaction.category
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id', name='fk_budget_category_id'))  # 分类删除后为空
+    start_date = db.Column(db.Date, default=lambda: datetime.utcnow().date())  # 第一个周期的第一天
+    end_date = db.Column(db.Date, default=lambda: datetime.utcnow().date())  # 第一个周期的最后一天，custom 预算据此确定周期长度
     username = db.Column(db.Integer, nullable=False)
+    period = db.Column(db.String(10), nullable=False, default='month', server_default='month')  # week/month/custom
+
+class BudgetPeriod(db.Model):
+    """预算每个周期的已用金额，见 app.core.budgets"""
+    __tablename__ = 'budget_period'
+    __table_args__ = (
+        # 交易写入 / get_budgets：按预算和日期查找所在周期
+        db.UniqueConstraint('budget_id', 'start_date', name='uq_budget_period_start'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    budget_id = db.Column(db.Integer, db.ForeignKey('budget.id', name='fk_budget_period_budget_id', ondelete='CASCADE'),
+                          nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    spent = db.Column(db.Float, nullable=False, default=0)
 
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(20), unique=True, nullable=False)
 
 class Chat(db.Model):
+    __table_args__ = (
+        # /api/chat/history：按用户取最近的聊天记录
+        db.Index('ix_chat_username_date', 'username', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     type = db.Column(db.Integer, nullable=False)  # 0: robot, 1: user
     date = db.Column(db.DateTime, default=datetime.utcnow)
-    username = db.Column(db.Integer, nullable=False)
\ No newline at end of file
+    username = db.Column(db.Integer, nullable=False)
+
+class MonthlySummary(db.Model):
+    """按 (用户, 年, 月, 类型) 汇总的交易金额，由交易的增删改同步维护"""
+    __table_args__ = (
+        db.UniqueConstraint('username', 'year', 'month', 'type', name='uq_monthly_summary_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.Integer, nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    type = db.Column(db.String(10), nullable=False)  # expense/income
+    total = db.Column(db.Float, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class User(db.Model):
+    """登录用户，username 和 email 都可以用来登录"""
+    __tablename__ = 'users'
+    __table_args__ = (
+        # 登录：按用户名或邮箱查找
+        db.Index('ix_users_username', 'username', unique=True),
+        db.Index('ix_users_email', 'email', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(20), nullable=False)
+    password = db.Column(db.String(128), nullable=False)
+    email = db.Column(db.String(120))
+
+class ChatJob(db.Model):
+    """后台执行的一轮聊天，见 app/core/jobs.py"""
+    __tablename__ = 'chat_job'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4().hex
+    username = db.Column(db.Integer, nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='queued')  # queued/running/done/failed
+    reply = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+class LlmUsage(db.Model):
+    """每个用户每天在每个 LLM 上的请求数和 token 用量，见 app/core/usage.py"""
+    __tablename__ = 'llm_usage'
+    __table_args__ = (
+        # 累加用量 / 统计当天用量：按 (用户, 日期, LLM) 查找
+        db.UniqueConstraint('username', 'day', 'llm', name='uq_llm_usage_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    llm = db.Column(db.String(20), nullable=False)
+    requests = db.Column(db.Integer, nullable=False, default=0)
+    prompt_tokens = db.Column(db.Integer, nullable=False, default=0)
+    completion_tokens = db.Column(db.Integer, nullable=False, default=0)
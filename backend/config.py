@@ -1,3 +1,4 @@
+import os
 import urllib.parse
 
 class Config:
@@ -5,11 +6,21 @@ class Config:
     DB_PASSWORD = '520@111zz'  # 包含特殊字符 @，需要 URL 编码为 %40
     DB_HOST = '172.23.166.117'  # 或远程 IP 地址
     DB_NAME = 'course'  # 默认数据库名，你可以修改
-    SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{DB_USERNAME}:{urllib.parse.quote(DB_PASSWORD)}@{DB_HOST}/{DB_NAME}"
+    # 可以用环境变量 DATABASE_URL 覆盖，例如压测时指向本地数据库
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'DATABASE_URL',
+        f"mysql+pymysql://{DB_USERNAME}:{urllib.parse.quote(DB_PASSWORD)}@{DB_HOST}/{DB_NAME}"
+    )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # 日志（见 app/log.py）：默认级别、各模块级别 "模块=级别,..."、DEBUG 日志采样率 "模块=比例,..."
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+    LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # json / text
+
     def __init__(self):
-        self.DEBUG = True
+        self.DEBUG = False  # 只在 Development 中打开
         self.TESTING = False
         self.SECRET_KEY = '998244353'
         
@@ -18,6 +29,7 @@ class Development(Config):
         super().__init__()
         self.DEBUG = True
         self.DATABASE_URI = 'db/dev.db'
+        self.LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
         
 class Testing(Config):
     def __init__(self):
@@ -25,6 +37,8 @@ class Testing(Config):
         self.DEBUG = False  
         self.TESTING = True
         self.DATABASE_URI = 'db/test.db'
+        # 测试使用本地 SQLite（位于 instance 目录），不连接远程 MySQL
+        self.SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///test.db')
         
 class Production(Config):
     def __init__(self):
@@ -0,0 +1,37 @@
+"""
+gunicorn 配置（在 backend 目录下运行）：
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+可以用环境变量调整：
+    BIND               监听地址，默认 0.0.0.0:5123
+    WEB_CONCURRENCY    worker 进程数，默认 CPU 核数 * 2 + 1
+    GUNICORN_THREADS   每个 worker 的线程数，默认 4
+    GUNICORN_TIMEOUT   请求超时（秒），默认 120，需要大于 LLM 调用的超时
+    APP_CONFIG         使用的配置，默认 production
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5123')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# 聊天接口大部分时间在等待 LLM 返回，用线程 worker 让一个进程同时处理多个请求
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+keepalive = 5
+accesslog = '-'
+
+# 不使用 preload_app：每个 worker 各自创建应用、数据库连接池和 LLM 客户端，
+# 避免 fork 后多个进程共用同一个连接或后台线程
+preload_app = False
+
+
+def on_starting(server):
+    """在 master 进程中执行一次数据库迁移和初始数据（见 app/bootstrap.py），worker 启动时不访问数据库"""
+    from app import create_app, db
+    from app.bootstrap import bootstrap
+    app = create_app(os.environ.get('APP_CONFIG', 'production'))
+    with app.app_context():
+        bootstrap()
+        db.engine.dispose()
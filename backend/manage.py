@@ -0,0 +1,105 @@
+"""
+后端运维命令
+
+用法（在 backend 目录下运行）：
+    python manage.py bootstrap                    # 首次部署：执行迁移并写入预设分类、示例预算
+    python manage.py migrate                      # 执行未执行的数据库迁移
+    python manage.py migrate --target 1           # 只迁移到指定版本
+    python manage.py db-version                   # 查看当前数据库结构版本
+    python manage.py rebuild-summaries            # 重建所有用户的月度汇总
+    python manage.py rebuild-summaries --user 1   # 只重建指定用户
+    python manage.py import-users                 # 把 db/*.db 中的 SQLite 用户导入 users 表
+"""
+import argparse
+import os
+import sqlite3
+
+from app import create_app
+
+
+def bootstrap(args):
+    from app.bootstrap import bootstrap as run_bootstrap
+    result = run_bootstrap()
+    print(f"已执行迁移: {result['migrations'] or '无'}，"
+          f"新增分类 {result['categories']} 个，新增示例预算 {result['budgets']} 个")
+
+
+def migrate(args):
+    from app.migrations import upgrade
+    applied = upgrade(args.target)
+    if applied:
+        print(f"已执行迁移: {applied}")
+    else:
+        print("数据库已是最新版本")
+
+
+def db_version(args):
+    from app import db
+    from app.migrations import MIGRATIONS, current_version
+    with db.engine.begin() as conn:
+        version = current_version(conn)
+    print(f"当前版本: {version}，最新版本: {MIGRATIONS[-1][0]}")
+
+
+def rebuild_summaries(args):
+    from app.core.functions import rebuild_summaries as rebuild
+    count = rebuild(args.user)
+    print(f"月度汇总重建完成，共写入 {count} 行")
+
+
+def import_users(args):
+    """旧版本把用户保存在单独的 SQLite 文件中，迁移到 users 表；已存在的用户名跳过"""
+    from flask import current_app
+    from app import db
+    from app.models import User
+    path = args.sqlite or current_app.config['DATABASE_URI']
+    if not os.path.exists(path):
+        print(f"找不到 SQLite 用户库: {path}")
+        return
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT username, password, email FROM users").fetchall()
+    finally:
+        conn.close()
+
+    existing = {username for (username,) in db.session.query(User.username)}
+    new_users = [{'username': username, 'password': password, 'email': email}
+                 for username, password, email in rows if username not in existing]
+    if new_users:
+        db.session.execute(db.insert(User), new_users)
+        db.session.commit()
+    print(f"导入 {len(new_users)} 个用户，跳过 {len(rows) - len(new_users)} 个已存在的用户")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端运维命令")
+    parser.add_argument('--config', default=os.environ.get('APP_CONFIG', 'development'),
+                        help="使用的配置：development / testing / production")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    bootstrap_parser = subparsers.add_parser('bootstrap', help="执行迁移并写入初始数据（可重复执行）")
+    bootstrap_parser.set_defaults(func=bootstrap)
+
+    migrate_parser = subparsers.add_parser('migrate', help="执行未执行的数据库迁移")
+    migrate_parser.add_argument('--target', type=int, default=None, help="目标版本，默认最新")
+    migrate_parser.set_defaults(func=migrate)
+
+    version_parser = subparsers.add_parser('db-version', help="查看当前数据库结构版本")
+    version_parser.set_defaults(func=db_version)
+
+    rebuild_parser = subparsers.add_parser('rebuild-summaries', help="根据交易记录重建月度汇总表")
+    rebuild_parser.add_argument('--user', type=int, default=None, help="只重建指定用户")
+    rebuild_parser.set_defaults(func=rebuild_summaries)
+
+    users_parser = subparsers.add_parser('import-users', help="把 SQLite 用户库导入 users 表")
+    users_parser.add_argument('--sqlite', default=None, help="SQLite 文件路径，默认使用配置中的 DATABASE_URI")
+    users_parser.set_defaults(func=import_users)
+
+    args = parser.parse_args()
+    app = create_app(args.config)
+    with app.app_context():
+        args.func(args)
+
+
+if __name__ == '__main__':
+    main()
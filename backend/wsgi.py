@@ -0,0 +1,12 @@
+"""
+生产环境入口，供 gunicorn 等 WSGI 服务器加载：
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+配置名由环境变量 APP_CONFIG 指定，默认 production。
+"""
+import os
+
+from app import create_app
+
+app = create_app(os.environ.get('APP_CONFIG', 'production'))